@@ -64,6 +64,9 @@ def create_app(config_class=Config):
 
     limiter.init_app(app)
 
+    from app.utils.query_counter import init_query_counter
+    init_query_counter(app)
+
     # Cloudinary configuration
     cloudinary.config(
         cloud_name=app.config['CLOUDINARY_CLOUD_NAME'],
@@ -71,6 +74,11 @@ def create_app(config_class=Config):
         api_secret=app.config['CLOUDINARY_API_SECRET'],
         secure=True
     )
+    from app.utils.cloudinary_upload import init_uploader
+    init_uploader(app)
+
+    from app.utils.blob_store import init_blob_store
+    init_blob_store(app)
 
     # Register blueprints
     from app.routes.auth import auth_bp
@@ -111,15 +119,51 @@ def create_app(config_class=Config):
         
     register_commands(app)
 
+    from app.services.financial_rollup import register_rollup_listeners
+    from app.services.gallery_index import register_gallery_listeners
+    from app.services.unread_counters import register_unread_listeners
+    from app.utils.socket_identity import register_identity_listeners
+    from app.utils.rbac import register_rbac_listeners
+    from app.services.ledger import register_ledger_listeners
+    register_rollup_listeners()
+    register_gallery_listeners()
+    register_unread_listeners()
+    register_identity_listeners()
+    register_rbac_listeners()
+    register_ledger_listeners()
+
+    from app.services.job_queue import init_job_queue, start_in_process_worker
+    init_job_queue(app)
+
+    from app.services.audit import init_audit
+    init_audit(app)
+
     def scheduled_balance():
         with app.app_context():
             from app.routes.admin import refresh_day_assignments
             refresh_day_assignments()
+
+    def scheduled_accrual():
+        with app.app_context():
+            from app.services.accrual import accrue_active_loans
+            result = accrue_active_loans()
+            app.logger.info(f"Nightly accrual: {result}")
+
     scheduler = BackgroundScheduler()
+    scheduler.add_job(func=scheduled_accrual, trigger='cron', hour=0, minute=15)
     scheduler.add_job(func=scheduled_balance, trigger='cron', hour=2, minute=0)
+    if app.config.get('JOB_WORKER_IN_PROCESS', True):
+        # picks up jobs left queued by a restart or enqueued by another process
+        scheduler.add_job(func=start_in_process_worker, trigger='interval', minutes=1)
     scheduler.start()
 
-    socketio.init_app(app, cors_allowed_origins="*")
+    from app.utils.presence import init_presence
+    init_presence(app)
+    socketio.init_app(
+        app,
+        cors_allowed_origins="*",
+        message_queue=app.config.get('SOCKETIO_MESSAGE_QUEUE')
+    )
 
     return app
 
@@ -369,4 +413,87 @@ def register_commands(app):
                     updated += 1
 
         db.session.commit()
-        print(f"Updated due_date for {updated} active loans to the next due date.")
\ No newline at end of file
+        print(f"Updated due_date for {updated} active loans to the next due date.")
+
+    @app.cli.command('accrue-loans')
+    @click.option('--batch-size', default=200, show_default=True)
+    @with_appcontext
+    def accrue_loans_command(batch_size):
+        """
+        Run the nightly accrual pass now: persist every stale active loan up to
+        today (ledger rows included) and stamp accrued_through.
+        """
+        from app.services.accrual import accrue_active_loans
+
+        result = accrue_active_loans(batch_size=batch_size)
+        print(f"Accrued {result['processed']} loans through {result['as_of']} "
+              f"({result['failed']} failed).")
+
+    @app.cli.command('verify-accrual')
+    @click.option('--iterations', default=500, show_default=True, help='Random loan histories to replay.')
+    @click.option('--seed', default=None, type=int, help='Seed for a reproducible run.')
+    @with_appcontext
+    def verify_accrual_command(iterations, seed):
+        """
+        Diff the event-driven accrual engine against the original day-by-day
+        loops across randomised loan histories (no database writes).
+        """
+        from app.services.accrual_verify import verify_accrual
+
+        result = verify_accrual(iterations=iterations, seed=seed)
+        timings = result['timings']
+        print(f"Checked {result['checks']} recalculations "
+              f"(loop {timings['legacy']:.3f}s, engine {timings['engine']:.3f}s).")
+
+        for m in result['mismatches'][:20]:
+            print(f"  MISMATCH case {m['case']} step {m['step']} ({m['plan']}, save={m['save']}, "
+                  f"as_of {m['as_of']}): ledger rows {m['ledger_rows']}")
+            for field, (old, new) in m['fields'].items():
+                print(f"      {field}: loop={old} engine={new}")
+
+        if result['mismatches']:
+            print(f"\n{len(result['mismatches'])} mismatching histories.")
+            raise SystemExit(1)
+        print("Engine matches the day-by-day loops.")
+
+    @app.cli.command('bench-ledger')
+    @click.option('--loans', default=20, show_default=True, help='Daily loans to accrue.')
+    @click.option('--days', default=30, show_default=True, help='Days of accrual each loan catches up.')
+    @with_appcontext
+    def bench_ledger_command(loans, days):
+        """
+        Time ledger writes for daily loans catching up on accrual: a flush per
+        row, one bulk insert, and compacted accrual ranges (rolled back afterwards).
+        """
+        from app.services.ledger_bench import bench_ledger
+
+        for r in bench_ledger(loans=loans, days=days):
+            seconds = max(r['seconds'], 1e-9)
+            print(f"{r['mode']:>8}: {r['rows']:>6} rows ({r['days']} days) in "
+                  f"{r['statements']:>5} INSERTs, {seconds:.3f}s  "
+                  f"{r['rows'] / seconds:,.0f} rows/s  {r['days'] / seconds:,.0f} days/s")
+
+    @app.cli.command('index-report')
+    @click.option('--as-planned', is_flag=True,
+                  help='Keep the planner\'s own choice (PostgreSQL seq-scans small tables).')
+    @click.option('--verbose', is_flag=True, help='Print every plan, not only the flagged ones.')
+    @with_appcontext
+    def index_report_command(as_planned, verbose):
+        """
+        EXPLAIN each hot query and flag the ones that still need a sequential
+        scan.  Exits with status 1 when any query is flagged.
+        """
+        from app.services.index_advisor import index_report
+
+        report = index_report(as_planned=as_planned)
+        flagged = [r for r in report if r['seq_scans']]
+        for r in report:
+            mark = 'SEQ SCAN' if r['seq_scans'] else 'ok'
+            print(f"[{mark:>8}] {r['name']}" + (f" ({', '.join(r['seq_scans'])})" if r['seq_scans'] else ''))
+            if verbose or r['seq_scans']:
+                for line in r['plan']:
+                    print(f"             {line}")
+
+        print(f"\n{len(report) - len(flagged)}/{len(report)} hot queries use an index.")
+        if flagged:
+            raise SystemExit(1)
@@ -42,10 +42,39 @@ class Config:
     CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/1')
     CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', 'redis://localhost:6379/1')
 
+    # Socket.IO – set SOCKETIO_MESSAGE_QUEUE (e.g. redis://host:6379/2) to run several
+    # workers; rooms, emits and the online list are then shared through Redis
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+    PRESENCE_BACKEND = os.environ.get('PRESENCE_BACKEND', 'redis' if SOCKETIO_MESSAGE_QUEUE else 'local')
+    PRESENCE_REDIS_URL = os.environ.get('PRESENCE_REDIS_URL', SOCKETIO_MESSAGE_QUEUE)
+
+    # Uploaded files (chat attachments, company documents) are stored by SHA-256;
+    # BLOB_STORE_PATH must be persistent storage shared by all app instances.  Without
+    # it blobs go to instance/blobs, which a redeploy wipes, so attachments keep
+    # their bytes in the database as well
+    BLOB_STORE_BACKEND = os.environ.get('BLOB_STORE_BACKEND', 'local')
+    BLOB_STORE_PATH = os.environ.get('BLOB_STORE_PATH')
+
+    # Outbound SMS / email / M-Pesa calls go through app.services.job_queue.  Set
+    # JOB_WORKER_IN_PROCESS=false when running `python manage.py run-jobs` separately;
+    # JOB_QUEUE_BROKER_URL (Redis) only wakes workers sooner, the queue lives in the DB
+    JOB_WORKER_IN_PROCESS = os.environ.get('JOB_WORKER_IN_PROCESS', 'true').lower() == 'true'
+    JOB_QUEUE_BROKER_URL = os.environ.get('JOB_QUEUE_BROKER_URL')
+
+    # Audit entries are written in batches by a background thread (app.services.audit);
+    # false writes each one immediately
+    AUDIT_LOG_ASYNC = os.environ.get('AUDIT_LOG_ASYNC', 'true').lower() == 'true'
+
+    # Record each run of daily accruals as one 'accrual_range' ledger row instead of
+    # one row per day (GET /api/admin/loan/<id>/ledger?expand=1 lists the days)
+    LEDGER_COMPACT_ACCRUALS = os.environ.get('LEDGER_COMPACT_ACCRUALS', 'false').lower() == 'true'
+
     # Cloudinary
     CLOUDINARY_CLOUD_NAME = os.environ.get('CLOUDINARY_CLOUD_NAME')
     CLOUDINARY_API_KEY = os.environ.get('CLOUDINARY_API_KEY')
     CLOUDINARY_API_SECRET = os.environ.get('CLOUDINARY_API_SECRET')
+    # 'fake' keeps uploads in memory (app.utils.cloudinary_upload.FakeUploader) for local runs and tests
+    CLOUDINARY_BACKEND = os.environ.get('CLOUDINARY_BACKEND', 'cloudinary')
 
     WEBAUTHN_RP_ID = os.environ.get('WEBAUTHN_RP_ID', 'localhost')  
     FRONTEND_URL = os.environ.get('FRONTEND_URL', 'http://localhost:5173')
\ No newline at end of file
@@ -12,8 +12,10 @@ class User(db.Model):
     password_hash = db.Column(db.String(255), nullable=False)
     role = db.Column(db.String(30), default='admin') # admin, investor, staff
     role_id = db.Column(db.Integer, db.ForeignKey('roles.id'), nullable=True)   
+    token_version = db.Column(db.Integer, nullable=False, default=0)  # bumped on role changes (app.utils.rbac)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    profile_picture = db.Column(db.Text, nullable=True)  # base64 encoded image data
+    profile_picture = db.Column(db.Text, nullable=True)  # thumbnail URL (app.services.avatars)
+    avatar_hash = db.Column(db.String(64), nullable=True)  # sha256 of the uploaded picture
 
     # To enable fingerprint biometric
     fingerprint_enabled = db.Column(db.Boolean, default=False)
@@ -68,6 +70,7 @@ class User(db.Model):
             'role': self.role,
             'created_at': self.created_at.isoformat(),
             'profile_picture': self.profile_picture,
+            'avatar_hash': self.avatar_hash,
             'webauthn_credential_id': self.webauthn_credential_id,
             'webauthn_enabled': bool(self.webauthn_credential_id),
         }
@@ -158,6 +161,11 @@ class Livestock(db.Model):
 
     # Relationships
     investor = db.relationship('Investor', backref='livestock', lazy=True)
+
+    __table_args__ = (
+        db.Index('ix_livestock_client_id', 'client_id'),
+        db.Index('ix_livestock_status', 'status'),
+    )
     
     
     def to_dict(self):
@@ -231,6 +239,9 @@ class Loan(db.Model):
 
     last_compounding_date = db.Column(db.DateTime, nullable=True)
 
+    # NEW: day the accrual state (and ledger) was last persisted through – set by the nightly accrual job
+    accrued_through = db.Column(db.Date, nullable=True)
+
 
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -241,6 +252,19 @@ class Loan(db.Model):
     livestock = db.relationship('Livestock', backref='loan', lazy='joined')
     payments = db.relationship('Payment', backref='loan', lazy='dynamic', cascade='all, delete-orphan')
     comments = db.relationship('Comment', back_populates='loan', lazy='dynamic', cascade='all, delete-orphan')
+
+    # Hot filters; the partial ones only cover active loans (the bulk of the reads)
+    __table_args__ = (
+        db.Index('ix_loans_status', 'status'),
+        db.Index('ix_loans_client_id_status', 'client_id', 'status'),
+        db.Index('ix_loans_livestock_id', 'livestock_id'),
+        db.Index('ix_loans_parent_loan_id', 'parent_loan_id'),
+        db.Index('ix_loans_disbursement_date', 'disbursement_date'),
+        db.Index('ix_loans_active_due_date', 'due_date',
+                 postgresql_where=db.text("status = 'active'"), sqlite_where=db.text("status = 'active'")),
+        db.Index('ix_loans_active_accrued_through', 'accrued_through',
+                 postgresql_where=db.text("status = 'active'"), sqlite_where=db.text("status = 'active'")),
+    )
     
     def to_dict(self):
         return {
@@ -274,6 +298,7 @@ class Loan(db.Model):
             'parent_loan_id': self.parent_loan_id,
             'root_loan_id': self.root_loan_id,
             'last_compounding_date': self.last_compounding_date.isoformat() if self.last_compounding_date else None,
+            'accrued_through': self.accrued_through.isoformat() if self.accrued_through else None,
         }
 
 class LoanLedger(db.Model):
@@ -319,6 +344,12 @@ class Transaction(db.Model):
     # Relationships
     loan = db.relationship('Loan', backref=db.backref('transactions', lazy=True))
     investor = db.relationship('Investor', backref=db.backref('transactions', lazy=True))  # NEW
+
+    __table_args__ = (
+        db.Index('ix_transactions_loan_id', 'loan_id'),
+        db.Index('ix_transactions_created_at_id', 'created_at', 'id'),   # keyset pagination
+        db.Index('ix_transactions_type_created_at', 'transaction_type', 'created_at'),
+    )
     
     def to_dict(self):
         created_at_iso = self.created_at.isoformat() if self.created_at else datetime.utcnow().isoformat()
@@ -348,7 +379,7 @@ class Payment(db.Model):
     __tablename__ = 'payments'
     
     id = db.Column(db.Integer, primary_key=True)
-    loan_id = db.Column(db.Integer, db.ForeignKey('loans.id'), nullable=False)
+    loan_id = db.Column(db.Integer, db.ForeignKey('loans.id'), nullable=False, index=True)
     phone_number = db.Column(db.String(20), nullable=False)
     amount = db.Column(db.Numeric(10, 2), nullable=False)
     payment_type = db.Column(db.String(20))  # NEW: principal or interest
@@ -535,6 +566,8 @@ class InvestorReturn(db.Model):
     early_withdrawal_fee = db.Column(db.Numeric(12, 2), default=0)  # NEW: Fee amount
     transaction_type = db.Column(db.String(50), default='return')  # 'return', 'topup', 'adjustment_up', 'adjustment_down'
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.Index('ix_investor_returns_status_return_date', 'status', 'return_date'),)
     
     def to_dict(self):
         return {
@@ -630,6 +663,8 @@ class Comment(db.Model):
         lazy='dynamic'
     )
 
+    __table_args__ = (db.Index('ix_comments_loan_id_created_at', 'loan_id', 'created_at'),)
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -685,6 +720,12 @@ class PrivateMessage(db.Model):
     # Relationships (unchanged)
     sender = db.relationship('User', foreign_keys=[sender_id], back_populates='sent_messages')
     recipient = db.relationship('User', foreign_keys=[recipient_id], back_populates='received_messages')
+
+    __table_args__ = (
+        db.Index('ix_private_messages_recipient_id_read', 'recipient_id', 'read'),
+        db.Index('ix_private_messages_sender_recipient_created', 'sender_id', 'recipient_id', 'created_at'),
+        db.Index('ix_private_messages_group_id_created_at', 'group_id', 'created_at'),
+    )
     
     def to_dict(self):
         return {
@@ -709,7 +750,11 @@ class MessageAttachment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.String(255), nullable=False)
     mime_type = db.Column(db.String(100), nullable=False)
-    file_data = db.Column(db.LargeBinary, nullable=False)
+    # bytes live in the blob store under sha256; file_data only holds rows
+    # not yet moved by `flask migrate-attachment-blobs`
+    sha256 = db.Column(db.String(64), nullable=True, index=True)
+    size = db.Column(db.Integer, nullable=True)
+    file_data = db.deferred(db.Column(db.LargeBinary, nullable=True))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Defaulter(db.Model):
@@ -751,11 +796,16 @@ class ClientAssignment(db.Model):
     officer = db.relationship('User', foreign_keys=[officer_id])
     assigner = db.relationship('User', foreign_keys=[assigned_by])
 
+    __table_args__ = (
+        db.Index('ix_client_assignments_officer_id_is_active', 'officer_id', 'is_active'),
+        db.Index('ix_client_assignments_loan_id_is_active', 'loan_id', 'is_active'),
+    )
+
 class ReportComment(db.Model):
     __tablename__ = 'report_comments'
     id = db.Column(db.Integer, primary_key=True)
     loan_id = db.Column(db.Integer, db.ForeignKey('loans.id'), nullable=False)
-    officer_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    officer_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)   # NULL: nightly system snapshot
     report_date = db.Column(db.Date, nullable=False, default=datetime.utcnow().date)
     comment = db.Column(db.Text, nullable=False)
 
@@ -772,6 +822,13 @@ class ReportComment(db.Model):
     loan = db.relationship('Loan', backref='report_comments')
     officer = db.relationship('User', backref='report_comments')
 
+    __table_args__ = (
+        db.Index('ix_report_comments_loan_id_report_date', 'loan_id', 'report_date'),
+        # one system snapshot per loan and day (app.services.snapshots upserts against it)
+        db.Index('uq_report_comments_snapshot', 'loan_id', 'report_date', unique=True,
+                 postgresql_where=db.text('officer_id IS NULL'), sqlite_where=db.text('officer_id IS NULL')),
+    )
+
 class FlaggedLoan(db.Model):
     __tablename__ = 'flagged_loans'
     id = db.Column(db.Integer, primary_key=True)
@@ -790,6 +847,11 @@ class FlaggedLoan(db.Model):
     resolver = db.relationship('User', foreign_keys=[resolved_by])
     previous_officer = db.relationship('User', foreign_keys=[previous_officer_id])
 
+    __table_args__ = (
+        db.Index('ix_flagged_loans_unresolved_loan_id', 'loan_id',
+                 postgresql_where=db.text('resolved = false'), sqlite_where=db.text('resolved = 0')),
+    )
+
 # ================== Dynamic Roles & Permissions ==================
 
 class Role(db.Model):
@@ -917,6 +979,8 @@ class SalaryTransaction(db.Model):
     creator = db.relationship('User', foreign_keys=[created_by])
     advance_request = db.relationship('SalaryAdvanceRequest', backref='transaction')
 
+    __table_args__ = (db.Index('ix_salary_transactions_type_created_at', 'transaction_type', 'created_at'),)
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -997,7 +1061,7 @@ class PettyCashExpense(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     description = db.Column(db.String(255), nullable=False)
     amount = db.Column(db.Numeric(10, 2), nullable=False)
-    date = db.Column(db.Date, nullable=False, default=datetime.utcnow().date)
+    date = db.Column(db.Date, nullable=False, default=datetime.utcnow().date, index=True)
     recorded_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     notes = db.Column(db.Text)
     attachments = db.Column(db.JSON, default=[])  # list of Cloudinary URLs or file paths
@@ -1062,7 +1126,8 @@ class Group(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)          # supports emojis
-    profile_picture = db.Column(db.Text, nullable=True)       # base64 or URL
+    profile_picture = db.Column(db.Text, nullable=True)       # thumbnail URL (app.services.avatars)
+    avatar_hash = db.Column(db.String(64), nullable=True)
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -1076,6 +1141,7 @@ class Group(db.Model):
             'id': self.id,
             'name': self.name,
             'profile_picture': self.profile_picture,
+            'avatar_hash': self.avatar_hash,
             'created_by': self.created_by,
             'created_at': self.created_at.isoformat() + 'Z',
             'member_count': len(self.members)
@@ -1120,4 +1186,74 @@ class GroupReadStatus(db.Model):
     __table_args__ = (db.UniqueConstraint('user_id', 'group_id', name='uq_group_read'),)
 
     user = db.relationship('User')
-    group = db.relationship('Group')
\ No newline at end of file
+    group = db.relationship('Group')
+
+class UnreadCounter(db.Model):
+    """Unread badge per user and conversation, maintained by
+    app.services.unread_counters.  ``kind`` is 'user' (direct messages from
+    ``target_id``), 'group' (group ``target_id``) or 'loan' (comments)."""
+    __tablename__ = 'unread_counters'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    kind = db.Column(db.String(10), nullable=False)
+    target_id = db.Column(db.Integer, nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    __table_args__ = (db.UniqueConstraint('user_id', 'kind', 'target_id', name='uq_unread_counter'),)
+
+class DailyFinancialRollup(db.Model):
+    """Per-day money totals by category, kept in step with the source tables
+    (transactions, petty cash, salaries, investor returns) on every flush."""
+    __tablename__ = 'daily_financial_rollup'
+    id = db.Column(db.Integer, primary_key=True)
+    rollup_date = db.Column(db.Date, nullable=False)
+    category = db.Column(db.String(30), nullable=False)
+    amount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    __table_args__ = (db.UniqueConstraint('rollup_date', 'category', name='uq_rollup_date_category'),)
+
+class OutboundJob(db.Model):
+    """Call to an outside provider (SMS, email, M-Pesa, photos) waiting for the
+    worker in app.services.job_queue.  ``status`` is 'pending', 'running'
+    or 'done'; jobs that run out of attempts move to dead_letter_jobs."""
+    __tablename__ = 'outbound_jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    provider = db.Column(db.String(20), nullable=False)
+    action = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    result = db.Column(db.JSON)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    __table_args__ = (db.Index('ix_outbound_jobs_due', 'status', 'run_after'),)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'provider': self.provider,
+            'action': self.action,
+            'status': self.status,
+            'attempts': self.attempts,
+            'run_after': self.run_after.isoformat() if self.run_after else None,
+            'last_error': self.last_error,
+            'result': self.result,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+        }
+
+class DeadLetterJob(db.Model):
+    """An OutboundJob that failed on every attempt, kept for inspection and requeueing."""
+    __tablename__ = 'dead_letter_jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer, nullable=False)
+    provider = db.Column(db.String(20), nullable=False)
+    action = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    attempts = db.Column(db.Integer, nullable=False)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime)
+    failed_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from flask_cors import CORS, cross_origin
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, timedelta
@@ -6,14 +6,19 @@ from decimal import Decimal, ROUND_HALF_UP
 from app import db
 from app.models import Client, Loan, Livestock, Transaction, User, Investor, InvestorReturn, DayAssignment, ClientAssignment, ReportComment, FlaggedLoan, Role, MenuItem, RoleMenuItem, PettyCashExpense, PettyCashFunding , MessageAttachment
 from app.utils.security import admin_required, log_audit
-from sqlalchemy.orm import selectinload, joinedload
-from sqlalchemy import func
+from sqlalchemy.orm import selectinload, joinedload, aliased
+from sqlalchemy import func, or_
 from app.routes.payments import recalculate_loan, _loan_summary
 from app.utils.decorators import role_required
+from app.utils.rbac import mark_role_changed
 import json
 import secrets
 import string
-from app.services.ledger import record_ledger_entry   # NEW
+from app.services.ledger import ACCRUAL_RANGE, expand_accrual_range, record_ledger_entry
+from app.services.loan_view import project_loan
+from app.services import attachments, loan_chain, transaction_feed
+from app.services.gallery_index import gallery_page
+from app.services.livestock_loans import latest_loans, latest_loan_join
 from app.routes.payments import compute_overdue
 from flask import current_app
 from app.routes.payments import recalculate_loan, _loan_summary
@@ -79,56 +84,13 @@ def create_daily_snapshots(as_of_date=None):
     Create a ReportComment snapshot for every active loan for the given date.
     If as_of_date is None, use yesterday (so that the day is complete).
     """
+    from app.services.snapshots import create_snapshots
+
     if as_of_date is None:
         as_of_date = datetime.utcnow().date() - timedelta(days=1)
     else:
         as_of_date = as_of_date.date() if hasattr(as_of_date, 'date') else as_of_date
-
-    # Get all active loans (excluding flagged ones if you like)
-    loans = Loan.query.filter_by(status='active').all()
-
-    for loan in loans:
-        # Recalculate the loan as of today? No – we want the state as of the end of that day.
-        # But we don't have a way to recalculate for a past date easily.
-        # However, since the cron runs daily at the end of the day, we can just use the current live state
-        # because it already includes all transactions and accruals up to that moment.
-        # We need to ensure that the loan has been recalculated for the current date.
-        loan = recalculate_loan(loan, save=False)
-
-        # Compute unpaid interest for today (which is the end of as_of_date)
-        if loan.repayment_plan == 'weekly' and loan.interest_rate > 0:
-            unpaid_interest = float(_get_current_period_interest(loan))
-        else:
-            unpaid_interest = float(max(Decimal('0'), loan.accrued_interest - loan.interest_paid))
-
-        current_principal = float(loan.current_principal)
-        total_balance = current_principal + unpaid_interest
-
-        # Check if a snapshot already exists for this loan/date
-        existing = ReportComment.query.filter_by(
-            loan_id=loan.id,
-            report_date=as_of_date
-        ).first()
-        if existing:
-            # Optionally update if you want to refresh (but better to keep original)
-            continue
-
-        # Create snapshot
-        snapshot = ReportComment(
-            loan_id=loan.id,
-            officer_id=None,          # No officer – system‑generated
-            report_date=as_of_date,
-            comment='',               # No comment
-            current_principal=current_principal,
-            unpaid_interest=unpaid_interest,
-            total_balance=total_balance,
-            interest_rate=float(loan.interest_rate),
-            repayment_plan=loan.repayment_plan,
-            created_at=datetime.utcnow()
-        )
-        db.session.add(snapshot)
-
-    db.session.commit()
+    return create_snapshots(as_of_date)
 
 # Helper to refresh all day‑based assignments
 def refresh_day_assignments():
@@ -182,7 +144,7 @@ def get_assigned_clients_for_user(user_id):
         client = loan.client
         if not client or loan.status != 'active':
             continue
-        loan = recalculate_loan(loan, save=False)
+        loan = project_loan(loan)
 
         # --- Correct unpaid interest ---
         if loan.repayment_plan == 'weekly' and loan.interest_rate > 0:
@@ -436,9 +398,8 @@ def get_all_clients():
             if not client:
                 continue
 
-            active_loan = recalculate_loan(active_loan, save=False)
+            active_loan = project_loan(active_loan)
             overdue_days, overdue_weeks = compute_overdue(active_loan, today)
-            db.session.commit()
 
             current_principal = active_loan.current_principal or active_loan.principal_amount
             principal_paid = active_loan.principal_paid or Decimal('0')
@@ -553,7 +514,7 @@ def get_dashboard_stats():
         ).all()
         due_today_data = []
         for loan in due_today_loans:
-            loan = recalculate_loan(loan, save=False)
+            loan = project_loan(loan)
             due_today_data.append({
                 'id': loan.id, 'client_id': loan.client_id, 'loan_id': loan.id,
                 'client_name': loan.client.full_name if loan.client else 'Unknown',
@@ -569,7 +530,7 @@ def get_dashboard_stats():
         ).all()
         overdue_data = []
         for loan in overdue_loans:
-            loan = recalculate_loan(loan, save=False)
+            loan = project_loan(loan)
             overdue_days, overdue_weeks = compute_overdue(loan, today)
             overdue_data.append({
                 'id': loan.id,
@@ -663,51 +624,46 @@ def get_all_livestock():
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 10, type=int)
         
-        # Get all livestock with their related data - use joinedload to load client eagerly
-        pag = Livestock.query.options(
+        # Livestock, its latest loan and that loan's client in one statement;
+        # completed loans are filtered before paginating so pages stay full
+        latest = latest_loans()
+        loan_client = aliased(Client)
+        pag = db.session.query(
+            Livestock, latest.c.id, latest.c.status, latest.c.due_date, loan_client.full_name
+        ).options(
             joinedload(Livestock.client),
             joinedload(Livestock.investor)
+        ).outerjoin(
+            latest, latest_loan_join(latest, Livestock.id)
+        ).outerjoin(
+            loan_client, loan_client.id == latest.c.client_id
         ).filter(
-            Livestock.status == 'active'
-        ).paginate(page=page, per_page=per_page, error_out=False)
+            Livestock.status == 'active',
+            or_(latest.c.status.is_(None), latest.c.status != 'completed')
+        ).order_by(Livestock.id).paginate(page=page, per_page=per_page, error_out=False)
         
         today = datetime.now().date()
         items = []
         
-        for item in pag.items:
+        for item, loan_id, loan_status, loan_due_date, loan_client_name in pag.items:
             description = item.description or 'Available for purchase'
             actual_location = item.location or 'Isinya, Kajiado'
             investor_name = item.investor.name if item.investor else None
             
-            # Find the associated loan
-            associated_loan = None
-            if item.client_id or item.id:
-                associated_loan = Loan.query.filter_by(
-                    livestock_id=item.id
-                ).order_by(Loan.created_at.desc()).first()
-            
             # Check if livestock is from a claimed loan
             is_claimed = False
             client_name = None
             
-            if associated_loan and associated_loan.status == 'claimed':
+            if loan_status == 'claimed':
                 is_claimed = True
-                # Get client name from the loan's client relationship
-                if associated_loan.client:
-                    client_name = associated_loan.client.full_name
-                # Fallback: check if livestock has client loaded
+                # Client name from the loan, falling back to the livestock's client
+                if loan_client_name:
+                    client_name = loan_client_name
                 elif item.client:
                     client_name = item.client.full_name
             
-            # Determine if this is from a completed loan (skip completed loans)
-            is_completed = associated_loan and associated_loan.status == 'completed'
-            
-            # Skip livestock that belong to completed loans
-            if is_completed:
-                continue
-            
             # Determine status based on loan association
-            if item.client_id is None and not associated_loan:
+            if item.client_id is None and loan_id is None:
                 # Admin added livestock or livestock not tied to any loan - available for purchase
                 available_info = 'Available now'
                 days_remaining = 0
@@ -724,13 +680,13 @@ def get_all_livestock():
                     description = "Claimed from Unknown"
                 is_admin_added = False
                 
-            elif associated_loan and associated_loan.status == 'active':
+            elif loan_status == 'active':
                 # Active loan livestock - collateral
-                client_name_for_desc = item.client.full_name if item.client else associated_loan.client.full_name if associated_loan.client else 'Unknown'
+                client_name_for_desc = item.client.full_name if item.client else loan_client_name or 'Unknown'
                 description = f"Collateral for {client_name_for_desc}"
                 is_admin_added = False
-                if associated_loan.due_date:
-                    due = associated_loan.due_date.date() if hasattr(associated_loan.due_date, 'date') else associated_loan.due_date
+                if loan_due_date:
+                    due = loan_due_date.date() if hasattr(loan_due_date, 'date') else loan_due_date
                     days_remaining = (due - today).days
                     if days_remaining > 0:
                         available_info = f'Available in {days_remaining} days'
@@ -786,113 +742,11 @@ def get_public_livestock_gallery():
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 12, type=int)
-        all_lv = Livestock.query.filter(Livestock.status == 'active').all()
-        today = datetime.now().date()
-        result = []
-        
-        # Get all loan IDs that are completed (NOT claimed)
-        completed_loan_ids = db.session.query(Loan.id).filter(
-            Loan.status == 'completed'
-        ).all()
-        completed_loan_ids = [l[0] for l in completed_loan_ids]
-        
-        for item in all_lv:
-            # Find the associated loan - query by livestock_id
-            associated_loan = Loan.query.filter_by(livestock_id=item.id).first()
-            
-            # Skip livestock that are associated with COMPLETED loans only
-            # Claimed livestock should remain
-            if associated_loan and associated_loan.status == 'completed':
-                continue
-            
-            desc = str(item.description or '').strip()
-            if not desc or desc in ('NaN', 'None'):
-                desc = 'Livestock for purchase'
-            if '|' in desc:
-                desc = desc.split('|', 1)[0].strip()
-                
-            loc = str(item.location or '').strip()
-            if not loc or loc in ('NaN', 'None'):
-                loc = 'Isinya, Kajiado'
-            if '|' in loc:
-                p1, p2 = [p.strip() for p in loc.split('|', 1)]
-                kw = ['isinya', 'kajiado', 'town', 'county', 'moonlight', 'kwa', 'timo']
-                loc = p2 if any(k in p2.lower() for k in kw) else (p1 if any(k in p1.lower() for k in kw) else 'Isinya, Kajiado')
-            if 'available' in loc.lower():
-                loc = 'Isinya, Kajiado'
-                
-            available_info = 'Available now'
-            days_remaining = 0
-            include = False
-            
-            if item.client_id is None:
-                # Admin added livestock - show as available
-                include = True
-                desc = 'Available for purchase'
-            else:
-                # Check if associated with a loan
-                if not associated_loan:
-                    # No loan, livestock should be available
-                    include = True
-                    desc = 'Available for purchase'
-                elif associated_loan.status == 'claimed':
-                    # Claimed loan - show as available
-                    include = True
-                    desc = 'Available for purchase'
-                    available_info = 'Available now'
-                elif associated_loan.status == 'active':
-                    # Active loan - show collateral status
-                    include = True
-                    # Check if overdue
-                    if associated_loan.due_date:
-                        due = associated_loan.due_date.date() if hasattr(associated_loan.due_date, 'date') else associated_loan.due_date
-                        days_remaining = (due - today).days
-                        if days_remaining > 0:
-                            available_info = f'Available in {days_remaining} days'
-                            desc = 'Livestock for purchase'
-                        elif days_remaining == 0:
-                            available_info = 'Due Today'
-                            desc = 'Livestock for purchase'
-                        else:
-                            # Overdue - show as available
-                            available_info = 'Available now'
-                            desc = 'Available for purchase'
-                            days_remaining = 0
-                    else:
-                        available_info = 'Available after repayment'
-                        desc = 'Livestock for purchase'
-                        days_remaining = 7
-                else:
-                    # Other status - skip
-                    continue
-            
-            if not include:
-                continue
-                
-            result.append({
-                'id': item.id,
-                'title': f"{item.livestock_type.capitalize()} - {item.count} head",
-                'type': item.livestock_type,
-                'count': item.count,
-                'price': float(item.estimated_value) if item.estimated_value else 0,
-                'description': desc,
-                'images': item.photos or [],
-                'availableInfo': available_info,
-                'daysRemaining': days_remaining,
-                'location': loc
-            })
-            
-        result.sort(key=lambda x: (0 if 'now' in x['availableInfo'].lower() else 1, x['daysRemaining']))
-        total = len(result)
-        start = (page - 1) * per_page
-        
-        return jsonify({
-            'items': result[start:start + per_page],
-            'total': total,
-            'pages': (total + per_page - 1) // per_page,
-            'current_page': page,
-            'per_page': per_page
-        }), 200
+        payload, etag = gallery_page(page, per_page)
+        response = jsonify(payload)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'public, max-age=60'
+        return response.make_conditional(request)
         
     except Exception as e:
         import traceback
@@ -903,28 +757,44 @@ def get_public_livestock_gallery():
 @jwt_required()
 @role_required(['admin', 'director', 'secretary', 'client_relations_officer', 'hr_manager'])
 def get_all_transactions():
+    """
+    Newest-first page of transactions: ``{'items', 'next_cursor', 'limit'}``.
+    Pass ``next_cursor`` back as ``cursor`` for the next page.  Filters:
+    type, payment_type, method, loan_id, start_date, end_date (YYYY-MM-DD).
+    """
     try:
-        txns = Transaction.query.order_by(Transaction.created_at.desc()).all()
-        result = []
-        for t in txns:
-            cn = t.loan.client.full_name if t.loan and t.loan.client else 'Unknown'
-            receipt = 'N/A'
-            if t.payment_method == 'mpesa' and t.mpesa_receipt:
-                receipt = t.mpesa_receipt
-            elif t.payment_method == 'cash':
-                receipt = 'Cash'
-            result.append({
-                'id': t.id, 'date': t.created_at.isoformat() if t.created_at else None,
-                'clientName': cn, 'type': t.transaction_type, 'payment_type': t.payment_type,
-                'amount': float(t.amount), 'method': t.payment_method or 'cash',
-                'status': t.status or 'completed', 'receipt': receipt,
-                'notes': t.notes or '', 'mpesa_receipt': t.mpesa_receipt, 'loan_id': t.loan_id
-            })
-        return jsonify(result), 200
+        return jsonify(transaction_feed.page(request.args)), 200
+    except transaction_feed.InvalidTransactionQuery as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@admin_bp.route('/transactions/export', methods=['GET'])
+@jwt_required()
+@role_required(['admin', 'director', 'accountant', 'secretary', 'client_relations_officer', 'hr_manager'])
+def export_transactions():
+    """Stream the filtered history as CSV (default) or NDJSON (?format=ndjson)."""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+    try:
+        transaction_feed.filtered_query(request.args)   # validate filters before streaming
+    except transaction_feed.InvalidTransactionQuery as e:
+        return jsonify({'error': str(e)}), 400
+
+    args = request.args.to_dict()
+    stamp = datetime.utcnow().strftime('%Y%m%d')
+    if fmt == 'ndjson':
+        body, mimetype = transaction_feed.export_ndjson(args), 'application/x-ndjson'
+    else:
+        body, mimetype = transaction_feed.export_csv(args), 'text/csv'
+    return Response(
+        stream_with_context(body), mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=transactions-{stamp}.{fmt}'}
+    )
+
+
 @admin_bp.route('/livestock', methods=['POST'])
 @jwt_required()
 @role_required(['admin', 'director', 'hr_manager'])
@@ -934,12 +804,8 @@ def add_livestock():
         desc = data.get('description', '').strip() or generate_livestock_description(data.get('type', '').capitalize(), data.get('count', 1))
         image_urls = []
         if data.get('images'):
-            from app.utils.cloudinary_upload import upload_base64_image
-            for img in data['images']:
-                try:
-                    image_urls.append(upload_base64_image(img, folder='livestock'))
-                except Exception as e:
-                    print(f"Image upload failed: {e}")
+            from app.utils.cloudinary_upload import upload_many
+            image_urls = [url for url in upload_many(data['images'], folder='livestock') if url]
         lv = Livestock(client_id=None, livestock_type=data['type'], count=data['count'],
                        estimated_value=Decimal(str(data['price'])), description=desc,
                        location=data.get('location', 'Isinya, Kajiado'), photos=image_urls, status='active')
@@ -966,17 +832,8 @@ def update_livestock(livestock_id):
         if 'description' in data: lv.description       = data['description'].strip()
         if 'location'    in data: lv.location          = data['location'].strip()
         if 'images' in data:
-            from app.utils.cloudinary_upload import upload_base64_image
-            urls = []
-            for img in data['images']:
-                if isinstance(img, str) and img.startswith('http'):
-                    urls.append(img)
-                else:
-                    try:
-                        urls.append(upload_base64_image(img, folder='livestock'))
-                    except Exception as e:
-                        print(f"Image upload failed: {e}")
-            lv.photos = urls
+            from app.utils.cloudinary_upload import upload_many
+            lv.photos = [url for url in upload_many(data['images'], folder='livestock') if url]
         db.session.commit()
         return jsonify({'success': True, 'livestock': lv.to_dict()}), 200
     except Exception as e:
@@ -1296,7 +1153,9 @@ def manage_investor(investor_id):
         except Exception as e:
             db.session.rollback(); return jsonify({'error': str(e)}), 500
     try:
-        InvestorReturn.query.filter_by(investor_id=inv.id).delete()
+        # through the session so the financial rollup drops the returns too
+        for r in inv.returns:
+            db.session.delete(r)
         if inv.user: db.session.delete(inv.user)
         db.session.delete(inv); db.session.commit()
         return jsonify({'success': True}), 200
@@ -1644,7 +1503,7 @@ def renew_loan(loan_id):
             interest_prepaid_period=None,
             interest_prepaid_amount=Decimal('0'),
             parent_loan_id=loan.id,
-            root_loan_id=loan.root_loan_id or loan.id
+            root_loan_id=loan_chain.root_id(loan)
         )
 
         db.session.add(new_loan)
@@ -1834,7 +1693,7 @@ def waive_loan(loan_id):
             interest_prepaid_period=None,
             interest_prepaid_amount=Decimal('0'),
             parent_loan_id=loan.id,
-            root_loan_id=loan.root_loan_id or loan.id,
+            root_loan_id=loan_chain.root_id(loan),
             original_repayment_plan=original_plan,
             original_interest_rate=original_rate
         )
@@ -1947,12 +1806,12 @@ def revert_waived_loans():
             db.session.add(loan)
             reverted_count += 1
 
-            # Audit log entry
+            # Audit log entry, saved by the commit below together with the revert
             log_audit('loan_reverted', 'loan', loan.id, {
                 'original_plan': original_plan,
                 'original_rate': float(original_rate),
                 'current_principal': float(loan.current_principal)
-            })
+            }, atomic=True)
 
         db.session.commit()
         return jsonify({'success': True, 'reverted_count': reverted_count}), 200
@@ -2031,56 +1890,15 @@ def get_loan_ledger(loan_id):
     if not loan:
         return jsonify({'error': 'Loan not found'}), 404
     entries = LoanLedger.query.filter_by(loan_id=loan_id).order_by(LoanLedger.event_date).all()
-    return jsonify([{
-        'date': e.event_date.isoformat(),
-        'type': e.event_type,
-        'amount': float(e.amount),
-        'principalBalance': float(e.principal_balance),
-        'interestBalance': float(e.interest_balance),
-        'totalOutstanding': float(e.total_outstanding),
-        'notes': e.notes,
-        'reference': e.reference,
-    } for e in entries]), 200
-
-# In admin.py, update the get_consolidated_statement function
-@admin_bp.route('/loan/<int:loan_id>/consolidated-statement', methods=['GET'])
-@jwt_required()
-@role_required(['admin', 'director', 'secretary', 'head_of_it', 'client_relations_officer', 'hr_manager'])
-def get_consolidated_statement(loan_id):
-    from app.models import LoanLedger, Transaction
-    loan = db.session.get(Loan, loan_id)
-    if not loan:
-        return jsonify({'error': 'Loan not found'}), 404
-
-    # Find root loan
-    root_loan = loan
-    while root_loan.parent_loan_id:
-        root_loan = db.session.get(Loan, root_loan.parent_loan_id)
-
-    # Collect all loans in chain
-    chain_loan_ids = []
-    def collect_ids(l):
-        chain_loan_ids.append(l.id)
-        for child in Loan.query.filter_by(parent_loan_id=l.id):
-            collect_ids(child)
-    collect_ids(root_loan)
-
-    # Load loans to get their disbursement dates
-    loans_map = {l.id: l for l in Loan.query.filter(Loan.id.in_(chain_loan_ids))}
-
-    entries = LoanLedger.query.filter(
-        LoanLedger.loan_id.in_(chain_loan_ids)
-    ).order_by(LoanLedger.event_date).all()
-
-    txn_ids = [e.transaction_id for e in entries if e.transaction_id]
-    transactions = {t.id: t for t in Transaction.query.filter(Transaction.id.in_(txn_ids))}
-
-    result = []
+    # ?expand=1 lists compacted accrual ranges day by day
+    expand = request.args.get('expand', '').lower() in ('1', 'true')
+    day_one = loan.disbursement_date.date() + timedelta(days=1) if loan.disbursement_date else None
+    rows = []
     for e in entries:
-        loan_obj = loans_map.get(e.loan_id)
-        txn = transactions.get(e.transaction_id) if e.transaction_id else None
-        result.append({
-            'loan_id': e.loan_id,
+        if expand and e.event_type == ACCRUAL_RANGE:
+            rows.extend(expand_accrual_range(e, skip_day=day_one))
+            continue
+        rows.append({
             'date': e.event_date.isoformat(),
             'type': e.event_type,
             'amount': float(e.amount),
@@ -2089,15 +1907,41 @@ def get_consolidated_statement(loan_id):
             'totalOutstanding': float(e.total_outstanding),
             'notes': e.notes,
             'reference': e.reference,
-            'loan_disbursement_date': loan_obj.disbursement_date.isoformat() if loan_obj and loan_obj.disbursement_date else None,
-            'transaction': {
-                'payment_type': txn.payment_type if txn else None,
-                'payment_method': txn.payment_method if txn else None,
-                'mpesa_receipt': txn.mpesa_receipt if txn else None,
-                'transaction_type': txn.transaction_type if txn else None,
-            } if txn else None
         })
-    return jsonify(result), 200
+    return jsonify(rows), 200
+
+# In admin.py, update the get_consolidated_statement function
+@admin_bp.route('/loan/<int:loan_id>/consolidated-statement', methods=['GET'])
+@jwt_required()
+@role_required(['admin', 'director', 'secretary', 'head_of_it', 'client_relations_officer', 'hr_manager'])
+def get_consolidated_statement(loan_id):
+    """Ledger of every loan in the renewal chain of ``loan_id``, oldest first."""
+    chain = loan_chain.chain_ids(loan_id)
+    if not chain:
+        return jsonify({'error': 'Loan not found'}), 404
+    return jsonify(loan_chain.statement(chain)), 200
+
+
+@admin_bp.route('/loan/<int:loan_id>/consolidated-statement/export', methods=['GET'])
+@jwt_required()
+@role_required(['admin', 'director', 'secretary', 'head_of_it', 'client_relations_officer', 'hr_manager'])
+def export_consolidated_statement(loan_id):
+    """Stream the consolidated statement as CSV (default) or NDJSON (?format=ndjson)."""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+    chain = loan_chain.chain_ids(loan_id)
+    if not chain:
+        return jsonify({'error': 'Loan not found'}), 404
+
+    if fmt == 'ndjson':
+        body, mimetype = loan_chain.export_ndjson(chain), 'application/x-ndjson'
+    else:
+        body, mimetype = loan_chain.export_csv(chain), 'text/csv'
+    return Response(
+        stream_with_context(body), mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=statement-loan-{chain[0]}.{fmt}'}
+    )
 
 # ------------------- Report Management -------------------
 
@@ -2173,7 +2017,7 @@ def get_all_client_assignments():
         }
 
     for loan in loans:
-        loan = recalculate_loan(loan, save=False)
+        loan = project_loan(loan)
         ass = ClientAssignment.query.filter_by(loan_id=loan.id, is_active=True).first()
         if not ass:
             continue
@@ -2244,7 +2088,7 @@ def suggest_balanced_distribution():
     officers = User.query.filter(User.role.in_(['secretary', 'client_relations_officer'])).all()
     all_clients = []
     for loan in Loan.query.filter_by(status='active').all():
-        loan = recalculate_loan(loan, save=False)
+        loan = project_loan(loan)
         unpaid = float(max(Decimal('0'), loan.accrued_interest - loan.interest_paid))
         all_clients.append({
             'loan_id': loan.id,
@@ -2352,6 +2196,7 @@ def update_role(role_id):
     # update menu items
     if 'menu_items' in data:
         RoleMenuItem.query.filter_by(role_id=role.id).delete()
+        mark_role_changed(db.session, role.id)
         for key in data['menu_items']:
             menu_item = MenuItem.query.filter_by(key=key).first()
             if menu_item:
@@ -2540,7 +2385,7 @@ def get_officer_report():
                 comment_text = snapshot.comment
             else:
                 # No snapshot – fallback to live (should not happen if cron runs)
-                loan = recalculate_loan(loan, save=False)
+                loan = project_loan(loan)
                 if loan.repayment_plan == 'weekly' and loan.interest_rate > 0:
                     unpaid_interest = float(_get_current_period_interest(loan))
                 else:
@@ -2550,7 +2395,7 @@ def get_officer_report():
                 comment_text = ''
         else:
             # Today: use live data, but include comment if any
-            loan = recalculate_loan(loan, save=False)
+            loan = project_loan(loan)
             if loan.repayment_plan == 'weekly' and loan.interest_rate > 0:
                 unpaid_interest = float(_get_current_period_interest(loan))
             else:
@@ -2637,12 +2482,7 @@ def update_user_branch(user_id):
 @role_required(['admin', 'director', 'secretary', 'client_relations_officer'])
 def get_attachment(attachment_id):
     att = MessageAttachment.query.get_or_404(attachment_id)
-    return send_file(
-        io.BytesIO(att.file_data),
-        mimetype=att.mime_type,
-        as_attachment=True,
-        download_name=att.filename
-    )
+    return attachments.send_attachment(att)
 
 @admin_bp.route('/upload', methods=['POST'])
 @jwt_required()
@@ -2671,13 +2511,8 @@ def upload_file():
                 'name': original_name
             }), 200
         else:
-            # Store non‑image in database
-            attachment = MessageAttachment(
-                filename=original_name,
-                mime_type=file.mimetype or 'application/octet-stream',
-                file_data=file.read()
-            )
-            db.session.add(attachment)
+            # Store non‑image in the blob store
+            attachment = attachments.store_upload(file, filename=original_name)
             db.session.commit()
             # Build absolute URL (you may use url_for with _external=True)
             url = url_for('admin.get_attachment', attachment_id=attachment.id, _external=True)
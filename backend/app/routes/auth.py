@@ -1,11 +1,12 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt_identity
 from marshmallow import ValidationError
 from app import db
 from app.models import User, Investor
 from app.schemas.user_schema import UserRegistrationSchema, UserLoginSchema
 from app.utils.security import admin_required, log_audit
 from app.utils.decorators import role_required
+from app.utils.rbac import create_token, menu_for, user_auth
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -64,7 +65,7 @@ def login():
         if user.investor_profile.account_status != 'active':
             return jsonify({'error': 'Your account has been deactivated. Please contact admin for support.'}), 403
 
-    access_token = create_access_token(identity=str(user.id))
+    access_token = create_token(user)
     user_data = user.to_dict()
 
     if user.role == 'investor' and user.investor_profile:
@@ -332,7 +333,7 @@ def investor_register(investor_id):
         db.session.commit()
         
         # Create login token
-        access_token = create_access_token(identity=str(user.id))
+        access_token = create_token(user)
         
         log_audit('investor_account_created', 'investor', investor.id, {
             'username': username
@@ -473,32 +474,26 @@ def change_password():
 @jwt_required()
 def get_user_menu():
     """Return menu items for the currently logged-in user based on their role."""
-    from app.models import Role, MenuItem, RoleMenuItem
+    from app.models import Role
     user_id = int(get_jwt_identity())
-    user = db.session.get(User, user_id)
-    if not user:
+    auth = user_auth(user_id)
+    if not auth:
         return jsonify({'error': 'User not found'}), 404
 
-    # Get role object (either by role_id if migrated, or fallback to old role string)
-    role = None
-    if user.role_id:
-        role = Role.query.get(user.role_id)
-    else:
-        role = Role.query.filter_by(name=user.role).first()
+    # Role by role_id if migrated, or fallback to old role string
+    role_id = auth.role_id
+    if not role_id:
+        role = Role.query.filter_by(name=auth.role).first()
         if role:
             # Update user to use role_id for future
-            user.role_id = role.id
+            db.session.get(User, user_id).role_id = role.id
             db.session.commit()
+            role_id = role.id
 
-    if not role:
+    if not role_id:
         return jsonify([]), 200
 
-    # Fetch all menu items assigned to this role, ordered
-    menu_items = db.session.query(MenuItem).join(RoleMenuItem).filter(
-        RoleMenuItem.role_id == role.id
-    ).order_by(MenuItem.order).all()
-
-    return jsonify([item.to_dict() for item in menu_items]), 200
+    return jsonify(list(menu_for(role_id))), 200
 
 @auth_bp.route('/profile-picture', methods=['PUT'])
 @jwt_required()
@@ -513,26 +508,17 @@ def update_profile_picture():
     if not image_data:
         return jsonify({'error': 'Image data required'}), 400
 
-    if not image_data.startswith('data:image/'):
-        return jsonify({'error': 'Invalid image format'}), 400
-
-    import base64
-    header, encoded = image_data.split(',', 1)
+    from app.services.avatars import InvalidAvatar, store_avatar
     try:
-        decoded = base64.b64decode(encoded)
-        if len(decoded) > 1_000_000:  # 1MB
-            return jsonify({'error': 'Image too large (max 1MB)'}), 400
-    except:
-        return jsonify({'error': 'Invalid base64 data'}), 400
-
-    mime = header.split(';')[0].split(':')[1]
-    if mime not in ['image/jpeg', 'image/png', 'image/gif', 'image/webp']:
-        return jsonify({'error': 'Unsupported image type'}), 400
-
-    user.profile_picture = image_data
+        user.profile_picture, user.avatar_hash = store_avatar(image_data, max_bytes=1_000_000)  # 1MB
+    except InvalidAvatar as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
     db.session.commit()
 
-    return jsonify({'success': True, 'profile_picture': user.profile_picture}), 200
+    return jsonify({'success': True, 'profile_picture': user.profile_picture,
+                    'avatar_hash': user.avatar_hash}), 200
 
 @auth_bp.route('/profile-picture', methods=['DELETE'])
 @jwt_required()
@@ -542,5 +528,6 @@ def delete_profile_picture():
     if not user:
         return jsonify({'error': 'User not found'}), 404
     user.profile_picture = None
+    user.avatar_hash = None
     db.session.commit()
     return jsonify({'success': True}), 200
\ No newline at end of file
@@ -4,7 +4,7 @@ import json
 import secrets
 from datetime import datetime, timedelta
 from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt_identity
 from webauthn import (
     generate_registration_options,
     verify_registration_response,
@@ -20,6 +20,7 @@ from webauthn.helpers.structs import RegistrationCredential
 from webauthn.helpers.cose import COSEAlgorithmIdentifier
 from app import db
 from app.models import User
+from app.utils.rbac import create_token
 
 biometric_bp = Blueprint("biometric", __name__, url_prefix="/api/auth/biometric")
 
@@ -308,7 +309,7 @@ def login_complete():
         db.session.commit()
 
         # Create JWT and return
-        access_token = create_access_token(identity=str(user.id))
+        access_token = create_token(user)
         if user.role == "admin":
             redirect_to = "/admin"
         elif user.role == "investor":
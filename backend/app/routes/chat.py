@@ -2,6 +2,10 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
 from app.models import User, Group, GroupMember, PrivateMessage, GroupReadStatus, GroupMember
+from app.utils.extensions import socketio
+from app.services.read_receipts import mark_group_read as mark_group_messages_read
+from app.services import unread_counters
+from app.services.avatars import InvalidAvatar, is_inline, store_avatar
 from datetime import datetime
 import traceback
 
@@ -52,7 +56,17 @@ def create_group():
             response.headers['Access-Control-Allow-Credentials'] = 'true'
             return response, 400
 
-        group = Group(name=name, profile_picture=profile_picture, created_by=user_id)
+        avatar_hash = None
+        if is_inline(profile_picture):
+            try:
+                profile_picture, avatar_hash = store_avatar(profile_picture, max_bytes=1_000_000)
+            except InvalidAvatar as e:
+                response = jsonify({'error': str(e)})
+                response.headers['Access-Control-Allow-Origin'] = 'http://localhost:5173'
+                response.headers['Access-Control-Allow-Credentials'] = 'true'
+                return response, 400
+
+        group = Group(name=name, profile_picture=profile_picture, avatar_hash=avatar_hash, created_by=user_id)
         db.session.add(group)
         db.session.flush()
 
@@ -336,34 +350,21 @@ def mark_group_read(group_id):
     if not check_group_membership(group_id, user_id):
         return jsonify({'error': 'You are not a member of this group'}), 403
 
-    messages = PrivateMessage.query.filter_by(group_id=group_id).filter(
-        PrivateMessage.sender_id != user_id,
-        PrivateMessage.status != 'read'
-    ).all()
-    for msg in messages:
-        msg.status = 'read'
-        msg.read = True
-        msg.read_at = datetime.utcnow()
-
-    db.session.commit()
+    message_ids = mark_group_messages_read(group_id, user_id)
+    if message_ids:
+        socketio.emit('message_status_update', {
+            'message_ids': message_ids,
+            'status': 'read'
+        }, room=f'group_{group_id}')
     return jsonify({'success': True}), 200
 
 @chat_bp.route('/groups/unread-counts', methods=['GET'])
 @jwt_required()
 def get_group_unread_counts():
     user_id = int(get_jwt_identity())
-    memberships = GroupMember.query.filter_by(user_id=user_id, is_active=True).all()
-    result = {}
-    for m in memberships:
-        read_status = GroupReadStatus.query.filter_by(user_id=user_id, group_id=m.group_id).first()
-        last_read = read_status.last_read_at if read_status else datetime.min
-        count = PrivateMessage.query.filter(
-            PrivateMessage.group_id == m.group_id,
-            PrivateMessage.sender_id != user_id,
-            PrivateMessage.created_at > last_read
-        ).count()
-        result[m.group_id] = count
-    return jsonify(result), 200
+    return jsonify(unread_counters.counts_by_target(
+        user_id, 'group', GroupMember.group_id, GroupMember.user_id == user_id, GroupMember.is_active.is_(True)
+    )), 200
 
 
 @chat_bp.route('/groups/<int:group_id>/members', methods=['POST'])
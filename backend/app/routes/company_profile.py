@@ -4,6 +4,7 @@ from app import db
 from app.models import CompanyDocument, MessageAttachment, User
 from app.utils.decorators import role_required
 from app.utils.cloudinary_upload import upload_base64_image, delete_image
+from app.services import attachments
 import cloudinary.uploader
 from datetime import datetime
 import io
@@ -58,13 +59,8 @@ def upload_document():
             public_id = upload_result.get('public_id')
             file_type = 'image'
         else:
-            # Store in database (MessageAttachment)
-            attachment = MessageAttachment(
-                filename=file.filename,
-                mime_type=file.mimetype or 'application/octet-stream',
-                file_data=file.read()
-            )
-            db.session.add(attachment)
+            # Store in the blob store (MessageAttachment)
+            attachment = attachments.store_upload(file)
             db.session.flush()  # get attachment.id
             attachment_id = attachment.id
             # ✅ STORE RELATIVE PATH (without /api prefix)
@@ -103,7 +99,7 @@ def delete_document(doc_id):
             cloudinary.uploader.destroy(doc.public_id)
         except:
             pass
-    # Delete attachment if stored in DB
+    # Delete attachment if stored in DB (its blob is left to gc_blobs)
     if doc.attachment_id:
         att = MessageAttachment.query.get(doc.attachment_id)
         if att:
@@ -118,9 +114,4 @@ def delete_document(doc_id):
 @role_required(['admin', 'director'])
 def get_attachment(attachment_id):
     att = MessageAttachment.query.get_or_404(attachment_id)
-    return send_file(
-        io.BytesIO(att.file_data),
-        mimetype=att.mime_type,
-        as_attachment=True,
-        download_name=att.filename
-    )
\ No newline at end of file
+    return attachments.send_attachment(att)
\ No newline at end of file
@@ -11,7 +11,11 @@ from app.models import (
 from flask_cors import CORS
 from app.utils.decorators import role_required
 from app.utils.security import log_audit
-from sqlalchemy import func, and_, or_
+from sqlalchemy import func, and_, or_, case
+from app.services.reporting import (
+    money_flows, rollup_flows, totals, total_of, rollup, day_range,
+    MONEY_IN, MONEY_OUT, OPERATING_OUT
+)
 import json
 
 allowed_origins = [
@@ -34,6 +38,25 @@ def get_week_range(date_str):
     return start, end
 
 
+# Unpaid interest per loan, max(0, accrued - paid), as a SQL expression
+UNPAID_INTEREST = case(
+    (Loan.accrued_interest > Loan.interest_paid, Loan.accrued_interest - Loan.interest_paid),
+    else_=0
+)
+
+
+def claims_totals(period_start, period_end):
+    """(amount owed, livestock value recovered) for loans claimed in [start, end)."""
+    owed, recovered = db.session.query(
+        func.sum(Loan.principal_amount), func.sum(Livestock.estimated_value)
+    ).outerjoin(Livestock, Loan.livestock_id == Livestock.id).filter(
+        Loan.status == 'claimed',
+        Loan.updated_at >= period_start,
+        Loan.updated_at < period_end
+    ).one()
+    return owed or Decimal('0'), recovered or Decimal('0')
+
+
 # -------------------- Petty Cash Management --------------------
 
 @financial_bp.route('/petty-cash/fund', methods=['POST'])
@@ -199,67 +222,43 @@ def get_loan_financial_report():
         start_date = today - timedelta(days=days_to_sunday)
         end_date = start_date + timedelta(days=6)
 
+    period_start, period_end = day_range(start_date, end_date)
+    flows = totals(money_flows(start_date, end_date, by_day=False))
+
     # ---- Loans disbursed in the period ----
-    loans_in_period = Loan.query.filter(
-        func.date(Loan.disbursement_date) >= start_date,
-        func.date(Loan.disbursement_date) <= end_date
-    ).all()
-    total_lent = sum(l.principal_amount for l in loans_in_period)
+    total_lent = db.session.query(func.sum(Loan.principal_amount)).filter(
+        Loan.disbursement_date >= period_start,
+        Loan.disbursement_date < period_end
+    ).scalar() or Decimal('0')
 
     # ---- Payments made in the period ----
-    payments = Transaction.query.filter(
-        Transaction.transaction_type == 'payment',
-        func.date(Transaction.created_at) >= start_date,
-        func.date(Transaction.created_at) <= end_date
-    ).all()
-    principal_collected = sum(t.amount for t in payments if t.payment_type == 'principal')
-    interest_collected = sum(t.amount for t in payments if t.payment_type == 'interest')
+    principal_collected = flows['principal_payments']
+    interest_collected = flows['interest_payments']
 
     # ---- Outstanding principal and interest (active + bad_debt as of end_date) ----
-    active_loans = Loan.query.filter(
-        Loan.status == 'active',
-        func.date(Loan.disbursement_date) <= end_date
-    ).all()
-    outstanding_principal = sum(l.current_principal for l in active_loans)
-    outstanding_interest = sum(
-        max(Decimal('0'), l.accrued_interest - l.interest_paid)
-        for l in active_loans
-    )
+    outstanding = {
+        status: (principal or Decimal('0'), interest or Decimal('0'))
+        for status, principal, interest in db.session.query(
+            Loan.status, func.sum(Loan.current_principal), func.sum(UNPAID_INTEREST)
+        ).filter(
+            Loan.status.in_(['active', 'bad_debt']),
+            Loan.disbursement_date < period_end
+        ).group_by(Loan.status).all()
+    }
+    outstanding_principal, outstanding_interest = outstanding.get('active', (Decimal('0'), Decimal('0')))
 
     # ---- Bad Debt ----
-    bad_debt_loans = Loan.query.filter(
-        Loan.status == 'bad_debt',
-        func.date(Loan.disbursement_date) <= end_date
-    ).all()
-    bad_debt_principal = sum(l.current_principal for l in bad_debt_loans)
-    bad_debt_interest = sum(
-        max(Decimal('0'), l.accrued_interest - l.interest_paid)
-        for l in bad_debt_loans
-    )
+    bad_debt_principal, bad_debt_interest = outstanding.get('bad_debt', (Decimal('0'), Decimal('0')))
     total_bad_debt = bad_debt_principal + bad_debt_interest
 
     outstanding_principal += bad_debt_principal
     outstanding_interest += bad_debt_interest
 
     # ---- Claims ----
-    claimed_loans = Loan.query.filter(
-        Loan.status == 'claimed',
-        func.date(Loan.updated_at) >= start_date,
-        func.date(Loan.updated_at) <= end_date
-    ).all()
-    total_claimed_amount = sum(l.principal_amount for l in claimed_loans)
-    total_recovered_value = sum(
-        l.livestock.estimated_value or 0 for l in claimed_loans if l.livestock
-    )
+    total_claimed_amount, total_recovered_value = claims_totals(period_start, period_end)
 
     # ---- Waived ----
-    waiver_transactions = Transaction.query.filter(
-        Transaction.transaction_type == 'adjustment',
-        Transaction.payment_method == 'waiver',
-        func.date(Transaction.created_at) >= start_date,
-        func.date(Transaction.created_at) <= end_date
-    ).all()
-    total_waived_amount = sum(abs(t.amount) for t in waiver_transactions)
+    total_waived_amount = flows['waived']
 
     revenue = interest_collected
     recovery_rate = (principal_collected / total_lent * 100) if total_lent > 0 else 0
@@ -300,70 +299,23 @@ def get_company_financial_report():
         except ValueError:
             return jsonify({'error': 'Invalid date format'}), 400
 
-    # ---- Money In ----
-    principal_payments = db.session.query(func.sum(Transaction.amount)).filter(
-        Transaction.transaction_type == 'payment',
-        Transaction.payment_type == 'principal',
-        func.date(Transaction.created_at) >= start_date,
-        func.date(Transaction.created_at) <= end_date
-    ).scalar() or Decimal('0')
-
-    interest_payments = db.session.query(func.sum(Transaction.amount)).filter(
-        Transaction.transaction_type == 'payment',
-        Transaction.payment_type == 'interest',
-        func.date(Transaction.created_at) >= start_date,
-        func.date(Transaction.created_at) <= end_date
-    ).scalar() or Decimal('0')
-
-    claims_recoveries = db.session.query(func.sum(Transaction.amount)).filter(
-        Transaction.transaction_type == 'claim',
-        func.date(Transaction.created_at) >= start_date,
-        func.date(Transaction.created_at) <= end_date
-    ).scalar() or Decimal('0')
+    flows = totals(rollup_flows(start_date, end_date, by_day=False))
 
-    other_income = db.session.query(func.sum(Transaction.amount)).filter(
-        Transaction.transaction_type == 'other_income',
-        func.date(Transaction.created_at) >= start_date,
-        func.date(Transaction.created_at) <= end_date
-    ).scalar() or Decimal('0')
+    # ---- Money In ----
+    principal_payments = flows['principal_payments']
+    interest_payments = flows['interest_payments']
+    claims_recoveries = flows['claims_recoveries']
+    other_income = flows['other_income']
 
     money_in = principal_payments + interest_payments + claims_recoveries + other_income
 
     # ---- Money Out ----
-    loan_disbursements = db.session.query(func.sum(Transaction.amount)).filter(
-        Transaction.transaction_type == 'disbursement',
-        func.date(Transaction.created_at) >= start_date,
-        func.date(Transaction.created_at) <= end_date
-    ).scalar() or Decimal('0')
-
-    loan_topups = db.session.query(func.sum(Transaction.amount)).filter(
-        Transaction.transaction_type == 'topup',
-        func.date(Transaction.created_at) >= start_date,
-        func.date(Transaction.created_at) <= end_date
-    ).scalar() or Decimal('0')
-
-    petty_cash_expenses = db.session.query(func.sum(PettyCashExpense.amount)).filter(
-        PettyCashExpense.date >= start_date,
-        PettyCashExpense.date <= end_date
-    ).scalar() or Decimal('0')
-
-    operational_expenses = db.session.query(func.sum(Transaction.amount)).filter(
-        Transaction.transaction_type == 'operational',
-        func.date(Transaction.created_at) >= start_date,
-        func.date(Transaction.created_at) <= end_date
-    ).scalar() or Decimal('0')
-
-    salaries = db.session.query(func.sum(SalaryTransaction.amount)).filter(
-        SalaryTransaction.transaction_type == 'salary_payment',
-        func.date(SalaryTransaction.created_at) >= start_date,
-        func.date(SalaryTransaction.created_at) <= end_date
-    ).scalar() or Decimal('0')
-
-    investor_returns = db.session.query(func.sum(InvestorReturn.amount)).filter(
-        InvestorReturn.status == 'completed',
-        func.date(InvestorReturn.return_date) >= start_date,
-        func.date(InvestorReturn.return_date) <= end_date
-    ).scalar() or Decimal('0')
+    loan_disbursements = flows['loan_disbursements']
+    loan_topups = flows['loan_topups']
+    petty_cash_expenses = flows['petty_cash']
+    operational_expenses = flows['operational']
+    salaries = flows['salaries']
+    investor_returns = flows['investor_returns']
 
     money_out = (loan_disbursements + loan_topups + petty_cash_expenses +
                  operational_expenses + salaries + investor_returns)
@@ -409,19 +361,9 @@ def get_company_financial_report():
 @role_required(['director', 'head_of_it', 'admin'])
 def get_revenue_analysis():
     """Get revenue analysis data."""
-    total_money_in = db.session.query(func.sum(Transaction.amount)).filter(
-        Transaction.transaction_type.in_(['payment', 'claim', 'other_income'])
-    ).scalar() or Decimal('0')
-    total_money_out = db.session.query(func.sum(Transaction.amount)).filter(
-        Transaction.transaction_type.in_(['disbursement', 'topup', 'operational'])
-    ).scalar() or Decimal('0')
-    total_money_out += db.session.query(func.sum(PettyCashExpense.amount)).scalar() or Decimal('0')
-    total_money_out += db.session.query(func.sum(SalaryTransaction.amount)).filter(
-        SalaryTransaction.transaction_type == 'salary_payment'
-    ).scalar() or Decimal('0')
-    total_money_out += db.session.query(func.sum(InvestorReturn.amount)).filter(
-        InvestorReturn.status == 'completed'
-    ).scalar() or Decimal('0')
+    flows = totals(rollup_flows(by_day=False))
+    total_money_in = total_of(flows, MONEY_IN)
+    total_money_out = total_of(flows, MONEY_OUT)
 
     net_revenue = total_money_in - total_money_out
     return jsonify({
@@ -488,68 +430,41 @@ def get_weekly_report():
     week_start = saturday - timedelta(days=6)  # Sunday
     week_end = saturday  # Saturday
 
-    # Money in/out for the week
-    money_in = db.session.query(func.sum(Transaction.amount)).filter(
-        Transaction.transaction_type.in_(['payment', 'claim', 'other_income']),
-        func.date(Transaction.created_at) >= week_start,
-        func.date(Transaction.created_at) <= week_end
-    ).scalar() or Decimal('0')
+    period_start, period_end = day_range(week_start, week_end)
+    daily = money_flows(week_start, week_end)
+    week_totals = totals(daily)
 
-    money_out = db.session.query(func.sum(Transaction.amount)).filter(
-        Transaction.transaction_type.in_(['disbursement', 'topup', 'operational']),
-        func.date(Transaction.created_at) >= week_start,
-        func.date(Transaction.created_at) <= week_end
-    ).scalar() or Decimal('0')
-    money_out += db.session.query(func.sum(PettyCashExpense.amount)).filter(
-        PettyCashExpense.date >= week_start,
-        PettyCashExpense.date <= week_end
-    ).scalar() or Decimal('0')
+    # Money in/out for the week
+    money_in = total_of(week_totals, MONEY_IN)
+    money_out = total_of(week_totals, OPERATING_OUT)
 
     revenue = money_in - money_out
 
     # Claims performance for the week
-    claimed_this_week = Loan.query.filter(
-        Loan.status == 'claimed',
-        func.date(Loan.updated_at) >= week_start,
-        func.date(Loan.updated_at) <= week_end
-    ).all()
-    claims_recovered = sum(l.livestock.estimated_value or Decimal('0') for l in claimed_this_week if l.livestock)
-    claims_owed = sum(l.principal_amount for l in claimed_this_week)
+    claims_owed, claims_recovered = claims_totals(period_start, period_end)
     claims_profit_loss = claims_recovered - claims_owed
 
     # Waived loans this week
-    waived_this_week = Loan.query.filter(
+    waived_count, waived_amount = db.session.query(
+        func.count(Loan.id), func.sum(Loan.principal_amount)
+    ).filter(
         Loan.status == 'waived',
-        func.date(Loan.updated_at) >= week_start,
-        func.date(Loan.updated_at) <= week_end
-    ).all()
-    waived_amount = sum(l.principal_amount for l in waived_this_week)
+        Loan.updated_at >= period_start,
+        Loan.updated_at < period_end
+    ).one()
+    waived_amount = waived_amount or Decimal('0')
 
     # Petty cash spending for the week
-    petty_spending = db.session.query(func.sum(PettyCashExpense.amount)).filter(
-        PettyCashExpense.date >= week_start,
-        PettyCashExpense.date <= week_end
-    ).scalar() or Decimal('0')
+    petty_spending = week_totals['petty_cash']
 
     # Daily breakdown
     days = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
     daily_money_in = []
     daily_money_out = []
     for i, day_name in enumerate(days):
-        day_date = week_start + timedelta(days=i)
-        day_in = db.session.query(func.sum(Transaction.amount)).filter(
-            Transaction.transaction_type.in_(['payment', 'claim', 'other_income']),
-            func.date(Transaction.created_at) == day_date
-        ).scalar() or Decimal('0')
-        day_out = db.session.query(func.sum(Transaction.amount)).filter(
-            Transaction.transaction_type.in_(['disbursement', 'topup', 'operational']),
-            func.date(Transaction.created_at) == day_date
-        ).scalar() or Decimal('0')
-        day_out += db.session.query(func.sum(PettyCashExpense.amount)).filter(
-            PettyCashExpense.date == day_date
-        ).scalar() or Decimal('0')
-        daily_money_in.append(float(day_in))
-        daily_money_out.append(float(day_out))
+        day_flows = daily.get(week_start + timedelta(days=i), {})
+        daily_money_in.append(float(total_of(day_flows, MONEY_IN)))
+        daily_money_out.append(float(total_of(day_flows, OPERATING_OUT)))
 
     return jsonify({
         'week_start': week_start.isoformat(),
@@ -563,7 +478,7 @@ def get_weekly_report():
             'profit_loss': float(claims_profit_loss)
         },
         'waived_loans': {
-            'count': len(waived_this_week),
+            'count': waived_count,
             'amount_waived': float(waived_amount)
         },
         'petty_cash_spending': float(petty_spending),
@@ -589,22 +504,13 @@ def get_monthly_report():
     else:
         end_date = date(year, month+1, 1) - timedelta(days=1)
 
-    # Aggregates for the month
-    money_in = db.session.query(func.sum(Transaction.amount)).filter(
-        Transaction.transaction_type.in_(['payment', 'claim', 'other_income']),
-        func.date(Transaction.created_at) >= start_date,
-        func.date(Transaction.created_at) <= end_date
-    ).scalar() or Decimal('0')
+    # One grouped query per table for the whole year, rolled up by month
+    by_month = rollup(money_flows(date(year, 1, 1), date(year, 12, 31)), 'month')
 
-    money_out = db.session.query(func.sum(Transaction.amount)).filter(
-        Transaction.transaction_type.in_(['disbursement', 'topup', 'operational']),
-        func.date(Transaction.created_at) >= start_date,
-        func.date(Transaction.created_at) <= end_date
-    ).scalar() or Decimal('0')
-    money_out += db.session.query(func.sum(PettyCashExpense.amount)).filter(
-        PettyCashExpense.date >= start_date,
-        PettyCashExpense.date <= end_date
-    ).scalar() or Decimal('0')
+    # Aggregates for the month
+    month_flows = by_month.get(start_date, {})
+    money_in = total_of(month_flows, MONEY_IN)
+    money_out = total_of(month_flows, OPERATING_OUT)
 
     revenue = money_in - money_out
 
@@ -614,27 +520,9 @@ def get_monthly_report():
     monthly_in = []
     monthly_out = []
     for m in range(1, 13):
-        m_start = date(year, m, 1)
-        if m == 12:
-            m_end = date(year+1, 1, 1) - timedelta(days=1)
-        else:
-            m_end = date(year, m+1, 1) - timedelta(days=1)
-        m_in = db.session.query(func.sum(Transaction.amount)).filter(
-            Transaction.transaction_type.in_(['payment', 'claim', 'other_income']),
-            func.date(Transaction.created_at) >= m_start,
-            func.date(Transaction.created_at) <= m_end
-        ).scalar() or Decimal('0')
-        m_out = db.session.query(func.sum(Transaction.amount)).filter(
-            Transaction.transaction_type.in_(['disbursement', 'topup', 'operational']),
-            func.date(Transaction.created_at) >= m_start,
-            func.date(Transaction.created_at) <= m_end
-        ).scalar() or Decimal('0')
-        m_out += db.session.query(func.sum(PettyCashExpense.amount)).filter(
-            PettyCashExpense.date >= m_start,
-            PettyCashExpense.date <= m_end
-        ).scalar() or Decimal('0')
-        monthly_in.append(float(m_in))
-        monthly_out.append(float(m_out))
+        m_flows = by_month.get(date(year, m, 1), {})
+        monthly_in.append(float(total_of(m_flows, MONEY_IN)))
+        monthly_out.append(float(total_of(m_flows, OPERATING_OUT)))
 
     return jsonify({
         'year': year,
@@ -691,16 +579,9 @@ def get_financial_dashboard_summary():
     recovery_rate = (total_principal_collected / total_lent * 100) if total_lent > 0 else 0
 
     total_revenue = total_interest_collected
-    total_expenses = db.session.query(func.sum(Transaction.amount)).filter(
-        Transaction.transaction_type.in_(['disbursement', 'topup', 'operational'])
-    ).scalar() or Decimal('0')
-    total_expenses += db.session.query(func.sum(PettyCashExpense.amount)).scalar() or Decimal('0')
-    total_expenses += db.session.query(func.sum(SalaryTransaction.amount)).filter(
-        SalaryTransaction.transaction_type == 'salary_payment'
-    ).scalar() or Decimal('0')
-    total_expenses += db.session.query(func.sum(InvestorReturn.amount)).filter(
-        InvestorReturn.status == 'completed'
-    ).scalar() or Decimal('0')
+    flows = totals(rollup_flows(by_day=False))
+    total_expenses = total_of(flows, MONEY_OUT)
+    total_petty_cash = flows['petty_cash']
 
     net_profit = total_revenue - total_expenses
 
@@ -721,7 +602,7 @@ def get_financial_dashboard_summary():
         'company_metrics': {
             'total_revenue': float(total_revenue),
             'total_expenses': float(total_expenses),
-            'total_petty_cash_expenses': float(db.session.query(func.sum(PettyCashExpense.amount)).scalar() or 0),
+            'total_petty_cash_expenses': float(total_petty_cash),
             'net_profit_loss': float(net_profit),
             'claims_profit_loss': 0,
             'total_waived_amount': float(total_waived)
@@ -231,18 +231,16 @@ def apply_for_loan():
             return jsonify({'error': f'Missing required field: {field}'}), 400
    
     try:
-        # Upload photos to Cloudinary if provided
+        # Upload photos to Cloudinary if provided; with async_photos they are
+        # queued as a job committed with the application and attached by the worker
+        photos = data.get('photos') or []
+        async_photos = bool(data.get('async_photos')) and bool(photos)
         photo_urls = []
-        if data.get('photos'):
-            from app.utils.cloudinary_upload import upload_base64_image
-            
-            for img in data['photos']:
-                try:
-                    url = upload_base64_image(img, folder='loan_applications')
-                    photo_urls.append(url)
-                except Exception as upload_error:
-                    print(f"Failed to upload one loan photo: {str(upload_error)}")
-                    continue
+        if photos and not async_photos:
+            from app.utils.cloudinary_upload import upload_many
+            photo_urls = [url for url in upload_many(photos, folder='loan_applications') if url]
+            if len(photo_urls) < len(photos):
+                print(f"Failed to upload {len(photos) - len(photo_urls)} loan photos")
         
         # Check if client already exists
         client = Client.query.filter_by(id_number=data['id_number']).first()
@@ -323,6 +321,9 @@ def apply_for_loan():
             repayment_plan=repayment_plan
         )
         db.session.add(loan)
+        if async_photos:
+            from app.services.livestock_photos import queue_livestock_photos
+            queue_livestock_photos(livestock.id, photos, folder='loan_applications')
         db.session.commit()
        
         print(f"Loan application created: ID {loan.id} | Plan: {repayment_plan} | Due: {due_date}")
@@ -336,7 +337,8 @@ def apply_for_loan():
             'repayment_plan': repayment_plan,
             'due_date': due_date.isoformat(),
             'client_name': client.full_name,
-            'photos_uploaded': len(photo_urls)
+            'photos_uploaded': len(photo_urls),
+            'photos_pending': len(photos) if async_photos else 0
         }), 201
        
     except Exception as e:
@@ -4,10 +4,12 @@ from decimal import Decimal, ROUND_HALF_UP
 from datetime import date, datetime, timedelta
 from app import db, limiter
 from app.models import Payment, Loan, Transaction
-from app.utils.daraja import DarajaAPI
+from app.utils.daraja import get_daraja
 from app.utils.security import log_audit, role_required
 from app.utils.decorators import role_required
 from app.services.ledger import record_ledger_entry
+from app.services.outbound import queue_stk_push
+from app.services.accrual import recalculate_loan, record_accrual as _record_accrual
 from app.utils.interest_helpers import _get_current_period_key, _get_current_period_interest
 
 
@@ -60,49 +62,14 @@ def compute_historical_unpaid_interest(loan, as_of_date):
         return _get_current_period_interest(loan)
 
 # ---------------------------------------------------------------------------
-# Core interest-accrual engine
+# Core interest-accrual engine: recalculate_loan lives in
+# app.services.accrual and is imported above so existing callers keep
+# importing it from here.
+#
+# Day-by-day reference loops below are kept so `flask verify-accrual` can
+# diff the engine against them.
 # ---------------------------------------------------------------------------
-
-def recalculate_loan(loan, save=True):
-    """Bring a loan's financial fields fully up-to-date."""
-    if loan.status != 'active':
-        return loan
-    if loan.interest_rate == 0:
-        loan.balance = loan.current_principal
-        return loan
-
-    today = datetime.now().date()
-    if not loan.disbursement_date:
-        loan.disbursement_date = datetime.now()
-    if not loan.last_interest_payment_date:
-        loan.last_interest_payment_date = loan.disbursement_date
-    if loan.repayment_plan == 'daily' and not loan.last_compounding_date:
-        loan.last_compounding_date = loan.disbursement_date
-
-    if loan.repayment_plan == 'daily':
-        return _accrue_daily(loan, today, loan.last_interest_payment_date.date(), save=save)
-    else:
-        return _accrue_weekly(loan, today, loan.last_interest_payment_date.date(), save=save)
-
-def _record_accrual(loan, amount, notes, event_date, save=True, event_type='accrual', reference='AUTO'):
-    if not save:
-        return
-    if not loan.last_accrual_recorded or event_date > loan.last_accrual_recorded:
-        record_ledger_entry(
-            loan=loan,
-            event_type=event_type,
-            amount=amount,
-            notes=notes,
-            event_date=event_date,
-            user_id=None,
-            reference=reference
-        )
-        loan.last_accrual_recorded = event_date
-
-# ---------------------------------------------------------------------------
-# Daily accrual  (unchanged logic — only the weekly function is fixed)
-# ---------------------------------------------------------------------------
-def _accrue_daily(loan, today, last_date, save=True):
+def _accrue_daily_loop(loan, today, last_date, save=True):
     """
     Daily accrual with weekly compounding, exactly as specified:
     - Day 0: interest added immediately (1 day).
@@ -210,10 +177,7 @@ def _get_second_sunday(disbursement_date):
         second_sunday = first_sunday + timedelta(days=7)
         return second_sunday
 
-# ---------------------------------------------------------------------------
-# Weekly accrual  ← THE FIXED FUNCTION
-# ---------------------------------------------------------------------------
-def _accrue_weekly(loan, today, last_date, save=True):
+def _accrue_weekly_loop(loan, today, last_date, save=True):
     """
     Compound-interest engine for weekly loans.
 
@@ -587,39 +551,47 @@ def stk_push():
             if payment_amount > loan.current_principal + Decimal('0.01'):
                 return jsonify({'success': False, 'error': f'Cannot exceed current principal {float(loan.current_principal):.2f}'}), 400
 
-        daraja = DarajaAPI()
-        result = daraja.stk_push(
-            phone_number=phone_number, amount=str(amount),
-            account_reference=f"NAGOLIE{loan.id}",
-            callback_url=current_app.config['DARAJA_CALLBACK_URL']
+        # The STK push itself is sent by the job worker (app.services.outbound);
+        # the payment stays 'queued' until Daraja accepts it
+        rounded = int(float(amount))
+        payment = Payment(
+            loan_id=loan.id, amount=Decimal(str(rounded)),
+            phone_number=phone_number, payment_type=payment_type,
+            status='queued',
+            created_at=datetime.utcnow()
         )
-
-        if result.get('success'):
-            rounded = result.get('rounded_amount', int(round(float(amount))))
-            payment = Payment(
-                loan_id=loan.id, amount=Decimal(str(rounded)),
-                phone_number=phone_number, payment_type=payment_type,
-                status='pending',
-                merchant_request_id=result.get('merchant_request_id'),
-                checkout_request_id=result.get('checkout_request_id'),
-                created_at=datetime.utcnow()
-            )
-            db.session.add(payment)
-            db.session.commit()
-            return jsonify({
-                'success': True, 'message': 'STK push sent successfully',
-                'merchant_request_id': result.get('merchant_request_id'),
-                'checkout_request_id': result.get('checkout_request_id'),
-                'customer_message': result.get('customer_message'),
-                'rounded_amount': rounded
-            })
-        return jsonify({'success': False, 'error': result.get('error', 'Failed')}), 400
+        db.session.add(payment)
+        db.session.flush()
+        queue_stk_push(payment, amount, f"NAGOLIE{loan.id}")
+        db.session.commit()
+        return jsonify({
+            'success': True, 'message': 'STK push queued',
+            'payment_id': payment.id,
+            'checkout_request_id': None,
+            'rounded_amount': rounded
+        }), 202
 
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': 'Internal server error'}), 500
 
 
+def _match_unknown_payment(rd):
+    """
+    The 'unknown' payment (STK push sent, Daraja's reply lost) a successful
+    callback belongs to: its CheckoutRequestID was never stored, so match the
+    oldest one with the callback's amount and phone number.
+    """
+    amount = Decimal(str(rd.get('Amount', 0))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    phone = str(rd.get('PhoneNumber') or '')[-9:]
+    if not phone:
+        return None
+    candidates = Payment.query.filter_by(
+        status='unknown', checkout_request_id=None, amount=amount
+    ).order_by(Payment.created_at).all()
+    return next((p for p in candidates if p.phone_number[-9:] == phone), None)
+
+
 @payments_bp.route('/callback', methods=['POST'])
 @limiter.limit("100 per minute")
 def mpesa_callback():
@@ -632,13 +604,18 @@ def mpesa_callback():
         if not cid:
             return jsonify({'ResultCode': 1, 'ResultDesc': 'Missing CID'}), 400
 
+        items = body.get('CallbackMetadata', {}).get('Item', [])
+        rd = {i['Name']: i.get('Value') for i in items}
         payment = Payment.query.filter_by(checkout_request_id=cid).first()
+        if not payment and code == 0:
+            payment = _match_unknown_payment(rd)
+            if payment:
+                payment.checkout_request_id = cid
+                payment.merchant_request_id = body.get('MerchantRequestID')
         if not payment:
             return jsonify({'ResultCode': 1, 'ResultDesc': 'Not found'}), 404
 
         if code == 0:
-            items = body.get('CallbackMetadata', {}).get('Item', [])
-            rd = {i['Name']: i.get('Value') for i in items}
             cb_amt = Decimal(str(rd.get('Amount', 0))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
             receipt = rd.get('MpesaReceiptNumber')
             phone = rd.get('PhoneNumber')
@@ -705,19 +682,32 @@ def get_payment_status(payment_id):
 def check_payment_status():
     try:
         cid = request.json.get('checkout_request_id')
-        if not cid:
+        payment_id = request.json.get('payment_id')
+        if not cid and not payment_id:
             return jsonify({'error': 'Checkout request ID required'}), 400
-        payment = Payment.query.filter_by(checkout_request_id=cid).first()
+        if payment_id:
+            payment = db.session.get(Payment, payment_id)
+        else:
+            payment = Payment.query.filter_by(checkout_request_id=cid).first()
         if not payment:
             return jsonify({'error': 'Not found'}), 404
+        if payment.status == 'queued':
+            return jsonify({'success': False, 'error': 'STK push queued', 'payment_status': 'queued'})
+        if payment.status == 'unknown' and not payment.checkout_request_id:
+            return jsonify({'success': False, 'error': 'STK push outcome unknown; waiting for the M-Pesa callback',
+                            'payment_status': 'unknown'})
+        if payment.status == 'failed' and not payment.checkout_request_id:
+            return jsonify({'success': True,
+                            'status': {'ResultCode': payment.result_code or '1', 'ResultDesc': payment.result_desc},
+                            'payment_status': 'failed'}), 200
+        cid = payment.checkout_request_id
         if payment.status == 'completed':
             txn = Transaction.query.filter_by(mpesa_receipt=payment.mpesa_receipt_number).first()
             return jsonify({'success': True,
                             'status': {'ResultCode': '0', 'ResultDesc': 'Success'},
                             'transaction': txn.to_dict() if txn else None,
                             'payment_status': 'completed'}), 200
-        daraja = DarajaAPI()
-        sr = daraja.check_stk_status(cid)
+        sr = get_daraja().check_stk_status(cid)
         if sr.get('success'):
             rc = sr.get('status', {}).get('ResultCode')
             if rc != '0':
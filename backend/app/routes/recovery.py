@@ -14,6 +14,9 @@ import io
 from flask import send_file
 from app.models import MessageAttachment
 from app.services.ledger import record_ledger_entry
+from app.services.loan_view import project_loan
+from app.services import attachments, conversation_timeline, loan_chain, unread_counters
+from app.utils.query_counter import query_budget
 from app.routes.payments import compute_overdue
 from flask_cors import cross_origin
 
@@ -34,6 +37,7 @@ def get_week_number(disbursement_date):
 @recovery_bp.route('', methods=['GET'])
 @jwt_required()
 @role_required(['admin','director', 'secretary', 'accountant', 'valuer','head_of_it','deputy_director', 'client_relations_officer', 'hr_manager'])
+@query_budget(3)   # loans, defaulters, parent principals – independent of portfolio size
 def get_recovery_data():
     user_id = int(get_jwt_identity())
     
@@ -46,13 +50,25 @@ def get_recovery_data():
         Loan.status == 'active',
         Loan.id.notin_(flagged_subq)   # exclude flagged loans
     ).all()
-    
+
+    # Set-based prefetch instead of one query per loan
+    defaulter_loan_ids = {
+        loan_id for (loan_id,) in
+        db.session.query(Defaulter.loan_id).filter(Defaulter.resolved == False)
+    }
+    parent_ids = {
+        loan.parent_loan_id for loan in loans
+        if loan.parent_loan_id and loan.interest_rate == 0 and loan.repayment_plan == 'daily'
+    }
+    parent_principals = dict(
+        db.session.query(Loan.id, Loan.principal_amount).filter(Loan.id.in_(parent_ids))
+    ) if parent_ids else {}
+
     result = {}
     today = datetime.utcnow().date()
     
     for loan in loans:
-        loan = recalculate_loan(loan)
-        today = datetime.utcnow().date()
+        loan = project_loan(loan)
         overdue_days, overdue_weeks = compute_overdue(loan, today)
         
         due_day = loan.disbursement_date.strftime('%A') if loan.disbursement_date else 'Monday'
@@ -89,7 +105,7 @@ def get_recovery_data():
             unpaid_interest = float(max(Decimal('0'), loan.accrued_interest - loan.interest_paid))
         
         week_number = get_week_number(loan.disbursement_date)
-        is_defaulter = Defaulter.query.filter_by(loan_id=loan.id, resolved=False).first() is not None
+        is_defaulter = loan.id in defaulter_loan_ids
         
         if loan.due_date:
             due = loan.due_date.date() if hasattr(loan.due_date, 'date') else loan.due_date
@@ -100,10 +116,8 @@ def get_recovery_data():
         # ---------- NEW: Detect waived loans and get original principal ----------
         is_waiver = (loan.interest_rate == 0 and loan.repayment_plan == 'daily')
         original_principal = None
-        if is_waiver and loan.parent_loan_id:
-            parent = db.session.get(Loan, loan.parent_loan_id)
-            if parent:
-                original_principal = float(parent.principal_amount)
+        if is_waiver and loan.parent_loan_id in parent_principals:
+            original_principal = float(parent_principals[loan.parent_loan_id])
         
         result.setdefault(due_day, []).append({
             'id': loan.id,
@@ -276,7 +290,7 @@ def get_inbox():
 @jwt_required()
 def unread_count():
     uid = int(get_jwt_identity())
-    return jsonify({'count': PrivateMessage.query.filter_by(recipient_id=uid, read=False).count()}), 200
+    return jsonify({'count': unread_counters.total_for(uid, ['user'])}), 200
 
 
 @recovery_bp.route('/messages/<int:msg_id>/read', methods=['PUT'])
@@ -338,7 +352,8 @@ def get_users_for_messaging():
         'id': u.id,
         'username': u.username,
         'role': u.role,
-        'profile_picture': u.profile_picture  
+        'profile_picture': u.profile_picture,
+        'avatar_hash': u.avatar_hash
     } for u in users]), 200
 
 
@@ -346,42 +361,28 @@ def get_users_for_messaging():
 @jwt_required()
 def get_conversation(other_user_id):
     user_id = int(get_jwt_identity())
-    # Get private messages
-    msgs = PrivateMessage.query.filter(
-        ((PrivateMessage.sender_id == user_id) & (PrivateMessage.recipient_id == other_user_id)) |
-        ((PrivateMessage.sender_id == other_user_id) & (PrivateMessage.recipient_id == user_id))
-    ).order_by(PrivateMessage.created_at).all()
-    
-    # Get call logs between these two users
-    calls = CallLog.query.filter(
-        ((CallLog.caller_id == user_id) & (CallLog.callee_id == other_user_id)) |
-        ((CallLog.caller_id == other_user_id) & (CallLog.callee_id == user_id))
-    ).order_by(CallLog.started_at).all()
-    
-    # Convert to a unified list with a 'type' field
-    timeline = []
-    for msg in msgs:
-        timeline.append({
-            'type': 'message',
-            'data': msg.to_dict()
-        })
-    for call in calls:
-        timeline.append({
-            'type': 'call_log',
-            'data': call.to_dict()
-        })
-    # Sort by timestamp
-    timeline.sort(key=lambda x: x['data']['created_at'] if x['type'] == 'message' else x['data']['started_at'])
-    return jsonify(timeline), 200
+    return jsonify(conversation_timeline.full_timeline(user_id, other_user_id)), 200
+
+
+@recovery_bp.route('/messages/conversation/<int:other_user_id>/timeline', methods=['GET'])
+@jwt_required()
+def get_conversation_timeline(other_user_id):
+    """
+    Latest ``limit`` messages and call logs (oldest first), or those before
+    ``before`` / after ``after`` (cursors from a previous response).
+    """
+    user_id = int(get_jwt_identity())
+    try:
+        return jsonify(conversation_timeline.page(user_id, other_user_id, request.args)), 200
+    except conversation_timeline.InvalidTimelineQuery as e:
+        return jsonify({'error': str(e)}), 400
 
 
 @recovery_bp.route('/messages/unread-count-by-user', methods=['GET'])
 @jwt_required()
 def unread_count_by_user():
-    uid   = int(get_jwt_identity())
-    users = User.query.filter(User.id != uid).all()
-    return jsonify({u.id: PrivateMessage.query.filter_by(recipient_id=uid, sender_id=u.id, read=False).count()
-                    for u in users}), 200
+    uid = int(get_jwt_identity())
+    return jsonify(unread_counters.counts_by_target(uid, 'user', User.id, User.id != uid)), 200
 
 
 @recovery_bp.route('/messages/upload', methods=['POST'])
@@ -412,15 +413,10 @@ def upload_message_attachment():
                 print(f"  -> Cloudinary error: {str(e)}")
                 return jsonify({'error': f'Cloudinary upload failed: {str(e)}'}), 500
         else:
-            # ✅ Store non-image files in database
-            print("  -> Using database storage")
+            # ✅ Store non-image files in the blob store
+            print("  -> Using blob store")
             try:
-                attachment = MessageAttachment(
-                    filename=f.filename,
-                    mime_type=mime,
-                    file_data=f.read()
-                )
-                db.session.add(attachment)
+                attachment = attachments.store_upload(f, mime_type=mime)
                 db.session.commit()
                 url = url_for('recovery.get_message_attachment', attachment_id=attachment.id, _external=False)
                 uploaded.append({
@@ -430,8 +426,8 @@ def upload_message_attachment():
                 })
             except Exception as e:
                 db.session.rollback()
-                print(f"  -> Database store error: {str(e)}")
-                return jsonify({'error': f'Database store failed: {str(e)}'}), 500
+                print(f"  -> Blob store error: {str(e)}")
+                return jsonify({'error': f'Blob store failed: {str(e)}'}), 500
 
     return jsonify({'uploads': uploaded}), 200
 
@@ -439,26 +435,20 @@ def upload_message_attachment():
 @jwt_required()
 def get_message_attachment(attachment_id):
     attachment = MessageAttachment.query.get_or_404(attachment_id)
-    return send_file(
-        io.BytesIO(attachment.file_data),
-        mimetype=attachment.mime_type,
-        as_attachment=True,
-        download_name=attachment.filename
-    )
+    return attachments.send_attachment(attachment)
 
 @recovery_bp.route('/comment-unread-counts', methods=['GET'])
 @jwt_required()
 def get_comment_unread_counts():
-    uid   = int(get_jwt_identity())
-    loans = Loan.query.filter(Loan.status == 'active').all()
-    result = {}
-    for loan in loans:
-        rec = UserLoanCommentRead.query.filter_by(user_id=uid, loan_id=loan.id).first()
-        lr  = rec.last_read_at if rec else datetime.min
-        result[loan.id] = Comment.query.filter(
-            Comment.loan_id == loan.id, Comment.user_id != uid, Comment.created_at > lr
-        ).count()
-    return jsonify(result), 200
+    uid = int(get_jwt_identity())
+    return jsonify(unread_counters.counts_by_target(uid, 'loan', Loan.id, Loan.status == 'active')), 200
+
+
+@recovery_bp.route('/badges', methods=['GET'])
+@jwt_required()
+def get_badges():
+    """Every unread badge of the current user; later changes arrive as `unread_badges` socket events."""
+    return jsonify(unread_counters.badges_for(int(get_jwt_identity()))), 200
 
 
 @recovery_bp.route('/loan/<int:loan_id>/comments/read-status', methods=['GET'])
@@ -468,7 +458,7 @@ def get_comments_with_read_status(loan_id):
     rec = UserLoanCommentRead.query.filter_by(user_id=uid, loan_id=loan_id).first()
     if not rec:
         rec = UserLoanCommentRead(user_id=uid, loan_id=loan_id, last_read_at=datetime.utcnow())
-        db.session.add(rec); db.session.commit()
+        db.session.add(rec); unread_counters.reset(uid, 'loan', loan_id); db.session.commit()
     comments = Comment.query.filter_by(loan_id=loan_id, parent_id=None).order_by(Comment.created_at).all()
     return jsonify({'last_read_at': rec.last_read_at.isoformat() + 'Z',
                     'comments': [c.to_dict() for c in comments]}), 200
@@ -481,7 +471,7 @@ def mark_comments_read(loan_id):
     rec = UserLoanCommentRead.query.filter_by(user_id=uid, loan_id=loan_id).first()
     if not rec:
         rec = UserLoanCommentRead(user_id=uid, loan_id=loan_id); db.session.add(rec)
-    rec.last_read_at = datetime.utcnow(); db.session.commit()
+    rec.last_read_at = datetime.utcnow(); unread_counters.reset(uid, 'loan', loan_id); db.session.commit()
     return jsonify({'success': True}), 200
 
 @recovery_bp.route('/loan/<int:loan_id>/claim', methods=['POST'])
@@ -624,7 +614,7 @@ def renew_loan_recovery(loan_id):
             interest_prepaid_period=None,
             interest_prepaid_amount=Decimal('0'),
             parent_loan_id=loan.id,
-            root_loan_id=loan.root_loan_id or loan.id
+            root_loan_id=loan_chain.root_id(loan)
         )
 
         db.session.add(new_loan)
@@ -919,7 +909,7 @@ def get_flagged_clients():
         loan = f.loan
         if not loan or loan.status != 'active':
             continue
-        loan = recalculate_loan(loan)
+        loan = project_loan(loan)
         client = loan.client
         livestock = loan.livestock
 
@@ -1047,7 +1037,7 @@ def get_bad_debt_loans():
     loans = Loan.query.filter_by(status='bad_debt').all()
     result = []
     for loan in loans:
-        loan = recalculate_loan(loan)
+        loan = project_loan(loan)
         client = loan.client
         livestock = loan.livestock
         collateral = loan.collateral_text or (f"{livestock.count} {livestock.livestock_type}" if livestock else '')
@@ -1129,17 +1119,5 @@ def total_unread_count():
     if not user_id:
         return jsonify({'error': 'Unauthorized'}), 401
 
-    # Private unread
-    private_unread = PrivateMessage.query.filter_by(recipient_id=user_id, read=False).count()
-    # Group unread
-    memberships = GroupMember.query.filter_by(user_id=user_id, is_active=True).all()
-    group_unread = 0
-    for m in memberships:
-        read_status = GroupReadStatus.query.filter_by(user_id=user_id, group_id=m.group_id).first()
-        last_read = read_status.last_read_at if read_status else datetime.min
-        group_unread += PrivateMessage.query.filter(
-            PrivateMessage.group_id == m.group_id,
-            PrivateMessage.sender_id != user_id,
-            PrivateMessage.created_at > last_read
-        ).count()
-    return jsonify({'count': private_unread + group_unread}), 200
\ No newline at end of file
+    # Private + group unread
+    return jsonify({'count': unread_counters.total_for(int(user_id), ['user', 'group'])}), 200
\ No newline at end of file
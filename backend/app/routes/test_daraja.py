@@ -1,7 +1,7 @@
 # app/routes/test_daraja.py
 from flask import Blueprint, jsonify, current_app
 from flask_jwt_extended import jwt_required
-from app.utils.daraja import DarajaAPI
+from app.utils.daraja import get_daraja
 from app.routes.payments import payments_bp
 
 
@@ -12,7 +12,7 @@ test_bp = Blueprint('test', __name__)
 def test_daraja():
     """Test Daraja API connection"""
     try:
-        daraja = DarajaAPI()
+        daraja = get_daraja()
         access_token = daraja.get_access_token()
         
         if access_token:
@@ -45,7 +45,7 @@ def test_stk_push():
         phone_number = data.get('phone_number', '254708374149')  # Test number
         amount = data.get('amount', 1)  # KSh 1 for testing
         
-        daraja = DarajaAPI()
+        daraja = get_daraja()
         
         result = daraja.stk_push(
             phone_number=phone_number,
@@ -95,7 +95,7 @@ def get_daraja_config():
 def test_daraja_setup():
     """Test Daraja API setup"""
     try:
-        daraja = DarajaAPI()
+        daraja = get_daraja()
         
         # Test access token
         token = daraja.get_access_token()
@@ -0,0 +1,396 @@
+"""
+Event-driven interest accrual.
+
+The daily plan only changes principal on compounding days (the day after the
+due date and every 7 days thereafter), so between two compounding events the
+daily interest is a constant.  The engine jumps from event to event and adds
+``day_interest * days`` in one step instead of walking the calendar.  Weekly
+loans advance one compounding event per elapsed week.
+
+Rounding is identical to the original day-by-day loops (kept in
+``app.routes.payments`` as ``_accrue_daily_loop`` / ``_accrue_weekly_loop``);
+run ``flask verify-accrual`` to diff the two.
+
+A nightly job (``accrue_active_loans``) persists every active loan up to the
+current day and stamps ``accrued_through``; read endpoints project loans
+through ``app.services.loan_view`` and only recalculate the stale ones.
+
+With ``compact`` (config ``LEDGER_COMPACT_ACCRUALS``) a run of daily accrual
+rows between two compounding events is recorded as a single
+``accrual_range`` row; see ``app.services.ledger.expand_accrual_range``.
+"""
+import traceback
+from decimal import Decimal, ROUND_HALF_UP
+from datetime import datetime, timedelta
+from flask import current_app, has_app_context
+from sqlalchemy import or_
+from app import db
+from app.models import Loan
+from app.services.ledger import ACCRUAL_RANGE, range_reference, record_ledger_entry
+
+DAILY_RATE = Decimal('0.045')
+WEEKLY_RATE = Decimal('0.30')
+CENT = Decimal('0.01')
+ONE_DAY = timedelta(days=1)
+ONE_WEEK = timedelta(days=7)
+
+
+def _midnight(d):
+    return datetime.combine(d, datetime.min.time())
+
+
+def _period_interest(principal, rate):
+    return (principal * rate).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def record_accrual(loan, amount, notes, event_date, save=True, event_type='accrual', reference='AUTO'):
+    """Write an accrual ledger row unless that date has already been recorded."""
+    if not save:
+        return
+    if not loan.last_accrual_recorded or event_date > loan.last_accrual_recorded:
+        record_ledger_entry(
+            loan=loan,
+            event_type=event_type,
+            amount=amount,
+            notes=notes,
+            event_date=event_date,
+            user_id=None,
+            reference=reference
+        )
+        loan.last_accrual_recorded = event_date
+
+
+def _complete_if_repaid(loan, unpaid):
+    if loan.current_principal <= CENT and unpaid <= CENT:
+        loan.status = 'completed'
+        loan.current_principal = Decimal('0')
+        loan.balance = Decimal('0')
+        if loan.livestock:
+            livestock = loan.livestock
+            loan.livestock_id = None
+            db.session.delete(livestock)
+
+
+# ---------------------------------------------------------------------------
+# Daily plan
+# ---------------------------------------------------------------------------
+
+def _compound_daily(loan, day, save):
+    """Capitalise unpaid interest on a compounding day."""
+    net_to_capitalise = max(Decimal('0'), loan.accrued_interest - loan.interest_paid)
+    if net_to_capitalise > 0:
+        loan.current_principal += net_to_capitalise
+        loan.accrued_interest -= net_to_capitalise
+        if loan.accrued_interest < 0:
+            loan.accrued_interest = Decimal('0')
+        record_accrual(
+            loan=loan,
+            amount=net_to_capitalise,
+            notes=f'Weekly compounding – net capitalised: {net_to_capitalise:.2f}',
+            event_date=_midnight(day),
+            save=save,
+            event_type='compound_interest',
+            reference='COMPOUND'
+        )
+        loan.interest_paid = Decimal('0')
+        loan.interest_prepaid_period = None
+        loan.interest_prepaid_amount = Decimal('0')
+        loan.last_compounding_date = day
+
+
+def _compact_default():
+    return has_app_context() and current_app.config.get('LEDGER_COMPACT_ACCRUALS', False)
+
+
+def _accrue_span(loan, first, last, skip_day, save, compact=False):
+    """
+    Add daily interest for every day in [first, last] except ``skip_day``.
+    Principal is constant across the span.  Days that still need a ledger row
+    are written one by one (or as one range row with ``compact``); everything
+    else is added in a single step.
+    """
+    day_interest = _period_interest(loan.current_principal, DAILY_RATE)
+
+    bulk_last = last
+    if save:
+        if loan.last_accrual_recorded is None:
+            bulk_last = first - ONE_DAY
+        else:
+            bulk_last = min(last, loan.last_accrual_recorded.date())
+
+    if bulk_last >= first:
+        days = (bulk_last - first).days + 1
+        if first <= skip_day <= bulk_last:
+            days -= 1
+        if days > 0:
+            loan.accrued_interest += day_interest * days
+
+    day = max(first, bulk_last + ONE_DAY)
+    if compact and day < last:
+        days = (last - day).days + 1
+        end = last
+        if day <= skip_day <= last:
+            days -= 1
+            if skip_day == last:
+                end = last - ONE_DAY
+        if days > 1:
+            loan.accrued_interest += day_interest * days
+            record_accrual(
+                loan=loan,
+                amount=day_interest * days,
+                notes=(f'Daily interest accrued for {day.strftime("%Y-%m-%d")} to '
+                       f'{end.strftime("%Y-%m-%d")} ({days} days at {day_interest:.2f})'),
+                event_date=_midnight(end),
+                save=save,
+                event_type=ACCRUAL_RANGE,
+                reference=range_reference(day, end)
+            )
+            return
+    while day <= last:
+        if day != skip_day:
+            loan.accrued_interest += day_interest
+            record_accrual(
+                loan=loan,
+                amount=day_interest,
+                notes=f'Daily interest accrued for {day.strftime("%Y-%m-%d")}',
+                event_date=_midnight(day),
+                save=save
+            )
+        day += ONE_DAY
+
+
+def accrue_daily(loan, today, save=True, compact=False):
+    """
+    Daily accrual with weekly compounding:
+    - Day 0: interest added immediately (1 day).
+    - Day 1: NO interest added.
+    - Day 2 onwards: interest added each day, including the due date.
+    - Compounding: day after due date and every 7 days thereafter,
+      capitalises any unpaid interest BEFORE adding that day's interest.
+    """
+    if not loan.disbursement_date:
+        return loan
+
+    disb = loan.disbursement_date.date()
+    if not loan.last_compounding_date:
+        loan.last_compounding_date = disb
+    if loan.last_interest_payment_date is None:
+        loan.last_interest_payment_date = _midnight(disb)
+
+    due_date = loan.due_date.date() if loan.due_date else disb + ONE_WEEK
+
+    # ---- Day-zero interest (added once) ----
+    if loan.last_interest_payment_date.date() == disb and loan.accrued_interest == 0:
+        day_interest = _period_interest(loan.current_principal, DAILY_RATE)
+        loan.accrued_interest += day_interest
+        record_accrual(
+            loan=loan,
+            amount=day_interest,
+            notes='Daily interest accrued on disbursement day (day 0)',
+            event_date=_midnight(disb),
+            save=save
+        )
+
+    start = loan.last_interest_payment_date.date() + ONE_DAY
+    if start <= today:
+        day_one_date = disb + ONE_DAY
+        first_compounding = due_date + ONE_DAY
+        if start <= first_compounding:
+            next_event = first_compounding
+        else:
+            next_event = start + timedelta(days=(first_compounding - start).days % 7)
+
+        day = start
+        while day <= today:
+            if day == next_event:
+                _compound_daily(loan, day, save)
+                next_event += ONE_WEEK
+            span_end = min(today, next_event - ONE_DAY)
+            _accrue_span(loan, day, span_end, day_one_date, save, compact)
+            day = span_end + ONE_DAY
+
+        loan.last_interest_payment_date = _midnight(today)
+
+    unpaid = max(Decimal('0'), loan.accrued_interest - loan.interest_paid)
+    loan.balance = loan.current_principal + unpaid
+    _complete_if_repaid(loan, unpaid)
+    return loan
+
+
+# ---------------------------------------------------------------------------
+# Weekly plan
+# ---------------------------------------------------------------------------
+
+def _prepaid_week_index(loan, disb, base_week, weeks):
+    """Index of the elapsed week the prepaid marker belongs to, or None."""
+    key = loan.interest_prepaid_period
+    prefix = f"{disb.isoformat()}-W"
+    if not key or not key.startswith(prefix):
+        return None
+    try:
+        week_num = int(key[len(prefix):])
+    except ValueError:
+        return None
+    if f"{prefix}{week_num}" != key:
+        return None
+    index = week_num - base_week
+    return index if 0 <= index < weeks else None
+
+
+def accrue_weekly(loan, today, save=True):
+    """
+    Compound-interest engine for weekly loans.
+
+    Compounding fires at midnight of the day AFTER the due date.
+    Interest for the due date itself is NOT added.
+    """
+    if not loan.disbursement_date:
+        return loan
+
+    disb = loan.disbursement_date.date()
+    current_due = loan.due_date.date() if loan.due_date else disb + ONE_WEEK
+
+    if current_due + ONE_DAY <= today:
+        weeks = (today - current_due - ONE_DAY).days // 7 + 1
+        base_week = (current_due - timedelta(days=6) - disb).days // 7
+        prepaid_index = _prepaid_week_index(loan, disb, base_week, weeks)
+
+        principal = loan.current_principal
+        for index in range(weeks):
+            week_interest = _period_interest(principal, WEEKLY_RATE)
+            prepaid = Decimal('0')
+            if index == prepaid_index:
+                prepaid = loan.interest_prepaid_amount or Decimal('0')
+
+            net_to_capitalise = max(Decimal('0'), week_interest - prepaid)
+            if net_to_capitalise > 0:
+                principal += net_to_capitalise
+                if save:
+                    loan.current_principal = principal
+                    loan.accrued_interest = Decimal('0')
+                    record_accrual(
+                        loan=loan,
+                        amount=net_to_capitalise,
+                        notes=(
+                            f'Weekly compound interest (30%) – net after prepaid: '
+                            f'{net_to_capitalise:.2f}'
+                        ),
+                        event_date=_midnight(current_due + index * ONE_WEEK + ONE_DAY),
+                        save=save,
+                        event_type='compound_interest',
+                        reference='COMPOUND'
+                    )
+
+            if index == prepaid_index:
+                loan.interest_prepaid_period = None
+                loan.interest_prepaid_amount = Decimal('0')
+
+        loan.current_principal = principal
+        loan.accrued_interest = Decimal('0')
+        current_due += weeks * ONE_WEEK
+
+    loan.due_date = _midnight(current_due)
+    loan.last_interest_payment_date = _midnight(today)
+
+    # Balance = principal only (accrued_interest is zero after compounding)
+    loan.balance = loan.current_principal
+
+    unpaid_interest = max(Decimal('0'), loan.accrued_interest - loan.interest_paid)
+    if loan.current_principal + unpaid_interest <= CENT:
+        loan.status = 'completed'
+        loan.current_principal = Decimal('0')
+        loan.balance = Decimal('0')
+        if loan.livestock:
+            livestock = loan.livestock
+            loan.livestock_id = None
+            db.session.delete(livestock)
+
+    return loan
+
+
+# ---------------------------------------------------------------------------
+# Entry points
+# ---------------------------------------------------------------------------
+
+def recalculate_loan(loan, save=True, today=None, compact=None):
+    """Bring a loan's financial fields fully up-to-date."""
+    if loan.status != 'active':
+        return loan
+    if today is None:
+        today = datetime.now().date()
+    if loan.interest_rate == 0:
+        loan.balance = loan.current_principal
+        if save:
+            loan.accrued_through = today
+        return loan
+
+    if not loan.disbursement_date:
+        loan.disbursement_date = datetime.now()
+    if not loan.last_interest_payment_date:
+        loan.last_interest_payment_date = loan.disbursement_date
+    if loan.repayment_plan == 'daily' and not loan.last_compounding_date:
+        loan.last_compounding_date = loan.disbursement_date
+
+    if loan.repayment_plan == 'daily':
+        if compact is None:
+            compact = _compact_default()
+        accrue_daily(loan, today, save=save, compact=compact)
+    else:
+        accrue_weekly(loan, today, save=save)
+
+    if save:
+        loan.accrued_through = today
+    return loan
+
+
+def is_stale(loan, today=None):
+    """True when an active loan has not been persisted up to ``today``."""
+    if loan.status != 'active':
+        return False
+    if today is None:
+        today = datetime.now().date()
+    return loan.accrued_through is None or loan.accrued_through < today
+
+
+def accrue_active_loans(today=None, batch_size=200):
+    """
+    Bring every stale active loan current, writing its ledger rows and
+    stamping ``accrued_through``.  Loans are processed in id order in batches
+    with one commit per batch; a loan that fails is rolled back on its own
+    savepoint and retried on the next run.
+
+    Every process that calls ``create_app`` schedules this job, so each batch
+    is locked (``FOR UPDATE SKIP LOCKED``): rows another run holds are left
+    to it, and a loan it finished while we waited is skipped by the
+    ``accrued_through`` re-check instead of being accrued twice.
+    """
+    if today is None:
+        today = datetime.now().date()
+
+    processed = failed = 0
+    last_id = 0
+    while True:
+        loans = Loan.query.filter(
+            Loan.status == 'active',
+            Loan.id > last_id,
+            or_(Loan.accrued_through.is_(None), Loan.accrued_through < today)
+        ).order_by(Loan.id).limit(batch_size).with_for_update(
+            skip_locked=True, of=Loan      # not the eager-joined livestock
+        ).populate_existing().all()
+        if not loans:
+            break
+
+        for loan in loans:
+            last_id = loan.id
+            if not is_stale(loan, today):
+                continue
+            try:
+                with db.session.begin_nested():
+                    recalculate_loan(loan, save=True, today=today)
+                processed += 1
+            except Exception:
+                traceback.print_exc()
+                failed += 1
+        db.session.commit()
+
+    return {'processed': processed, 'failed': failed, 'as_of': today.isoformat()}
@@ -0,0 +1,122 @@
+"""
+MessageAttachment rows backed by the blob store (app.utils.blob_store).
+
+``store_upload`` streams an uploaded file into the store and returns the
+row (added to the session, not committed).  ``send_attachment`` streams a
+stored file with ``send_file`` from disk, so Range requests,
+``If-None-Match`` and ``If-Modified-Since`` work; the ETag is the SHA-256.
+Rows still carrying ``file_data`` are served from it until
+``migrate_blobs`` has moved them.  While no durable store is configured
+(``BLOB_STORE_PATH`` unset) new uploads keep their bytes in ``file_data``
+as well, and are served from it if the blob is gone after a redeploy.
+
+Deleting an attachment leaves its blob in place; ``gc_blobs`` removes
+blobs no row points at once they are older than ``GC_GRACE`` (an upload
+stores its blob before its row is committed).
+"""
+import io
+import time
+from flask import send_file
+from sqlalchemy import or_
+from app import db
+from app.models import MessageAttachment
+from app.utils.blob_store import get_blob_store
+
+MIGRATE_BATCH = 100
+GC_GRACE = 24 * 3600
+
+
+def store_upload(file, filename=None, mime_type=None):
+    store = get_blob_store()
+    sha256, size = store.put(file.stream)
+    attachment = MessageAttachment(
+        filename=filename or file.filename,
+        mime_type=mime_type or file.mimetype or 'application/octet-stream',
+        sha256=sha256,
+        size=size,
+    )
+    if not store.durable:
+        # the blob may not survive a redeploy; keep the bytes until migrate_blobs
+        # runs against a durable store
+        with store.open(sha256) as f:
+            attachment.file_data = f.read()
+    db.session.add(attachment)
+    return attachment
+
+
+def send_attachment(attachment):
+    store = get_blob_store()
+    # a row migrated to a non-durable store still has its bytes if the blob is gone
+    if attachment.sha256 and (store.exists(attachment.sha256) or attachment.file_data is None):
+        path = store.path(attachment.sha256)
+        source = path if path else store.open(attachment.sha256)
+        return send_file(
+            source,
+            mimetype=attachment.mime_type,
+            as_attachment=True,
+            download_name=attachment.filename,
+            etag=attachment.sha256,
+            conditional=True,
+            max_age=3600,
+        )
+    return send_file(
+        io.BytesIO(attachment.file_data),
+        mimetype=attachment.mime_type,
+        as_attachment=True,
+        download_name=attachment.filename
+    )
+
+
+def gc_blobs(grace=GC_GRACE):
+    """
+    Delete blobs no attachment row points at and that were last stored more
+    than ``grace`` seconds ago.  Run offline (``flask gc-attachment-blobs``);
+    returns the number deleted.
+    """
+    store = get_blob_store()
+    cutoff = time.time() - grace
+    candidates = [key for key, stored_at in store.keys() if stored_at < cutoff]
+    deleted = 0
+    for start in range(0, len(candidates), MIGRATE_BATCH):
+        batch = candidates[start:start + MIGRATE_BATCH]
+        used = {sha for (sha,) in db.session.query(MessageAttachment.sha256).filter(
+            MessageAttachment.sha256.in_(batch)
+        )}
+        for key in batch:
+            if key not in used:
+                store.delete(key)
+                deleted += 1
+    return deleted
+
+
+def migrate_blobs(batch_size=MIGRATE_BATCH):
+    """
+    Move ``file_data`` of existing rows into the blob store, ``batch_size``
+    rows per transaction.  The column is cleared only once the blob is
+    confirmed on durable storage; with a non-durable store the bytes stay
+    in the row as well and a later run (with ``BLOB_STORE_PATH`` set)
+    clears them.  Returns the number of rows moved.
+    """
+    store = get_blob_store()
+    pending = MessageAttachment.sha256.is_(None)
+    if store.durable:
+        pending = or_(pending, MessageAttachment.file_data.isnot(None))
+    moved, last_id = 0, 0
+    while True:
+        ids = [row.id for row in db.session.query(MessageAttachment.id).filter(
+            MessageAttachment.id > last_id, pending
+        ).order_by(MessageAttachment.id).limit(batch_size)]
+        if not ids:
+            return moved
+        for attachment in MessageAttachment.query.filter(MessageAttachment.id.in_(ids)):
+            data = attachment.file_data or b''
+            sha256, size = store.put(io.BytesIO(data))
+            if not store.exists(sha256):
+                raise RuntimeError(f'Blob {sha256} of attachment {attachment.id} was not stored')
+            attachment.sha256, attachment.size = sha256, size
+            if store.durable:
+                attachment.file_data = None
+        db.session.commit()
+        db.session.expunge_all()   # release the batch's bytes before the next one
+        moved += len(ids)
+        last_id = ids[-1]
@@ -0,0 +1,138 @@
+"""
+Audit log writer.
+
+``log_audit`` (app.utils.security) no longer commits the caller's session.
+By default the entry is put on a bounded in-memory queue and a background
+thread writes queued entries in batches: one multi-row INSERT per
+``BATCH_SIZE`` entries or ``FLUSH_INTERVAL`` seconds, on its own
+connection.  When the queue is full the caller waits up to
+``ENQUEUE_TIMEOUT`` and then writes its entry inline, so a slow database
+slows producers down instead of losing entries.  Remaining entries are
+written at interpreter exit (``shutdown``).
+
+With ``atomic=True`` the entry is added to the caller's session instead and
+commits or rolls back with the change it describes.  ``AUDIT_LOG_ASYNC=false``
+(or no ``init_audit`` yet) writes every entry inline on its own connection;
+the caller's session is never committed here.
+"""
+import atexit
+import queue
+import threading
+from datetime import datetime
+from sqlalchemy import insert
+from app import db
+from app.models import AuditLog
+
+MAX_PENDING = 10000
+BATCH_SIZE = 200
+FLUSH_INTERVAL = 1.0
+ENQUEUE_TIMEOUT = 1.0
+
+_table = AuditLog.__table__
+
+
+def entry(action, entity_type=None, entity_id=None, details=None, user_id=None, ip_address=None):
+    return {
+        'user_id': user_id,
+        'action': action,
+        'entity_type': entity_type,
+        'entity_id': entity_id,
+        'details': details,
+        'ip_address': ip_address,
+        'created_at': datetime.utcnow(),   # when it happened, not when it was written
+    }
+
+
+def write_rows(rows):
+    """Insert ``rows`` on their own connection and transaction."""
+    with db.engine.begin() as conn:
+        conn.execute(insert(_table), rows)
+
+
+class AuditWriter:
+    def __init__(self, app, max_pending=MAX_PENDING):
+        self.app = app
+        self.queue = queue.Queue(maxsize=max_pending)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, row):
+        try:
+            self.queue.put(row, timeout=ENQUEUE_TIMEOUT)
+        except queue.Full:
+            self.write([row])            # back-pressure: the caller pays for its own entry
+
+    def write(self, rows):
+        with self.app.app_context():
+            try:
+                write_rows(rows)
+            except Exception as e:
+                if len(rows) == 1:
+                    print(f"Audit log error: {e} ({rows[0]['action']})")
+                    return
+                for row in rows:         # find the bad entry, keep the rest
+                    self.write([row])
+
+    def _take_batch(self, timeout):
+        try:
+            rows = [self.queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(rows) < BATCH_SIZE:
+            try:
+                rows.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+
+    def _run(self):
+        while not self._stop.is_set():
+            rows = self._take_batch(FLUSH_INTERVAL)
+            if rows:
+                self.write(rows)
+        self.drain()
+
+    def drain(self):
+        """Write everything queued so far."""
+        while True:
+            rows = self._take_batch(0)
+            if not rows:
+                return
+            self.write(rows)
+
+    def close(self, timeout=10):
+        self._stop.set()
+        self._thread.join(timeout)
+        self.drain()
+
+
+writer = None
+
+
+def init_audit(app):
+    global writer
+    if app.config.get('AUDIT_LOG_ASYNC', True) and writer is None:
+        writer = AuditWriter(app)
+        atexit.register(shutdown)
+    return writer
+
+
+def record(row, atomic=False):
+    if atomic:
+        db.session.add(AuditLog(**row))
+    elif writer is not None:
+        writer.submit(row)
+    else:
+        write_rows([row])
+
+
+def flush():
+    """Write queued entries now (e.g. before reading the audit log back)."""
+    if writer is not None:
+        writer.drain()
+
+
+def shutdown():
+    if writer is not None:
+        writer.close()
@@ -0,0 +1,79 @@
+"""
+Profile pictures for users and groups, stored as thumbnails on Cloudinary.
+
+Clients still upload a ``data:image/...;base64`` string.  It is decoded,
+hashed with SHA-256 and uploaded once under ``avatars/<sha256>`` with an
+incoming transformation that crops it to ``AVATAR_SIZE`` pixels square.  The
+row keeps only the versioned Cloudinary URL (immutable, so the CDN caches
+it long-term) and the hash, which is all that user, group and call payloads
+carry.  ``flask backfill-avatars`` converts rows saved before this.
+"""
+import base64
+import binascii
+import hashlib
+from app import db
+from app.models import Group, User
+from app.utils.cloudinary_upload import get_uploader, with_retries
+
+AVATAR_SIZE = 256
+AVATAR_FOLDER = 'avatars'
+ALLOWED_TYPES = ('image/jpeg', 'image/png', 'image/gif', 'image/webp')
+
+
+class InvalidAvatar(ValueError):
+    pass
+
+
+def is_inline(value):
+    return bool(value) and value.startswith('data:image/')
+
+
+def decode_data_url(data_url, max_bytes=None):
+    """``(mime, bytes)`` of a ``data:image/...;base64,`` string."""
+    if not is_inline(data_url) or ',' not in data_url:
+        raise InvalidAvatar('Invalid image format')
+    header, encoded = data_url.split(',', 1)
+    try:
+        data = base64.b64decode(encoded)
+    except (binascii.Error, ValueError):
+        raise InvalidAvatar('Invalid base64 data')
+    if max_bytes and len(data) > max_bytes:
+        raise InvalidAvatar(f'Image too large (max {max_bytes // 1_000_000}MB)')
+    mime = header.split(';')[0].split(':')[1]
+    if mime not in ALLOWED_TYPES:
+        raise InvalidAvatar('Unsupported image type')
+    return mime, data
+
+
+def store_avatar(data_url, max_bytes=None):
+    """Upload a data URL as a thumbnail; returns ``(url, sha256)``."""
+    _, data = decode_data_url(data_url, max_bytes)
+    sha256 = hashlib.sha256(data).hexdigest()
+    result = with_retries(lambda: get_uploader().upload(
+        data,
+        public_id=sha256,
+        folder=AVATAR_FOLDER,
+        overwrite=False,             # same picture, same asset
+        resource_type='image',
+        transformation=[{'width': AVATAR_SIZE, 'height': AVATAR_SIZE, 'crop': 'fill', 'gravity': 'face'}],
+    ))
+    return result['secure_url'], sha256
+
+
+def backfill_avatars():
+    """Move inline base64 user and group pictures to thumbnails; returns ``(converted, failed)``."""
+    converted = failed = 0
+    for model in (User, Group):
+        ids = [row.id for row in db.session.query(model.id).filter(model.profile_picture.like('data:image/%'))]
+        for row_id in ids:
+            row = db.session.get(model, row_id)
+            try:
+                row.profile_picture, row.avatar_hash = store_avatar(row.profile_picture)
+                db.session.commit()
+                converted += 1
+            except Exception as e:
+                db.session.rollback()
+                failed += 1
+                print(f"{model.__name__} {row_id}: avatar not converted ({e})")
+            db.session.expunge_all()
+    return converted, failed
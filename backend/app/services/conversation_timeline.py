@@ -0,0 +1,134 @@
+"""
+Keyset-paginated timeline of a one-to-one conversation.
+
+Messages and call logs between two users are merged in SQL with
+``UNION ALL`` on ``(timestamp, kind, id)``: the page of keys is picked
+there, and only the rows on that page are loaded and serialized.
+
+``before=<cursor>`` (or no cursor) returns the latest ``limit`` entries
+older than the cursor, ``after=<cursor>`` the entries newer than it, for a
+client catching up after a reconnect.  Entries are always returned oldest
+first, as ``{'type': 'message' | 'call_log', 'data': to_dict()}``.
+"""
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import and_, literal, or_, select, tuple_, union_all
+from sqlalchemy.orm import selectinload
+from app import db
+from app.models import CallLog, PrivateMessage
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class InvalidTimelineQuery(ValueError):
+    pass
+
+
+def encode_cursor(ts, kind, entry_id):
+    raw = json.dumps([ts.isoformat(), kind, entry_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        ts, kind, entry_id = json.loads(raw)
+        if kind not in ('message', 'call_log'):
+            raise ValueError(kind)
+        return datetime.fromisoformat(ts), kind, int(entry_id)
+    except (ValueError, TypeError):
+        raise InvalidTimelineQuery('Invalid cursor')
+
+
+def _between(sender_col, recipient_col, user_id, other_id):
+    return or_(and_(sender_col == user_id, recipient_col == other_id),
+               and_(sender_col == other_id, recipient_col == user_id))
+
+
+def _keys(user_id, other_id):
+    messages = select(
+        PrivateMessage.created_at.label('ts'), literal('message').label('kind'), PrivateMessage.id.label('id')
+    ).where(_between(PrivateMessage.sender_id, PrivateMessage.recipient_id, user_id, other_id))
+    calls = select(
+        CallLog.started_at.label('ts'), literal('call_log').label('kind'), CallLog.id.label('id')
+    ).where(_between(CallLog.caller_id, CallLog.callee_id, user_id, other_id))
+    return union_all(messages, calls).subquery('timeline')
+
+
+def _load(keys):
+    """Serialize ``(ts, kind, id)`` keys in order, with one query per kind."""
+    message_ids = [k.id for k in keys if k.kind == 'message']
+    call_ids = [k.id for k in keys if k.kind == 'call_log']
+    messages = {}
+    if message_ids:
+        messages = {m.id: m for m in PrivateMessage.query.options(
+            selectinload(PrivateMessage.sender), selectinload(PrivateMessage.recipient),
+            selectinload(PrivateMessage.reply_to),
+        ).filter(PrivateMessage.id.in_(message_ids))}
+    calls = {c.id: c for c in CallLog.query.filter(CallLog.id.in_(call_ids))} if call_ids else {}
+
+    items = []
+    for k in keys:
+        obj = messages.get(k.id) if k.kind == 'message' else calls.get(k.id)
+        if obj is not None:
+            items.append({'type': k.kind, 'data': obj.to_dict()})
+    return items
+
+
+def _limit(args):
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise InvalidTimelineQuery('Invalid limit')
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def page(user_id, other_id, args):
+    """
+    ``{'items', 'before_cursor', 'after_cursor', 'has_more'}``.
+    ``before_cursor`` is set while older entries remain; ``after_cursor``
+    marks the newest entry returned (or echoes ``after``) for the next
+    "since" fetch; ``has_more`` tells an ``after`` caller to fetch again.
+    """
+    if args.get('before') and args.get('after'):
+        raise InvalidTimelineQuery('Pass either before or after, not both')
+    limit = _limit(args)
+    t = _keys(user_id, other_id)
+    key = tuple_(t.c.ts, t.c.kind, t.c.id)
+    q = select(t.c.ts, t.c.kind, t.c.id).where(t.c.ts.isnot(None))
+
+    if args.get('after'):
+        q = q.where(key > tuple_(*decode_cursor(args['after'])))
+        rows = db.session.execute(q.order_by(t.c.ts, t.c.kind, t.c.id).limit(limit + 1)).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        older_remain = False
+    else:
+        if args.get('before'):
+            q = q.where(key < tuple_(*decode_cursor(args['before'])))
+        rows = db.session.execute(q.order_by(t.c.ts.desc(), t.c.kind.desc(), t.c.id.desc()).limit(limit + 1)).all()
+        older_remain = len(rows) > limit
+        rows = rows[:limit][::-1]
+        has_more = older_remain
+
+    if rows:
+        after_cursor = encode_cursor(*rows[-1])
+    else:
+        after_cursor = args.get('after') or None
+    return {
+        'items': _load(rows),
+        'before_cursor': encode_cursor(*rows[0]) if rows and older_remain else None,
+        'after_cursor': after_cursor,
+        'has_more': has_more,
+    }
+
+
+def full_timeline(user_id, other_id):
+    """Every entry, oldest first (the unpaginated conversation endpoint)."""
+    t = _keys(user_id, other_id)
+    rows = db.session.execute(
+        select(t.c.ts, t.c.kind, t.c.id).order_by(t.c.ts, t.c.kind, t.c.id)
+    ).all()
+    return _load(rows)
@@ -0,0 +1,184 @@
+"""
+Keeps ``daily_financial_rollup`` in step with the money tables.
+
+``before_flush`` turns every inserted, updated or deleted Transaction,
+PettyCashExpense, SalaryTransaction and InvestorReturn into
+(day, category, delta) triples, and ``after_flush`` applies them with one
+``INSERT ... ON CONFLICT DO UPDATE SET amount = amount + excluded.amount``
+on the same connection, so the rollup commits or rolls back with the write
+that caused it.  Bulk ``query.update()`` / raw SQL bypass the ORM events;
+run ``python manage.py rebuild-financial-rollup`` after those.
+"""
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from app import db
+from app.models import (
+    Transaction, PettyCashExpense, SalaryTransaction, InvestorReturn, DailyFinancialRollup
+)
+from app.services.reporting import money_flows, transaction_category
+
+_PENDING_KEY = 'financial_rollup_deltas'
+
+
+def _as_day(value):
+    if value is None:
+        return datetime.utcnow().date()   # column default not applied yet
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _transaction(v):
+    category = transaction_category(v['transaction_type'], v['payment_type'], v['payment_method'])
+    if not category or v['amount'] is None:
+        return None
+    amount = abs(v['amount']) if category == 'waived' else v['amount']
+    return _as_day(v['created_at']), category, amount
+
+
+def _petty_cash(v):
+    if v['amount'] is None:
+        return None
+    return _as_day(v['date']), 'petty_cash', v['amount']
+
+
+def _salary(v):
+    if v['transaction_type'] != 'salary_payment' or v['amount'] is None:
+        return None
+    return _as_day(v['created_at']), 'salaries', v['amount']
+
+
+def _investor_return(v):
+    if (v['status'] or 'completed') != 'completed' or v['amount'] is None:
+        return None
+    return _as_day(v['return_date']), 'investor_returns', v['amount']
+
+
+# model -> (columns the category depends on, classifier)
+TRACKED = {
+    Transaction: (('transaction_type', 'payment_type', 'payment_method', 'amount', 'created_at'), _transaction),
+    PettyCashExpense: (('amount', 'date'), _petty_cash),
+    SalaryTransaction: (('transaction_type', 'amount', 'created_at'), _salary),
+    InvestorReturn: (('status', 'amount', 'return_date'), _investor_return),
+}
+
+
+def _values(obj, columns, old=False):
+    state = inspect(obj)
+    values = {}
+    for name in columns:
+        history = state.attrs[name].history
+        if old and history.deleted:
+            values[name] = history.deleted[0]
+        else:
+            values[name] = getattr(obj, name)
+    return values
+
+
+def _changed(obj, columns):
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in columns)
+
+
+def _collect(session, flush_context, instances):
+    deltas = defaultdict(Decimal)
+
+    def add(entry, sign):
+        if entry:
+            day, category, amount = entry
+            deltas[(day, category)] += sign * Decimal(amount)
+
+    for obj in session.new:
+        spec = TRACKED.get(type(obj))
+        if spec:
+            add(spec[1](_values(obj, spec[0])), 1)
+    for obj in session.deleted:
+        spec = TRACKED.get(type(obj))
+        if spec:
+            add(spec[1](_values(obj, spec[0], old=True)), -1)
+    for obj in session.dirty:
+        spec = TRACKED.get(type(obj))
+        if spec and _changed(obj, spec[0]):
+            add(spec[1](_values(obj, spec[0], old=True)), -1)
+            add(spec[1](_values(obj, spec[0])), 1)
+
+    deltas = {k: v for k, v in deltas.items() if v}
+    if deltas:
+        session.info[_PENDING_KEY] = deltas
+    else:
+        session.info.pop(_PENDING_KEY, None)
+
+
+def dialect_insert(dialect_name):
+    """The dialect's ``insert`` construct, which supports ``on_conflict_do_update``."""
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise RuntimeError(f'ON CONFLICT upserts not supported on {dialect_name}')
+    return insert
+
+
+def apply_deltas(connection, deltas):
+    """Add ``{(day, category): amount}`` to the rollup in one statement."""
+    if not deltas:
+        return
+    table = DailyFinancialRollup.__table__
+    insert = dialect_insert(connection.dialect.name)
+    now = datetime.utcnow()
+    stmt = insert(table).values([
+        {'rollup_date': day, 'category': category, 'amount': amount, 'updated_at': now}
+        for (day, category), amount in sorted(deltas.items())
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['rollup_date', 'category'],
+        set_={'amount': table.c.amount + stmt.excluded.amount, 'updated_at': stmt.excluded.updated_at}
+    )
+    connection.execute(stmt)
+
+
+def _apply(session, flush_context):
+    deltas = session.info.pop(_PENDING_KEY, None)
+    if deltas:
+        apply_deltas(session.connection(), deltas)
+
+
+def _load_old_value(target, value, oldvalue, initiator):
+    pass
+
+
+def register_rollup_listeners():
+    if not event.contains(Session, 'before_flush', _collect):
+        event.listen(Session, 'before_flush', _collect)
+        event.listen(Session, 'after_flush', _apply)
+        # active_history loads the committed value of an expired attribute
+        # before it is overwritten, so _values(old=True) always has it
+        for model, (columns, _) in TRACKED.items():
+            for name in columns:
+                event.listen(getattr(model, name), 'set', _load_old_value, active_history=True)
+
+
+def rebuild_rollup(start_date=None, end_date=None):
+    """
+    Recompute the rollup from the source tables (all history, or the
+    inclusive date range given).  Returns the number of rows written.
+    """
+    q = DailyFinancialRollup.query
+    if start_date is not None:
+        q = q.filter(DailyFinancialRollup.rollup_date >= start_date,
+                     DailyFinancialRollup.rollup_date <= end_date)
+    q.delete(synchronize_session=False)
+
+    flows = money_flows(start_date, end_date)
+    now = datetime.utcnow()
+    rows = [
+        {'rollup_date': day, 'category': category, 'amount': amount, 'updated_at': now}
+        for day, cats in flows.items() if day is not None
+        for category, amount in cats.items()
+    ]
+    if rows:
+        db.session.execute(DailyFinancialRollup.__table__.insert(), rows)
+    db.session.commit()
+    return len(rows)
@@ -0,0 +1,192 @@
+"""
+Availability index behind the public livestock gallery.
+
+One statement joins active livestock to its latest loan, filters out what
+must not be shown, orders by availability and paginates in the database.
+The serialized pages are kept in process memory, keyed by page size and
+number, together with an ETag of the body.
+
+The cache is dropped when a commit touched Livestock or a Loan's status /
+due date / collateral, when the day changes (``daysRemaining`` is relative
+to today) and in any case after ``MAX_AGE`` seconds, which also covers
+writes made by other processes or bulk updates.
+"""
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import Date, and_, case, event, func, inspect, literal, or_
+from sqlalchemy.orm import Session
+from app import db
+from app.models import Livestock, Loan
+from app.services.livestock_loans import latest_loans, latest_loan_join
+
+MAX_AGE = 300
+MAX_PER_PAGE = 48
+MAX_CACHED_PAGES = 64
+DEFAULT_LOCATION = 'Isinya, Kajiado'
+LOCATION_KEYWORDS = ('isinya', 'kajiado', 'town', 'county', 'moonlight', 'kwa', 'timo')
+LOAN_FIELDS = ('status', 'due_date', 'livestock_id')
+
+_lock = threading.Lock()
+_state = {'version': 0, 'built_for': None, 'built_at': 0.0, 'pages': {}}
+
+
+# ---------------------------------------------------------------------------
+# Invalidation
+# ---------------------------------------------------------------------------
+
+def invalidate():
+    with _lock:
+        _state['version'] += 1
+        _state['pages'] = {}
+
+
+def _touches_gallery(obj):
+    if isinstance(obj, Livestock):
+        return True
+    if isinstance(obj, Loan):
+        state = inspect(obj)
+        if state.pending or state.deleted or state.was_deleted:
+            return True
+        return any(state.attrs[name].history.has_changes() for name in LOAN_FIELDS)
+    return False
+
+
+def _mark(session, flush_context, instances):
+    if session.info.get('gallery_dirty'):
+        return
+    if any(_touches_gallery(obj) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info['gallery_dirty'] = True
+
+
+def _after_commit(session):
+    if session.info.pop('gallery_dirty', False):
+        invalidate()
+
+
+def _after_rollback(session, previous_transaction):
+    session.info.pop('gallery_dirty', None)
+
+
+def register_gallery_listeners():
+    if not event.contains(Session, 'before_flush', _mark):
+        event.listen(Session, 'before_flush', _mark)
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_soft_rollback', _after_rollback)
+
+
+# ---------------------------------------------------------------------------
+# Index query
+# ---------------------------------------------------------------------------
+
+def _index_query(today):
+    latest = latest_loans()
+    # collateral of an active loan that is not yet due: listed as "available in N days"
+    pending = and_(
+        Livestock.client_id.isnot(None),
+        latest.c.status == 'active',
+        or_(latest.c.due_date.is_(None), func.date(latest.c.due_date) >= literal(today, Date)),
+    )
+    visible = or_(
+        latest.c.id.is_(None),
+        latest.c.status.in_(['active', 'claimed']),
+        and_(Livestock.client_id.is_(None), or_(latest.c.status.is_(None), latest.c.status != 'completed')),
+    )
+    return db.session.query(Livestock, latest.c.status, latest.c.due_date).outerjoin(
+        latest, latest_loan_join(latest, Livestock.id)
+    ).filter(
+        Livestock.status == 'active', visible
+    ).order_by(
+        case((pending, 1), else_=0),
+        case((pending, func.coalesce(func.date(latest.c.due_date),
+                                     literal(today + timedelta(days=7), Date)))),
+        Livestock.id,
+    )
+
+
+def _location(raw):
+    loc = str(raw or '').strip()
+    if not loc or loc in ('NaN', 'None'):
+        return DEFAULT_LOCATION
+    if '|' in loc:
+        p1, p2 = [p.strip() for p in loc.split('|', 1)]
+        loc = p2 if any(k in p2.lower() for k in LOCATION_KEYWORDS) else (
+            p1 if any(k in p1.lower() for k in LOCATION_KEYWORDS) else DEFAULT_LOCATION)
+    if 'available' in loc.lower():
+        return DEFAULT_LOCATION
+    return loc
+
+
+def _availability(item, loan_status, due_date, today):
+    """(description, availableInfo, daysRemaining) for a listed animal."""
+    if item.client_id is None or loan_status != 'active':
+        return 'Available for purchase', 'Available now', 0
+    if not due_date:
+        return 'Livestock for purchase', 'Available after repayment', 7
+    days_remaining = (due_date.date() - today).days
+    if days_remaining > 0:
+        return 'Livestock for purchase', f'Available in {days_remaining} days', days_remaining
+    if days_remaining == 0:
+        return 'Livestock for purchase', 'Due Today', 0
+    return 'Available for purchase', 'Available now', 0
+
+
+def _serialize(item, loan_status, due_date, today):
+    desc, available_info, days_remaining = _availability(item, loan_status, due_date, today)
+    return {
+        'id': item.id,
+        'title': f"{item.livestock_type.capitalize()} - {item.count} head",
+        'type': item.livestock_type,
+        'count': item.count,
+        'price': float(item.estimated_value) if item.estimated_value else 0,
+        'description': desc,
+        'images': item.photos or [],
+        'availableInfo': available_info,
+        'daysRemaining': days_remaining,
+        'location': _location(item.location),
+    }
+
+
+def _build_page(page, per_page, today):
+    q = _index_query(today)
+    total = q.order_by(None).count()
+    rows = q.limit(per_page).offset((page - 1) * per_page).all()
+    payload = {
+        'items': [_serialize(item, status, due, today) for item, status, due in rows],
+        'total': total,
+        'pages': (total + per_page - 1) // per_page,
+        'current_page': page,
+        'per_page': per_page,
+    }
+    body = json.dumps(payload, sort_keys=True).encode()
+    return payload, hashlib.sha1(body).hexdigest()
+
+
+def gallery_page(page, per_page):
+    """Return ``(payload, etag)`` for one gallery page, served from cache when fresh."""
+    page = max(1, page)
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+    today = datetime.now().date()
+    key = (page, per_page)
+
+    with _lock:
+        expired = time.monotonic() - _state['built_at'] > MAX_AGE
+        if expired or _state['built_for'] != today:
+            _state['pages'] = {}
+            _state['built_for'] = today
+            _state['built_at'] = time.monotonic()
+        cached = _state['pages'].get(key)
+        version = _state['version']
+    if cached:
+        return cached
+
+    result = _build_page(page, per_page, today)
+    with _lock:
+        # a commit may have invalidated the index while this page was built
+        if _state['version'] == version and _state['built_for'] == today:
+            if len(_state['pages']) >= MAX_CACHED_PAGES:
+                _state['pages'] = {}
+            _state['pages'][key] = result
+    return result
@@ -0,0 +1,127 @@
+"""
+EXPLAIN the hot queries and flag the ones that still read a whole table.
+
+Every entry in ``hot_queries()`` is a representative version of a filter the
+endpoints run on each request.  ``index_report`` compiles each one for the
+current database, runs EXPLAIN and reports any sequential scan.
+
+On PostgreSQL the planner happily seq-scans small tables, so by default the
+report runs with ``enable_seqscan = off`` (inside a rolled-back transaction):
+a query that still seq-scans then has no usable index at all.  Pass
+``as_planned=True`` to see the planner's real choice instead.
+"""
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import select, or_, and_
+from app import db
+from app.models import (
+    Loan, Transaction, Payment, Comment, PrivateMessage, ClientAssignment,
+    ReportComment, FlaggedLoan, DailyFinancialRollup
+)
+
+
+def hot_queries():
+    """(name, statement) pairs; literal ids/dates only shape the plan."""
+    now = datetime(2026, 1, 15)
+    week_ago = now - timedelta(days=7)
+    return [
+        ('active loans due', select(Loan.id).where(Loan.status == 'active', Loan.due_date < now)),
+        ('stale active loans (nightly accrual)', select(Loan.id).where(
+            Loan.status == 'active', Loan.accrued_through < now.date()).order_by(Loan.id)),
+        ('loans of a client', select(Loan.id).where(Loan.client_id == 1, Loan.status == 'active')),
+        ('loan holding livestock', select(Loan.id).where(Loan.livestock_id == 1)),
+        ('child loans', select(Loan.id).where(Loan.parent_loan_id == 1)),
+        ('transactions of a loan', select(Transaction.id).where(
+            Transaction.loan_id == 1).order_by(Transaction.created_at)),
+        ('transactions by type and date', select(Transaction.id).where(
+            Transaction.transaction_type == 'payment',
+            Transaction.created_at >= week_ago, Transaction.created_at < now)),
+        ('payments of a loan', select(Payment.id).where(Payment.loan_id == 1)),
+        ('loan comments', select(Comment.id).where(
+            Comment.loan_id == 1, Comment.parent_id.is_(None)).order_by(Comment.created_at)),
+        ('unread private messages', select(PrivateMessage.id).filter_by(recipient_id=1, read=False)),
+        ('conversation', select(PrivateMessage.id).where(or_(
+            and_(PrivateMessage.sender_id == 1, PrivateMessage.recipient_id == 2),
+            and_(PrivateMessage.sender_id == 2, PrivateMessage.recipient_id == 1),
+        )).order_by(PrivateMessage.created_at)),
+        ('group messages', select(PrivateMessage.id).where(
+            PrivateMessage.group_id == 1).order_by(PrivateMessage.created_at.desc()).limit(50)),
+        ('officer assignments', select(ClientAssignment.id).filter_by(officer_id=1, is_active=True)),
+        ('active assignment of a loan', select(ClientAssignment.id).filter_by(loan_id=1, is_active=True)),
+        ('report comment for a day', select(ReportComment.id).where(
+            ReportComment.loan_id == 1, ReportComment.report_date == now.date())),
+        ('unresolved flag of a loan', select(FlaggedLoan.id).filter_by(loan_id=1, resolved=False)),
+        ('financial rollup range', select(DailyFinancialRollup.amount).where(
+            DailyFinancialRollup.rollup_date >= week_ago.date(),
+            DailyFinancialRollup.rollup_date <= now.date())),
+    ]
+
+
+def _driver_sql(conn, stmt):
+    compiled = stmt.compile(dialect=conn.dialect)
+    params = compiled.construct_params()
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    return str(compiled), params
+
+
+def _postgres_seq_scans(conn, sql, params):
+    plan = conn.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + sql, params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    scans, lines = [], []
+
+    def walk(node, depth=0):
+        label = node['Node Type']
+        if node.get('Relation Name'):
+            label += f" on {node['Relation Name']}"
+        if node.get('Index Name'):
+            label += f" using {node['Index Name']}"
+        lines.append('  ' * depth + label)
+        if node['Node Type'] == 'Seq Scan':
+            scans.append(node.get('Relation Name'))
+        for child in node.get('Plans', []):
+            walk(child, depth + 1)
+
+    walk(plan[0]['Plan'])
+    return scans, lines
+
+
+def _sqlite_seq_scans(conn, sql, params):
+    rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+    scans, lines = [], []
+    for row in rows:
+        detail = row[-1]
+        lines.append(detail)
+        # "SCAN loans" is a full table scan; "SCAN loans USING INDEX ..." / "SEARCH ..." are not
+        if detail.startswith('SCAN ') and ' USING ' not in detail:
+            scans.append(detail.split()[1])
+    return scans, lines
+
+
+def index_report(as_planned=False):
+    """
+    Return one ``{'name', 'seq_scans', 'plan'}`` dict per hot query.
+    ``seq_scans`` lists the tables read sequentially (empty when every table
+    is reached through an index).
+    """
+    conn = db.session.connection()
+    dialect = conn.dialect.name
+    if dialect == 'postgresql':
+        explain = _postgres_seq_scans
+        if not as_planned:
+            conn.exec_driver_sql('SET LOCAL enable_seqscan = off')
+    elif dialect == 'sqlite':
+        explain = _sqlite_seq_scans
+    else:
+        raise RuntimeError(f'index-report does not know how to read {dialect} plans')
+
+    report = []
+    try:
+        for name, stmt in hot_queries():
+            sql, params = _driver_sql(conn, stmt)
+            seq_scans, plan = explain(conn, sql, params)
+            report.append({'name': name, 'seq_scans': seq_scans, 'plan': plan})
+    finally:
+        db.session.rollback()
+    return report
@@ -0,0 +1,279 @@
+"""
+Durable queue for calls to outside providers (Africa's Talking SMS,
+EmailJS, Safaricom Daraja, Cloudinary), so a request handler only writes a row and API
+latency no longer depends on their round-trips.
+
+``enqueue`` adds an ``OutboundJob`` to the session; it is committed with
+the caller's transaction and the worker is woken after commit.  A worker
+claims a due job with a conditional UPDATE (safe with several workers on
+any database), runs the handler registered for ``(provider, action)`` and
+commits the job's outcome together with whatever the handler changed.
+Failures are retried with exponential backoff; a job out of attempts (or
+raising ``PermanentJobError``) is moved to ``dead_letter_jobs``.  Each
+worker spaces calls per provider with a token bucket (``RATE_LIMITS``)
+instead of sleeping inside a request.
+
+The database is the queue.  ``JOB_QUEUE_BROKER_URL`` (Redis) is optional
+and only used to wake workers immediately instead of on their next poll.
+Workers run in-process on a background thread (``JOB_WORKER_IN_PROCESS``,
+the default) or as ``python manage.py run-jobs``.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import and_, event, or_, update
+from sqlalchemy.orm import Session
+from app import db
+from app.models import DeadLetterJob, OutboundJob
+from app.utils.rate_limit import TokenBucket
+
+# provider -> (burst, calls per second) enforced by each worker; Daraja calls
+# are limited process-wide by the shared client in app.utils.daraja
+RATE_LIMITS = {
+    'sms': (10, 10.0),
+    'email': (5, 2.0),
+}
+DEFAULT_MAX_ATTEMPTS = 5
+RETRY_BASE = 10                      # seconds before the first retry, doubled per attempt
+RETRY_MAX = 15 * 60
+CLAIM_TIMEOUT = timedelta(minutes=5)  # a 'running' job older than this was left by a dead worker
+IDLE_POLL = 30                       # seconds between polls when nothing is due
+BROKER_KEY = 'outbound_jobs'
+
+_KICK_KEY = 'outbound_jobs_kick'
+
+
+class JobError(Exception):
+    """A failure worth retrying (timeouts, rate limits, provider errors)."""
+
+
+class PermanentJobError(JobError):
+    """A failure that will not go away on retry; the job goes straight to dead letters."""
+
+
+HANDLERS = {}
+
+
+def handler(provider, action, on_dead=None):
+    """Register ``fn(payload) -> result`` for a job type; ``on_dead(payload, error)``
+    runs in the same transaction that moves the job to dead letters."""
+    def register(fn):
+        HANDLERS[(provider, action)] = (fn, on_dead)
+        return fn
+    return register
+
+
+# ---------------------------------------------------------------------------
+# Enqueueing
+# ---------------------------------------------------------------------------
+
+_config = {'in_process': False, 'app': None}
+_broker = None
+_wakeup = threading.Event()
+_thread = None
+_thread_lock = threading.Lock()
+
+
+def enqueue(provider, action, payload, max_attempts=DEFAULT_MAX_ATTEMPTS, delay=0):
+    """Add a job to the session (the caller commits); workers are woken after commit."""
+    if (provider, action) not in HANDLERS:
+        raise ValueError(f'No job handler for {provider}/{action}')
+    job = OutboundJob(
+        provider=provider,
+        action=action,
+        payload=payload,
+        max_attempts=max_attempts,
+        run_after=datetime.utcnow() + timedelta(seconds=delay),
+    )
+    db.session.add(job)
+    db.session.info[_KICK_KEY] = True
+    return job
+
+
+def notify():
+    """Wake a worker now rather than at its next poll."""
+    if _broker is not None:
+        try:
+            _broker.rpush(BROKER_KEY, 1)
+        except Exception as e:
+            print(f"Job queue broker notify failed: {e}")
+    if _config['in_process']:
+        start_in_process_worker()
+        _wakeup.set()
+
+
+def _kick(session):
+    if session.info.pop(_KICK_KEY, None):
+        notify()
+
+
+def _discard(session, previous_transaction):
+    session.info.pop(_KICK_KEY, None)
+
+
+def init_job_queue(app):
+    global _broker
+    _config['app'] = app
+    _config['in_process'] = app.config.get('JOB_WORKER_IN_PROCESS', True)
+    url = app.config.get('JOB_QUEUE_BROKER_URL')
+    if url:
+        import redis   # optional dependency, only needed with a broker
+        _broker = redis.Redis.from_url(url)
+    if not event.contains(Session, 'after_commit', _kick):
+        event.listen(Session, 'after_commit', _kick)
+        event.listen(Session, 'after_soft_rollback', _discard)
+    import app.services.outbound  # noqa: F401  registers the handlers
+
+
+def start_in_process_worker():
+    """Start the background worker thread of this process if it is not running."""
+    global _thread
+    app = _config['app']
+    if app is None:
+        return
+    with _thread_lock:
+        if _thread is not None and _thread.is_alive():
+            return
+        _thread = threading.Thread(target=Worker(app).run_forever, name='outbound-jobs', daemon=True)
+        _thread.start()
+
+
+def requeue_dead_letters(ids=None):
+    """Move dead letters (all, or the given ids) back to the queue; returns how many."""
+    q = DeadLetterJob.query
+    if ids:
+        q = q.filter(DeadLetterJob.id.in_(ids))
+    count = 0
+    for dead in q.all():
+        enqueue(dead.provider, dead.action, dead.payload)
+        db.session.delete(dead)
+        count += 1
+    db.session.commit()
+    return count
+
+
+# ---------------------------------------------------------------------------
+# Worker
+# ---------------------------------------------------------------------------
+
+class Worker:
+    def __init__(self, app, rate_limits=None):
+        self.app = app
+        self.buckets = {p: TokenBucket(*limit) for p, limit in (rate_limits or RATE_LIMITS).items()}
+
+    def _due(self, now, providers):
+        return OutboundJob.query.filter(
+            OutboundJob.provider.in_(providers),
+            or_(
+                and_(OutboundJob.status == 'pending', OutboundJob.run_after <= now),
+                and_(OutboundJob.status == 'running', OutboundJob.locked_at < now - CLAIM_TIMEOUT),
+            ),
+        ).order_by(OutboundJob.run_after, OutboundJob.id)
+
+    def _ready_providers(self):
+        known = {p for p, _ in HANDLERS}
+        return [p for p in known if p not in self.buckets or self.buckets[p].wait_time() == 0]
+
+    def _claim(self, job, now):
+        locked = OutboundJob.locked_at == job.locked_at if job.locked_at else OutboundJob.locked_at.is_(None)
+        claimed = db.session.execute(
+            update(OutboundJob)
+            .where(OutboundJob.id == job.id, OutboundJob.status == job.status, locked)
+            .values(status='running', locked_at=now, attempts=OutboundJob.attempts + 1)
+            .execution_options(synchronize_session=False)
+        ).rowcount == 1
+        db.session.commit()
+        return claimed
+
+    def _run(self, job_id):
+        job = db.session.get(OutboundJob, job_id)
+        fn, on_dead = HANDLERS.get((job.provider, job.action), (None, None))
+        try:
+            if fn is None:
+                raise PermanentJobError(f'No job handler for {job.provider}/{job.action}')
+            result = fn(job.payload)
+        except Exception as e:
+            db.session.rollback()
+            job = db.session.get(OutboundJob, job_id)
+            error = f'{type(e).__name__}: {e}'
+            if isinstance(e, PermanentJobError) or job.attempts >= job.max_attempts:
+                self._dead_letter(job, error, on_dead)
+            else:
+                delay = min(RETRY_BASE * 2 ** (job.attempts - 1), RETRY_MAX)
+                job.status = 'pending'
+                job.locked_at = None
+                job.last_error = error
+                job.run_after = datetime.utcnow() + timedelta(seconds=delay)
+                print(f"Job {job.id} {job.provider}/{job.action} failed ({error}), retry in {delay}s")
+            db.session.commit()
+            return
+        job.status = 'done'
+        job.locked_at = None
+        job.result = result
+        db.session.commit()
+
+    def _dead_letter(self, job, error, on_dead):
+        print(f"Job {job.id} {job.provider}/{job.action} moved to dead letters: {error}")
+        if on_dead is not None:
+            try:
+                on_dead(job.payload, error)
+            except Exception as e:
+                print(f"Dead letter hook for job {job.id} failed: {e}")
+        db.session.add(DeadLetterJob(
+            job_id=job.id, provider=job.provider, action=job.action, payload=job.payload,
+            attempts=job.attempts, last_error=error, created_at=job.created_at,
+        ))
+        db.session.delete(job)
+
+    def run_pending(self, limit=100):
+        """Run due jobs the rate limits allow, up to ``limit``; returns how many ran."""
+        ran = 0
+        while ran < limit:
+            providers = self._ready_providers()
+            if not providers:
+                break
+            now = datetime.utcnow()
+            job = self._due(now, providers).first()
+            if job is None:
+                break
+            if not self._claim(job, now):
+                continue                      # another worker took it
+            if job.provider in self.buckets:
+                self.buckets[job.provider].take()
+            self._run(job.id)
+            ran += 1
+        return ran
+
+    def idle_time(self):
+        """Seconds to wait before something can be due: next retry, a rate limit, or IDLE_POLL."""
+        waits = [IDLE_POLL]
+        next_run = db.session.query(db.func.min(OutboundJob.run_after)).filter(OutboundJob.status == 'pending').scalar()
+        if next_run is not None:
+            waits.append((next_run - datetime.utcnow()).total_seconds())
+        pending_providers = {p for (p,) in db.session.query(OutboundJob.provider).filter(
+            OutboundJob.status == 'pending').distinct()}
+        waits += [self.buckets[p].wait_time() for p in pending_providers if p in self.buckets]
+        return max(0.05, min(waits))
+
+    def run_forever(self, stop=None):
+        while stop is None or not stop.is_set():
+            with self.app.app_context():
+                try:
+                    self.run_pending()
+                    wait = self.idle_time()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Job worker error: {e}")
+                    wait = IDLE_POLL
+                finally:
+                    db.session.remove()
+            if _broker is not None:
+                try:
+                    if _broker.blpop(BROKER_KEY, timeout=max(1, int(wait))):
+                        _broker.delete(BROKER_KEY)   # one wakeup drains everything queued
+                except Exception as e:
+                    print(f"Job queue broker wait failed: {e}")
+                    time.sleep(wait)
+            else:
+                _wakeup.wait(wait)
+                _wakeup.clear()
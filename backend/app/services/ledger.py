@@ -1,11 +1,34 @@
-from decimal import Decimal
-from datetime import datetime
+"""
+Loan ledger writes.
+
+``record_ledger_entry`` does not flush.  Entries are collected on the
+session (``session.info['ledger_pending']``) and written with one
+multi-row INSERT just before the session commits, so a loan catching up a
+month of daily accrual -- or a nightly batch of loans -- costs one
+statement instead of one flush per day.  Entries recorded inside a
+savepoint that rolls back are discarded with it.  Code that has to read the
+new rows back before committing calls ``write_pending``.
+
+Accrual compaction (``LEDGER_COMPACT_ACCRUALS``) records a run of daily
+accruals as one ``accrual_range`` row; ``expand_accrual_range`` turns it back
+into the per-day rows.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from datetime import datetime, timedelta
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
 from app import db
 from app.models import LoanLedger
 from app.utils.interest_helpers import _get_period_interest_at_date   # new helper
 
-def record_ledger_entry(loan, event_type, transaction=None, amount=Decimal('0'),
-                        notes=None, reference=None, user_id=None, event_date=None):
+ACCRUAL_RANGE = 'accrual_range'
+DAILY_RATE = Decimal('0.045')
+
+_table = LoanLedger.__table__
+
+
+def _entry(loan, event_type, transaction=None, amount=Decimal('0'),
+           notes=None, reference=None, user_id=None, event_date=None):
     if event_date is None:
         event_date = datetime.utcnow()
 
@@ -14,21 +37,120 @@ def record_ledger_entry(loan, event_type, transaction=None, amount=Decimal('0'),
 
     total_outstanding = loan.current_principal + interest_balance
 
-    entry = LoanLedger(
-        loan_id=loan.id,
-        transaction_id=transaction.id if transaction else None,
-        event_type=event_type,
-        event_date=event_date,
-        principal_balance=loan.current_principal,
-        interest_balance=interest_balance,
-        penalty_balance=Decimal('0'),
-        total_outstanding=total_outstanding,
-        amount=amount,
-        notes=notes,
-        reference=reference,
-        created_by=user_id,
-        created_at=datetime.utcnow()
+    return {
+        'loan_id': loan.id,
+        'transaction_id': transaction.id if transaction else None,
+        'event_type': event_type,
+        'event_date': event_date,
+        'principal_balance': loan.current_principal,
+        'interest_balance': interest_balance,
+        'penalty_balance': Decimal('0'),
+        'total_outstanding': total_outstanding,
+        'amount': amount,
+        'notes': notes,
+        'reference': reference,
+        'created_by': user_id,
+        'created_at': datetime.utcnow()
+    }
+
+
+def record_ledger_entry(loan, event_type, transaction=None, amount=Decimal('0'),
+                        notes=None, reference=None, user_id=None, event_date=None):
+    """Queue a ledger row on the current session; it is written at commit."""
+    entry = _entry(loan, event_type, transaction, amount, notes, reference, user_id, event_date)
+    session = db.session()
+    # Tag the row with the innermost transaction so a savepoint rollback drops it
+    owner = session.get_nested_transaction() or session.get_transaction() or session.begin()
+    session.info.setdefault('ledger_pending', []).append((owner, entry))
+    return entry
+
+
+def write_pending(session=None):
+    """Insert the queued rows now; returns how many were written."""
+    session = session or db.session()
+    pending = session.info.pop('ledger_pending', None)
+    if not pending:
+        return 0
+    session.execute(insert(_table), [entry for _, entry in pending])
+    return len(pending)
+
+
+def pending_count(session=None):
+    session = session or db.session()
+    return len(session.info.get('ledger_pending', ()))
+
+
+# ---------------------------------------------------------------------------
+# Accrual ranges
+# ---------------------------------------------------------------------------
+
+def range_reference(first, last):
+    return f'AUTO {first.isoformat()}..{last.isoformat()}'
+
+
+def expand_accrual_range(entry, skip_day=None):
+    """
+    Per-day rows (dicts shaped like the ledger endpoint's) for an
+    ``accrual_range`` entry.  Principal is constant across a range, so every
+    day accrued the same interest, and the unpaid interest of each day is the
+    range's closing balance less the days after it.  ``skip_day`` is the
+    interest-free day one of the loan.
+    """
+    first, last = (datetime.strptime(d, '%Y-%m-%d').date()
+                   for d in entry.reference.split(' ', 1)[1].split('..'))
+    day_interest = (entry.principal_balance * DAILY_RATE).quantize(
+        Decimal('0.01'), rounding=ROUND_HALF_UP
     )
-    db.session.add(entry)
-    db.session.flush()
-    return entry
\ No newline at end of file
+    days = [first + timedelta(days=n) for n in range((last - first).days + 1)]
+    days = [day for day in days if day != skip_day]
+    rows = []
+    for later, day in zip(range(len(days) - 1, -1, -1), days):
+        interest_balance = max(Decimal('0'), entry.interest_balance - day_interest * later)
+        rows.append({
+            'date': datetime.combine(day, datetime.min.time()).isoformat(),
+            'type': 'accrual',
+            'amount': float(day_interest),
+            'principalBalance': float(entry.principal_balance),
+            'interestBalance': float(interest_balance),
+            'totalOutstanding': float(entry.principal_balance + interest_balance),
+            'notes': f'Daily interest accrued for {day.strftime("%Y-%m-%d")}',
+            'reference': 'AUTO',
+        })
+    return rows
+
+
+# ---------------------------------------------------------------------------
+# Session hooks
+# ---------------------------------------------------------------------------
+
+def _before_commit(session):
+    if session.in_nested_transaction():
+        return                   # savepoint release; the outer commit writes them
+    if session.info.get('ledger_pending'):
+        session.flush()          # rows the entries refer to go first
+        write_pending(session)
+
+
+def _after_rollback(session, previous_transaction):
+    pending = session.info.get('ledger_pending')
+    if not pending:
+        return
+
+    def rolled_back(owner):
+        while owner is not None:
+            if owner is previous_transaction:
+                return True
+            owner = owner.parent
+        return False
+
+    kept = [(owner, entry) for owner, entry in pending if not rolled_back(owner)]
+    if kept:
+        session.info['ledger_pending'] = kept
+    else:
+        session.info.pop('ledger_pending', None)
+
+
+def register_ledger_listeners():
+    if not event.contains(Session, 'before_commit', _before_commit):
+        event.listen(Session, 'before_commit', _before_commit)
+        event.listen(Session, 'after_soft_rollback', _after_rollback)
@@ -0,0 +1,111 @@
+"""
+Ledger write benchmark: daily loans catching up ``days`` of accrual, written
+three ways --
+
+* ``flush``   one add + flush per ledger row (the previous writer),
+* ``bulk``    rows collected on the session and inserted in one statement,
+* ``compact`` like ``bulk`` with each run of days as one ``accrual_range`` row.
+
+Everything runs inside a transaction that is rolled back, so the database is
+left as it was.
+"""
+import time
+import uuid
+from decimal import Decimal
+from datetime import date, datetime, timedelta
+from unittest import mock
+from sqlalchemy import event
+from app import db
+from app.models import Client, Loan, LoanLedger
+from app.services import accrual, ledger
+
+MODES = ('flush', 'bulk', 'compact')
+
+
+def _make_loans(client, count, days, today):
+    disbursed = datetime.combine(today - timedelta(days=days), datetime.min.time())
+    loans = []
+    for _ in range(count):
+        principal = Decimal('10000.00')
+        loans.append(Loan(
+            client_id=client.id,
+            principal_amount=principal,
+            total_amount=principal,
+            balance=principal,
+            current_principal=principal,
+            repayment_plan='daily',
+            interest_rate=Decimal('4.5'),
+            status='active',
+            disbursement_date=disbursed,
+            due_date=disbursed + timedelta(days=7),
+        ))
+    db.session.add_all(loans)
+    db.session.flush()
+    return loans
+
+
+def _flush_per_row(loan, event_type, transaction=None, amount=Decimal('0'),
+                   notes=None, reference=None, user_id=None, event_date=None):
+    row = ledger._entry(loan, event_type, transaction, amount, notes, reference, user_id, event_date)
+    db.session.add(LoanLedger(**row))
+    db.session.flush()
+
+
+def bench_ledger(loans=20, days=30, today=None):
+    """Return one result dict per mode: rows and days written, statements, seconds."""
+    today = today or date.today()
+    engine = db.session.get_bind()
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('INSERT INTO loan_ledger'):
+            statements.append(executemany)
+
+    results = []
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        client = Client(full_name='Ledger benchmark', phone_number='0700000000',
+                        id_number=f'bench-{uuid.uuid4().hex[:12]}')
+        db.session.add(client)
+        db.session.flush()
+
+        for mode in MODES:
+            savepoint = db.session.begin_nested()
+            batch = _make_loans(client, loans, days, today)
+            ids = [loan.id for loan in batch]
+            statements.clear()
+
+            start = time.perf_counter()
+            if mode == 'flush':
+                with mock.patch.object(accrual, 'record_ledger_entry', _flush_per_row):
+                    for loan in batch:
+                        accrual.recalculate_loan(loan, save=True, today=today, compact=False)
+            else:
+                for loan in batch:
+                    accrual.recalculate_loan(loan, save=True, today=today, compact=mode == 'compact')
+                ledger.write_pending()
+            elapsed = time.perf_counter() - start
+
+            # Plain rows: ids are reused after a savepoint rollback, ORM objects may be stale
+            entries = db.session.query(
+                LoanLedger.event_type, LoanLedger.reference,
+                LoanLedger.principal_balance, LoanLedger.interest_balance
+            ).filter(LoanLedger.loan_id.in_(ids)).all()
+            day_one = today - timedelta(days=days - 1)
+            days_covered = sum(
+                len(ledger.expand_accrual_range(e, skip_day=day_one))
+                if e.event_type == ledger.ACCRUAL_RANGE else 1
+                for e in entries
+            )
+            results.append({
+                'mode': mode,
+                'rows': len(entries),
+                'days': days_covered,
+                'statements': len(statements),
+                'seconds': elapsed,
+            })
+            savepoint.rollback()
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+        db.session.rollback()
+    return results
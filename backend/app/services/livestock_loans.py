@@ -0,0 +1,25 @@
+"""
+Latest loan per animal, for listings that join livestock to its loan.
+
+``latest_loans()`` ranks the loans of every animal with
+``row_number() OVER (PARTITION BY livestock_id ORDER BY created_at DESC, id DESC)``;
+join it with ``latest_loan_join`` to get at most one loan row per animal in
+the same statement as the livestock page.
+"""
+from sqlalchemy import and_, func
+from app import db
+from app.models import Loan
+
+
+def latest_loans():
+    return db.session.query(
+        Loan.id, Loan.livestock_id, Loan.client_id, Loan.status, Loan.due_date,
+        func.row_number().over(
+            partition_by=Loan.livestock_id,
+            order_by=(Loan.created_at.desc(), Loan.id.desc())
+        ).label('rank')
+    ).filter(Loan.livestock_id.isnot(None)).subquery('latest_loan')
+
+
+def latest_loan_join(latest, livestock_id_column):
+    return and_(latest.c.livestock_id == livestock_id_column, latest.c.rank == 1)
@@ -0,0 +1,115 @@
+"""
+Livestock photo uploads that do not hold up a request or a migration.
+
+``queue_livestock_photos`` stores a loan application's photos in a durable
+job (app.services.job_queue) committed with the application; the job
+worker uploads them and appends the URLs to the livestock row, retrying
+failed uploads and dead-lettering them if they never succeed.
+``migrate_livestock_photos`` moves inline
+base64 photos of existing rows to Cloudinary in batches, uploading each
+batch in parallel and recording the last finished livestock id in a
+checkpoint file so a rerun resumes where the previous one stopped.
+Uploads are idempotent (see app.utils.cloudinary_upload), so redoing a
+batch that was interrupted before its checkpoint costs no duplicates.
+"""
+import json
+import os
+from app import db
+from app.models import Livestock
+from app.services.job_queue import enqueue
+from app.utils.cloudinary_upload import UPLOAD_WORKERS, upload_many
+
+MIGRATE_BATCH = 20
+PHOTO_MAX_ATTEMPTS = 8
+
+
+def _is_inline(photo):
+    return isinstance(photo, str) and not photo.startswith('http')
+
+
+def attach_photos(livestock_id, images, folder='loan_applications'):
+    """
+    Upload ``images`` and append the URLs the livestock row does not have
+    yet (the caller commits).  Returns ``(stored, failed)``.
+    """
+    urls = [url for url in upload_many(images, folder=folder) if url]
+    livestock = db.session.get(Livestock, livestock_id)
+    if livestock is not None and urls:
+        existing = livestock.photos or []
+        livestock.photos = existing + [url for url in urls if url not in existing]
+    return len(urls), len(images) - len(urls)
+
+
+def queue_livestock_photos(livestock_id, images, folder='loan_applications'):
+    """Queue the upload of ``images`` for a flushed livestock row; the caller commits."""
+    return enqueue('cloudinary', 'livestock_photos', {
+        'livestock_id': livestock_id, 'images': images, 'folder': folder,
+    }, max_attempts=PHOTO_MAX_ATTEMPTS)
+
+
+def _read_checkpoint(path):
+    if not os.path.exists(path):
+        return {'last_id': 0, 'failed_ids': []}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_checkpoint(path, state):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def migrate_livestock_photos(checkpoint_path, batch_size=MIGRATE_BATCH, max_workers=UPLOAD_WORKERS):
+    """
+    Replace inline photos with Cloudinary URLs for livestock after the
+    checkpoint, plus rows that had failures on an earlier run.  A photo
+    that fails to upload stays inline and its row is retried next run.
+    Returns ``{'rows', 'uploaded', 'failed'}`` for this run.
+    """
+    state = _read_checkpoint(checkpoint_path)
+    retry_ids = list(state.get('failed_ids', []))
+    remaining_retry, failed_ids = set(retry_ids), set()
+    stats = {'rows': 0, 'uploaded': 0, 'failed': 0}
+
+    def batches():
+        for i in range(0, len(retry_ids), batch_size):
+            yield retry_ids[i:i + batch_size], False
+        while True:
+            ids = [row.id for row in db.session.query(Livestock.id).filter(
+                Livestock.id > state['last_id'], Livestock.photos.isnot(None)
+            ).order_by(Livestock.id).limit(batch_size)]
+            if not ids:
+                return
+            yield ids, True
+
+    for ids, advances in batches():
+        rows = Livestock.query.filter(Livestock.id.in_(ids)).order_by(Livestock.id).all()
+        pending = [(row, i, photo) for row in rows if isinstance(row.photos, list)
+                   for i, photo in enumerate(row.photos) if _is_inline(photo)]
+        urls = upload_many([photo for _, _, photo in pending], folder='livestock', max_workers=max_workers)
+
+        new_photos = {row.id: list(row.photos) for row, _, _ in pending}
+        for (row, i, _), url in zip(pending, urls):
+            if url:
+                new_photos[row.id][i] = url
+                stats['uploaded'] += 1
+            else:
+                failed_ids.add(row.id)
+                stats['failed'] += 1
+        for row in rows:
+            if row.id in new_photos:
+                row.photos = new_photos[row.id]
+        db.session.commit()
+        db.session.expunge_all()
+
+        stats['rows'] += len(rows)
+        if advances:
+            state['last_id'] = ids[-1]
+        else:
+            remaining_retry -= set(ids)
+        state['failed_ids'] = sorted(remaining_retry | failed_ids)
+        _write_checkpoint(checkpoint_path, state)
+        print(f"Livestock up to id {ids[-1]}: {stats['uploaded']} photos uploaded, {stats['failed']} failed")
+    return stats
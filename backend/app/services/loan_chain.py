@@ -0,0 +1,151 @@
+"""
+Renewal / top-up / waiver chains of loans.
+
+Each follow-up loan points at the loan it replaced (``parent_loan_id``) and
+at the first loan of the chain (``root_loan_id``, not set on older rows).
+``chain_ids`` resolves the whole tree in one statement: a recursive CTE
+walks up ``parent_loan_id`` to the root and a second one walks back down
+through every descendant (``ix_loans_parent_loan_id``), so the cost no
+longer grows with one query per loan in the chain.
+
+The consolidated statement reads the ledger of the chain with its
+transaction and loan columns joined in the same query; ``export_csv`` /
+``export_ndjson`` stream it with ``yield_per``.  Compacted
+``accrual_range`` rows (``LEDGER_COMPACT_ACCRUALS``) are listed day by day,
+as on the loan ledger.
+"""
+import csv
+import io
+import json
+from datetime import timedelta
+from sqlalchemy import literal, select
+from sqlalchemy.orm import aliased
+from app import db
+from app.models import Loan, LoanLedger, Transaction
+from app.services.ledger import ACCRUAL_RANGE, expand_accrual_range
+
+MAX_DEPTH = 1000        # stops the walk on a corrupt parent_loan_id cycle
+EXPORT_CHUNK = 1000
+
+CSV_COLUMNS = ['loan_id', 'date', 'type', 'amount', 'principalBalance', 'interestBalance',
+               'totalOutstanding', 'notes', 'reference', 'loan_disbursement_date',
+               'payment_type', 'payment_method', 'mpesa_receipt', 'transaction_type']
+
+
+def _ancestors(loan_id):
+    up = select(
+        Loan.id, Loan.parent_loan_id, literal(0).label('depth')
+    ).where(Loan.id == loan_id).cte('ancestors', recursive=True)
+    parent = aliased(Loan)
+    return up.union_all(
+        select(parent.id, parent.parent_loan_id, up.c.depth + 1)
+        .join(up, parent.id == up.c.parent_loan_id)
+        .where(up.c.depth < MAX_DEPTH)
+    )
+
+
+def _root_select(loan_id):
+    up = _ancestors(loan_id)
+    return select(up.c.id).order_by(up.c.depth.desc()).limit(1)
+
+
+def root_id(loan):
+    """Id of the first loan in ``loan``'s chain (the loan itself if it has no parent)."""
+    if loan.root_loan_id:
+        return loan.root_loan_id
+    if not loan.parent_loan_id:
+        return loan.id
+    return db.session.scalar(_root_select(loan.id))
+
+
+def chain_ids(loan_id):
+    """Ids of every loan in the chain ``loan_id`` belongs to -- ancestors,
+    descendants and their siblings -- in id order; empty if the loan is unknown."""
+    root = _root_select(loan_id).scalar_subquery()
+    down = select(Loan.id, literal(0).label('depth')).where(Loan.id == root).cte('descendants', recursive=True)
+    child = aliased(Loan)
+    down = down.union_all(
+        select(child.id, down.c.depth + 1)
+        .join(down, child.parent_loan_id == down.c.id)
+        .where(down.c.depth < MAX_DEPTH)
+    )
+    return list(db.session.scalars(select(down.c.id).distinct().order_by(down.c.id)))
+
+
+# ---------------------------------------------------------------------------
+# Consolidated statement
+# ---------------------------------------------------------------------------
+
+def statement_query(loan_ids):
+    return db.session.query(
+        LoanLedger, Loan.disbursement_date, Transaction
+    ).join(
+        Loan, Loan.id == LoanLedger.loan_id
+    ).outerjoin(
+        Transaction, Transaction.id == LoanLedger.transaction_id
+    ).filter(
+        LoanLedger.loan_id.in_(loan_ids)
+    ).order_by(LoanLedger.event_date, LoanLedger.id)
+
+
+def serialize(e, disbursement_date, txn):
+    return {
+        'loan_id': e.loan_id,
+        'date': e.event_date.isoformat(),
+        'type': e.event_type,
+        'amount': float(e.amount),
+        'principalBalance': float(e.principal_balance),
+        'interestBalance': float(e.interest_balance),
+        'totalOutstanding': float(e.total_outstanding),
+        'notes': e.notes,
+        'reference': e.reference,
+        'loan_disbursement_date': disbursement_date.isoformat() if disbursement_date else None,
+        'transaction': {
+            'payment_type': txn.payment_type,
+            'payment_method': txn.payment_method,
+            'mpesa_receipt': txn.mpesa_receipt,
+            'transaction_type': txn.transaction_type,
+        } if txn else None
+    }
+
+
+def rows_for(e, disbursement_date, txn):
+    """Statement rows of one ledger entry: one per day for an ``accrual_range``."""
+    if e.event_type != ACCRUAL_RANGE:
+        return [serialize(e, disbursement_date, txn)]
+    day_one = disbursement_date.date() + timedelta(days=1) if disbursement_date else None
+    loan_fields = {
+        'loan_id': e.loan_id,
+        'loan_disbursement_date': disbursement_date.isoformat() if disbursement_date else None,
+        'transaction': None,
+    }
+    return [{'loan_id': e.loan_id, **row, **loan_fields}
+            for row in expand_accrual_range(e, skip_day=day_one)]
+
+
+def statement(loan_ids):
+    return [row for entry in statement_query(loan_ids) for row in rows_for(*entry)]
+
+
+def export_rows(loan_ids):
+    for entry in statement_query(loan_ids).yield_per(EXPORT_CHUNK):
+        yield from rows_for(*entry)
+
+
+def export_ndjson(loan_ids):
+    for row in export_rows(loan_ids):
+        yield json.dumps(row) + '\n'
+
+
+def export_csv(loan_ids):
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=CSV_COLUMNS)
+    writer.writeheader()
+    for i, row in enumerate(export_rows(loan_ids), 1):
+        txn = row.pop('transaction') or {}
+        writer.writerow({**row, **txn})
+        if i % EXPORT_CHUNK == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
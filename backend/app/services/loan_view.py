@@ -0,0 +1,105 @@
+"""
+Read-only loan projections.
+
+List endpoints used to run ``recalculate_loan(loan, save=False)`` on the
+attached ORM instance, which dirtied every row (and could even delete the
+livestock of a loan that just completed).  ``project_loan`` copies the fields
+into a ``LoanView`` and runs the accrual engine on the copy, so the session
+never sees a change: no autoflush, no UPDATE, nothing to commit.
+
+A ``LoanView`` exposes the same attribute names as ``Loan`` so the interest
+helpers (``_get_current_period_interest``, ``compute_overdue``,
+``_loan_summary`` ...) accept it unchanged.  ``client`` and ``livestock`` are
+plain references to the already-loaded related objects.
+"""
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Optional
+
+from app.services.accrual import is_stale, recalculate_loan
+
+
+@dataclass(slots=True)
+class LoanView:
+    id: int
+    client_id: int
+    status: str
+    repayment_plan: str
+    interest_type: Optional[str]
+    interest_rate: Decimal
+    principal_amount: Decimal
+    current_principal: Decimal
+    accrued_interest: Decimal
+    interest_paid: Decimal
+    principal_paid: Decimal
+    amount_paid: Decimal
+    balance: Decimal
+    interest_prepaid_period: Optional[str]
+    interest_prepaid_amount: Optional[Decimal]
+    disbursement_date: Optional[datetime]
+    due_date: Optional[datetime]
+    last_interest_payment_date: Optional[datetime]
+    last_compounding_date: Optional[datetime]
+    last_accrual_recorded: Optional[datetime]
+    accrued_through: Optional[date]
+    created_at: Optional[datetime]
+    collateral_text: Optional[str]
+    parent_loan_id: Optional[int]
+    root_loan_id: Optional[int]
+    livestock_id: Optional[int]
+    client: Any = None
+    livestock: Any = None
+
+    @classmethod
+    def snapshot(cls, loan):
+        """Copy the column values of a Loan (related objects are not attached)."""
+        return cls(
+            id=loan.id,
+            client_id=loan.client_id,
+            status=loan.status,
+            repayment_plan=loan.repayment_plan,
+            interest_type=loan.interest_type,
+            interest_rate=loan.interest_rate,
+            principal_amount=loan.principal_amount,
+            current_principal=loan.current_principal,
+            accrued_interest=loan.accrued_interest,
+            interest_paid=loan.interest_paid,
+            principal_paid=loan.principal_paid,
+            amount_paid=loan.amount_paid,
+            balance=loan.balance,
+            interest_prepaid_period=loan.interest_prepaid_period,
+            interest_prepaid_amount=loan.interest_prepaid_amount,
+            disbursement_date=loan.disbursement_date,
+            due_date=loan.due_date,
+            last_interest_payment_date=loan.last_interest_payment_date,
+            last_compounding_date=loan.last_compounding_date,
+            last_accrual_recorded=loan.last_accrual_recorded,
+            accrued_through=loan.accrued_through,
+            created_at=loan.created_at,
+            collateral_text=loan.collateral_text,
+            parent_loan_id=loan.parent_loan_id,
+            root_loan_id=loan.root_loan_id,
+            livestock_id=loan.livestock_id,
+        )
+
+
+def project_loan(loan, today=None):
+    """
+    Return a LoanView brought up to ``today``.  Loans the nightly accrual pass
+    has already stamped are copied as-is; stale ones are recalculated on the
+    copy only.
+    """
+    view = LoanView.snapshot(loan)
+    if is_stale(loan, today):
+        # livestock is still None here, so a loan that completes in the
+        # projection cannot reach db.session.delete()
+        recalculate_loan(view, save=False, today=today)
+    view.client = loan.client
+    # a loan that completes releases its collateral
+    view.livestock = loan.livestock if view.status == loan.status else None
+    return view
+
+
+def project_loans(loans, today=None):
+    return [project_loan(loan, today) for loan in loans]
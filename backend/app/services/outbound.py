@@ -0,0 +1,134 @@
+"""
+Job handlers for outbound integrations and the helpers request handlers
+call to queue them (see app.services.job_queue).
+"""
+from decimal import Decimal
+from flask import current_app
+from app import db
+from app.models import Payment
+from app.services.job_queue import JobError, enqueue, handler
+
+STK_MAX_ATTEMPTS = 3   # only pushes Daraja never received are retried
+STK_RATE_WAIT = 10     # seconds the worker may wait for the Daraja rate limit
+
+
+# ---------------------------------------------------------------------------
+# SMS (Africa's Talking)
+# ---------------------------------------------------------------------------
+
+@handler('sms', 'send_sms')
+def _send_sms(payload):
+    from app.services.sms_service import sms_service
+    result = sms_service.send_sms(payload['phone_number'], payload['message'])
+    if not result.get('success'):
+        raise JobError(result.get('error', 'SMS not sent'))
+    return {'recipient': result.get('recipient'), 'test_mode': result.get('test_mode', False)}
+
+
+def queue_sms(phone_number, message):
+    return enqueue('sms', 'send_sms', {'phone_number': phone_number, 'message': message})
+
+
+# ---------------------------------------------------------------------------
+# Email (EmailJS)
+# ---------------------------------------------------------------------------
+
+@handler('email', 'password_reset')
+def _send_password_reset(payload):
+    from app.utils.email_sender import EmailSender
+    if not EmailSender.send_password_reset_email(**payload):
+        raise JobError('Password reset email not sent')
+    return {'to_email': payload['to_email']}
+
+
+@handler('email', 'password_changed')
+def _send_password_changed(payload):
+    from app.utils.email_sender import EmailSender
+    if not EmailSender.send_password_changed_email(**payload):
+        raise JobError('Password changed email not sent')
+    return {'to_email': payload['to_email']}
+
+
+def queue_password_reset_email(to_email, reset_link, investor_name, security_question):
+    return enqueue('email', 'password_reset', {
+        'to_email': to_email, 'reset_link': reset_link,
+        'investor_name': investor_name, 'security_question': security_question,
+    })
+
+
+def queue_password_changed_email(to_email, investor_name):
+    return enqueue('email', 'password_changed', {'to_email': to_email, 'investor_name': investor_name})
+
+
+# ---------------------------------------------------------------------------
+# Livestock photos (Cloudinary)
+# ---------------------------------------------------------------------------
+
+@handler('cloudinary', 'livestock_photos')
+def _upload_livestock_photos(payload):
+    from app.services.livestock_photos import attach_photos
+    stored, failed = attach_photos(payload['livestock_id'], payload['images'], payload['folder'])
+    if failed:
+        # uploads are idempotent, so the retry re-stores the same URLs
+        raise JobError(f'{failed} of {failed + stored} photos failed to upload')
+    return {'livestock_id': payload['livestock_id'], 'photos': stored}
+
+
+# ---------------------------------------------------------------------------
+# M-Pesa STK push (Daraja)
+# ---------------------------------------------------------------------------
+
+def _fail_payment(payment, error):
+    payment.status = 'failed'
+    payment.result_code = '1'
+    payment.result_desc = error
+
+
+def _stk_push_dead(payload, error):
+    payment = db.session.get(Payment, payload['payment_id'])
+    if payment is not None and payment.status == 'queued':
+        _fail_payment(payment, f'STK push not sent: {error}')
+
+
+@handler('daraja', 'stk_push', on_dead=_stk_push_dead)
+def _stk_push(payload):
+    from app.utils.daraja import get_daraja
+    payment = db.session.get(Payment, payload['payment_id'])
+    if payment is None or payment.status != 'queued':
+        return {'skipped': True}
+
+    result = get_daraja().stk_push(
+        phone_number=payment.phone_number,
+        amount=payload['amount'],
+        account_reference=payload['account_reference'],
+        callback_url=payload['callback_url'],
+        max_wait=STK_RATE_WAIT,
+    )
+    if result.get('success'):
+        payment.status = 'pending'
+        payment.amount = Decimal(str(result.get('rounded_amount', payment.amount)))
+        payment.merchant_request_id = result.get('merchant_request_id')
+        payment.checkout_request_id = result.get('checkout_request_id')
+        return {k: result.get(k) for k in ('merchant_request_id', 'checkout_request_id', 'customer_message')}
+
+    error = result.get('error', 'STK push failed')
+    if result.get('retryable'):
+        raise JobError(error)
+    if result.get('unknown'):
+        # Daraja may have accepted it and prompted the customer: pushing again
+        # would prompt twice.  The callback matches it by phone and amount.
+        payment.status = 'unknown'
+        payment.result_desc = error
+        return {'success': False, 'unknown': True, 'error': error}
+    _fail_payment(payment, error)
+    return {'success': False, 'error': error}
+
+
+def queue_stk_push(payment, amount, account_reference):
+    """Queue the STK push for a 'queued' Payment row; the caller commits."""
+    return enqueue('daraja', 'stk_push', {
+        'payment_id': payment.id,
+        'amount': str(amount),
+        'account_reference': account_reference,
+        'callback_url': current_app.config['DARAJA_CALLBACK_URL'],
+    }, max_attempts=STK_MAX_ATTEMPTS)
@@ -0,0 +1,65 @@
+"""
+Bulk read receipts for private and group messages.
+
+Each call is a single ``UPDATE ... RETURNING`` plus one commit, however many
+messages it covers; callers emit one ``message_status_update`` per room with
+the returned ids instead of one frame per message.  The matching unread
+counters are lowered in the same transaction.
+"""
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import update
+from app import db
+from app.models import GroupReadStatus, PrivateMessage
+from app.services import unread_counters
+
+
+def _read_values():
+    return {'status': 'read', 'read': True, 'read_at': datetime.utcnow()}
+
+
+def mark_messages_read(reader_id, message_ids):
+    """
+    Mark the given messages addressed to ``reader_id`` as read.
+    Returns ``{sender_id: [message ids]}`` for the messages that changed.
+    """
+    ids = {int(i) for i in message_ids or () if str(i).isdigit()}
+    if not ids:
+        return {}
+    rows = db.session.execute(
+        update(PrivateMessage)
+        .where(PrivateMessage.id.in_(ids),
+               PrivateMessage.recipient_id == reader_id,
+               PrivateMessage.status != 'read')
+        .values(**_read_values())
+        .returning(PrivateMessage.id, PrivateMessage.sender_id)
+    ).all()
+
+    by_sender = defaultdict(list)
+    for msg_id, sender_id in rows:
+        by_sender[sender_id].append(msg_id)
+    for sender_id, msg_ids in by_sender.items():
+        unread_counters.decrement(reader_id, 'user', sender_id, len(msg_ids))
+    db.session.commit()
+    return {sender_id: sorted(msg_ids) for sender_id, msg_ids in by_sender.items()}
+
+
+def mark_group_read(group_id, reader_id):
+    """Mark every unread message of the group not sent by ``reader_id``; returns their ids."""
+    now = datetime.utcnow()
+    read_status = GroupReadStatus.query.filter_by(user_id=reader_id, group_id=group_id).first()
+    if read_status:
+        read_status.last_read_at = now
+    else:
+        db.session.add(GroupReadStatus(user_id=reader_id, group_id=group_id, last_read_at=now))
+    unread_counters.reset(reader_id, 'group', group_id)
+    rows = db.session.execute(
+        update(PrivateMessage)
+        .where(PrivateMessage.group_id == group_id,
+               PrivateMessage.sender_id != reader_id,
+               PrivateMessage.status != 'read')
+        .values(**_read_values())
+        .returning(PrivateMessage.id)
+    ).scalars().all()
+    db.session.commit()
+    return sorted(rows)
@@ -0,0 +1,187 @@
+"""
+Bucketed money-in / money-out sums for the financial reports.
+
+Each source table is read with ONE grouped query over a half-open timestamp
+range (``created_at >= start AND created_at < end + 1 day``) so an index on
+the timestamp column can be used; ``func.date()`` only appears in the
+SELECT / GROUP BY.  Day rows are rolled up into weeks or months in Python,
+which keeps the week boundary (Sunday) independent of the database.
+"""
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from sqlalchemy import func, type_coerce
+from app import db
+from app.models import (
+    Transaction, PettyCashExpense, SalaryTransaction, InvestorReturn, DailyFinancialRollup
+)
+
+# Categories produced by money_flows()
+TRANSACTION_CATEGORIES = {
+    'disbursement': 'loan_disbursements',
+    'topup': 'loan_topups',
+    'operational': 'operational',
+    'claim': 'claims_recoveries',
+    'other_income': 'other_income',
+}
+
+MONEY_IN = ('principal_payments', 'interest_payments', 'other_payments',
+            'claims_recoveries', 'other_income')
+# What the company report / revenue analysis count as money out
+MONEY_OUT = ('loan_disbursements', 'loan_topups', 'operational',
+             'petty_cash', 'salaries', 'investor_returns')
+# The weekly / monthly reports have always left salaries and investor returns out
+OPERATING_OUT = ('loan_disbursements', 'loan_topups', 'operational', 'petty_cash')
+
+ALL_TIME = None
+
+
+def transaction_category(transaction_type, payment_type, payment_method):
+    """Report category of a Transaction row, or None if it is not money in/out.
+    'waived' amounts are counted as absolute values."""
+    if transaction_type == 'payment':
+        if payment_type == 'principal':
+            return 'principal_payments'
+        if payment_type == 'interest':
+            return 'interest_payments'
+        return 'other_payments'
+    if transaction_type == 'adjustment' and payment_method == 'waiver':
+        return 'waived'
+    return TRANSACTION_CATEGORIES.get(transaction_type)
+
+
+def day_range(start_date, end_date):
+    """Half-open [start 00:00, day after end 00:00) datetimes for a date range."""
+    return (
+        datetime.combine(start_date, time.min),
+        datetime.combine(end_date + timedelta(days=1), time.min),
+    )
+
+
+def _as_date(value):
+    # func.date() comes back as a date on PostgreSQL and as text on SQLite
+    if value is None or isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _between(column, start_date, end_date, is_date_column=False):
+    if start_date is None:
+        return []
+    if is_date_column:
+        return [column >= start_date, column <= end_date]
+    lo, hi = day_range(start_date, end_date)
+    return [column >= lo, column < hi]
+
+
+def _grouped(query, group_cols, by_day):
+    """Run ``query`` grouped by ``group_cols``; yield (day bucket or None, row)."""
+    rows = query.group_by(*group_cols).all() if group_cols else query.all()
+    for row in rows:
+        yield (_as_date(row[0]) if by_day else None), row
+
+
+def money_flows(start_date=ALL_TIME, end_date=ALL_TIME, by_day=True):
+    """
+    Return ``{day: {category: Decimal}}`` for [start_date, end_date].
+    With ``by_day=False`` everything is summed under the key ``None``.
+    Waivers are reported as ``waived`` (absolute amounts).
+    """
+    flows = defaultdict(lambda: defaultdict(Decimal))
+
+    def day_of(column):
+        return [func.date(column)] if by_day else []
+
+    # ---- transactions ----
+    keys = day_of(Transaction.created_at)
+    cols = [Transaction.transaction_type, Transaction.payment_type, Transaction.payment_method]
+    q = db.session.query(
+        *keys, *cols, func.sum(Transaction.amount),
+        # keep Numeric so SQLite hands back Decimal too
+        func.sum(type_coerce(func.abs(Transaction.amount), Transaction.amount.type))
+    ).filter(*_between(Transaction.created_at, start_date, end_date))
+    for bucket, row in _grouped(q, keys + cols, by_day):
+        ttype, ptype, method, total, total_abs = row[len(keys):]
+        category = transaction_category(ttype, ptype, method)
+        if category == 'waived':
+            flows[bucket][category] += total_abs or Decimal('0')
+        elif category:
+            flows[bucket][category] += total or Decimal('0')
+
+    # ---- petty cash (already a date column) ----
+    keys = [PettyCashExpense.date] if by_day else []
+    q = db.session.query(*keys, func.sum(PettyCashExpense.amount)).filter(
+        *_between(PettyCashExpense.date, start_date, end_date, is_date_column=True)
+    )
+    for bucket, row in _grouped(q, keys, by_day):
+        flows[bucket]['petty_cash'] += row[-1] or Decimal('0')
+
+    # ---- salaries ----
+    keys = day_of(SalaryTransaction.created_at)
+    q = db.session.query(*keys, func.sum(SalaryTransaction.amount)).filter(
+        SalaryTransaction.transaction_type == 'salary_payment',
+        *_between(SalaryTransaction.created_at, start_date, end_date)
+    )
+    for bucket, row in _grouped(q, keys, by_day):
+        flows[bucket]['salaries'] += row[-1] or Decimal('0')
+
+    # ---- investor returns ----
+    keys = day_of(InvestorReturn.return_date)
+    q = db.session.query(*keys, func.sum(InvestorReturn.amount)).filter(
+        InvestorReturn.status == 'completed',
+        *_between(InvestorReturn.return_date, start_date, end_date)
+    )
+    for bucket, row in _grouped(q, keys, by_day):
+        flows[bucket]['investor_returns'] += row[-1] or Decimal('0')
+
+    return flows
+
+
+def rollup_flows(start_date=ALL_TIME, end_date=ALL_TIME, by_day=True):
+    """
+    Same shape as money_flows() but read from daily_financial_rollup, which
+    holds at most one row per day and category.
+    """
+    flows = defaultdict(lambda: defaultdict(Decimal))
+    keys = [DailyFinancialRollup.rollup_date] if by_day else []
+    q = db.session.query(
+        *keys, DailyFinancialRollup.category, func.sum(DailyFinancialRollup.amount)
+    ).filter(*_between(DailyFinancialRollup.rollup_date, start_date, end_date, is_date_column=True))
+    for bucket, row in _grouped(q, keys + [DailyFinancialRollup.category], by_day):
+        flows[bucket][row[-2]] += row[-1] or Decimal('0')
+    return flows
+
+
+def week_start(d):
+    """Sunday that starts the (Sunday–Saturday) week containing ``d``."""
+    return d - timedelta(days=(d.weekday() + 1) % 7)
+
+
+def month_start(d):
+    return d.replace(day=1)
+
+
+def rollup(flows, grain='day'):
+    """Re-key day buckets by 'day', 'week' (Sunday start) or 'month'."""
+    if grain == 'day':
+        return flows
+    key = week_start if grain == 'week' else month_start
+    out = defaultdict(lambda: defaultdict(Decimal))
+    for d, cats in flows.items():
+        target = out[key(d) if d is not None else None]
+        for cat, amount in cats.items():
+            target[cat] += amount
+    return out
+
+
+def totals(flows):
+    """Sum every bucket into a single {category: Decimal}."""
+    out = defaultdict(Decimal)
+    for cats in flows.values():
+        for cat, amount in cats.items():
+            out[cat] += amount
+    return out
+
+
+def total_of(cats, categories):
+    return sum((cats.get(c, Decimal('0')) for c in categories), Decimal('0'))
@@ -0,0 +1,141 @@
+"""
+Daily balance snapshots of active loans (``report_comments`` rows without an
+officer).
+
+Loans are read in id-ordered chunks; each chunk's balances are computed in
+memory and written with one ``INSERT ... ON CONFLICT (loan_id, report_date)
+DO NOTHING`` against ``uq_report_comments_snapshot``, then committed.  Loans
+that already have a snapshot for the day are left out of the chunk query,
+so an interrupted run -- or a backfill over a date range -- can simply be
+started again.
+
+Yesterday and today are taken from the live (projected) loan state, as the
+nightly job always did.  Older days use the historical formula of
+``app.routes.payments.compute_historical_unpaid_interest`` with the interest
+payments of a whole chunk summed in one query.
+"""
+import time
+from decimal import Decimal
+from datetime import datetime, timedelta
+from sqlalchemy import exists, func, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+from app.models import Loan, ReportComment, Transaction
+from app.services.loan_view import project_loans
+from app.utils.interest_helpers import _get_current_period_interest
+
+SNAPSHOT_CHUNK = 500
+DAILY_RATE = Decimal('0.045')
+
+_table = ReportComment.__table__
+
+
+def _unpaid_live(view):
+    if view.repayment_plan == 'weekly' and view.interest_rate > 0:
+        return _get_current_period_interest(view)
+    return max(Decimal('0'), view.accrued_interest - view.interest_paid)
+
+
+def _live_balances(loans, as_of_date):
+    return [(view, view.current_principal, _unpaid_live(view)) for view in project_loans(loans)]
+
+
+def _historical_balances(loans, as_of_date):
+    daily = {loan.id for loan in loans if loan.repayment_plan == 'daily' and loan.interest_rate > 0}
+    paid = dict(db.session.query(Transaction.loan_id, func.sum(Transaction.amount)).filter(
+        Transaction.loan_id.in_(daily),
+        Transaction.transaction_type == 'payment',
+        Transaction.payment_type == 'interest',
+        Transaction.created_at <= as_of_date,
+        Transaction.status == 'completed'
+    ).group_by(Transaction.loan_id)) if daily else {}
+
+    balances = []
+    for loan in loans:
+        if loan.id in daily:
+            days = (as_of_date - loan.disbursement_date.date()).days + 1
+            accrued = loan.current_principal * DAILY_RATE * days if days > 0 else Decimal('0')
+            unpaid = max(Decimal('0'), accrued - (paid.get(loan.id) or Decimal('0')))
+        else:
+            unpaid = _get_current_period_interest(loan)
+        balances.append((loan, loan.current_principal, unpaid))
+    return balances
+
+
+def _insert_ignoring_existing(rows):
+    """One multi-row INSERT; rows whose loan already has a snapshot that day are skipped."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        dml = postgresql if dialect == 'postgresql' else sqlite
+        stmt = dml.insert(_table).values(rows).on_conflict_do_nothing(
+            index_elements=['loan_id', 'report_date'],
+            index_where=_table.c.officer_id.is_(None)
+        )
+        return db.session.execute(stmt).rowcount
+    db.session.execute(insert(_table), rows)
+    return len(rows)
+
+
+def _chunk(as_of_date, after_id, chunk_size, live):
+    taken = exists().where(
+        ReportComment.loan_id == Loan.id,
+        ReportComment.report_date == as_of_date,
+        ReportComment.officer_id.is_(None)
+    )
+    q = Loan.query.filter(Loan.status == 'active', Loan.id > after_id, ~taken)
+    if not live:
+        q = q.filter(Loan.disbursement_date < as_of_date + timedelta(days=1))
+    return q.order_by(Loan.id).limit(chunk_size).all()
+
+
+def snapshot_day(as_of_date, chunk_size=SNAPSHOT_CHUNK):
+    """Write the missing snapshots of one day; returns ``{'loans', 'inserted'}``."""
+    live = as_of_date >= datetime.utcnow().date() - timedelta(days=1)
+    balances_for = _live_balances if live else _historical_balances
+
+    loans_seen = inserted = 0
+    last_id = 0
+    while True:
+        loans = _chunk(as_of_date, last_id, chunk_size, live)
+        if not loans:
+            break
+        last_id = loans[-1].id
+        now = datetime.utcnow()
+        rows = []
+        for loan, principal, unpaid in balances_for(loans, as_of_date):
+            rows.append({
+                'loan_id': loan.id,
+                'officer_id': None,          # No officer – system‑generated
+                'report_date': as_of_date,
+                'comment': '',
+                'current_principal': principal,
+                'unpaid_interest': unpaid,
+                'total_balance': principal + unpaid,
+                'interest_rate': loan.interest_rate,
+                'repayment_plan': loan.repayment_plan,
+                'created_at': now,
+                'updated_at': now,
+            })
+        inserted += _insert_ignoring_existing(rows)
+        db.session.commit()
+        loans_seen += len(loans)
+    return {'loans': loans_seen, 'inserted': inserted}
+
+
+def create_snapshots(start, end=None, chunk_size=SNAPSHOT_CHUNK):
+    """
+    Snapshot every day from ``start`` to ``end`` (inclusive, default ``start``).
+    Returns totals and the elapsed time.
+    """
+    end = end or start
+    began = time.perf_counter()
+    totals = {'days': 0, 'loans': 0, 'inserted': 0}
+    day = start
+    while day <= end:
+        result = snapshot_day(day, chunk_size)
+        totals['days'] += 1
+        totals['loans'] += result['loans']
+        totals['inserted'] += result['inserted']
+        day += timedelta(days=1)
+    totals['seconds'] = time.perf_counter() - began
+    return totals
@@ -0,0 +1,151 @@
+"""
+Keyset-paginated and streamed reads of the transactions table.
+
+Rows are ordered newest first on ``(created_at, id)`` and a page is fetched
+with ``(created_at, id) < cursor`` instead of OFFSET, so every page costs
+the same no matter how deep the caller is.  The client name comes from an
+outer join in the same statement (no per-row loan/client lazy loads).
+
+``export_rows`` walks the same query with ``yield_per`` so the CSV / NDJSON
+export never holds more than one chunk in memory.
+"""
+import base64
+import csv
+import io
+import json
+from datetime import datetime
+from sqlalchemy import tuple_
+from app import db
+from app.models import Transaction, Loan, Client
+from app.services.reporting import day_range
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+EXPORT_CHUNK = 1000
+
+CSV_COLUMNS = ['id', 'date', 'clientName', 'type', 'payment_type', 'amount', 'method',
+               'status', 'receipt', 'notes', 'mpesa_receipt', 'loan_id']
+
+
+class InvalidTransactionQuery(ValueError):
+    pass
+
+
+def encode_cursor(created_at, txn_id):
+    raw = json.dumps([created_at.isoformat(), txn_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, txn_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(txn_id)
+    except (ValueError, TypeError):
+        raise InvalidTransactionQuery('Invalid cursor')
+
+
+def _parse_date(value, name):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise InvalidTransactionQuery(f'Invalid {name}, expected YYYY-MM-DD')
+
+
+def filtered_query(args):
+    """
+    Transactions joined to their client name, filtered by the request args
+    ``type``, ``payment_type``, ``method``, ``loan_id``, ``start_date`` and
+    ``end_date`` (inclusive days), newest first.
+    """
+    q = db.session.query(Transaction, Client.full_name).outerjoin(
+        Loan, Transaction.loan_id == Loan.id
+    ).outerjoin(Client, Loan.client_id == Client.id)
+
+    if args.get('type'):
+        q = q.filter(Transaction.transaction_type == args['type'])
+    if args.get('payment_type'):
+        q = q.filter(Transaction.payment_type == args['payment_type'])
+    if args.get('method'):
+        q = q.filter(Transaction.payment_method == args['method'])
+    if args.get('loan_id'):
+        try:
+            q = q.filter(Transaction.loan_id == int(args['loan_id']))
+        except ValueError:
+            raise InvalidTransactionQuery('Invalid loan_id')
+
+    start = _parse_date(args['start_date'], 'start_date') if args.get('start_date') else None
+    end = _parse_date(args['end_date'], 'end_date') if args.get('end_date') else None
+    if start:
+        q = q.filter(Transaction.created_at >= day_range(start, start)[0])
+    if end:
+        q = q.filter(Transaction.created_at < day_range(end, end)[1])
+
+    return q.order_by(Transaction.created_at.desc(), Transaction.id.desc())
+
+
+def serialize(t, client_name):
+    receipt = 'N/A'
+    if t.payment_method == 'mpesa' and t.mpesa_receipt:
+        receipt = t.mpesa_receipt
+    elif t.payment_method == 'cash':
+        receipt = 'Cash'
+    return {
+        'id': t.id, 'date': t.created_at.isoformat() if t.created_at else None,
+        'clientName': client_name or 'Unknown', 'type': t.transaction_type, 'payment_type': t.payment_type,
+        'amount': float(t.amount), 'method': t.payment_method or 'cash',
+        'status': t.status or 'completed', 'receipt': receipt,
+        'notes': t.notes or '', 'mpesa_receipt': t.mpesa_receipt, 'loan_id': t.loan_id
+    }
+
+
+def page(args):
+    """One page: ``{'items', 'next_cursor', 'limit'}``."""
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise InvalidTransactionQuery('Invalid limit')
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    q = filtered_query(args)
+    if args.get('cursor'):
+        created_at, txn_id = decode_cursor(args['cursor'])
+        q = q.filter(tuple_(Transaction.created_at, Transaction.id) < tuple_(created_at, txn_id))
+
+    rows = q.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = None
+    if has_more and rows[-1][0].created_at is not None:
+        last = rows[-1][0]
+        next_cursor = encode_cursor(last.created_at, last.id)
+
+    return {
+        'items': [serialize(t, name) for t, name in rows],
+        'next_cursor': next_cursor,
+        'limit': limit,
+    }
+
+
+def export_rows(args):
+    """Yield serialized rows for the whole filtered history, one chunk at a time."""
+    for t, name in filtered_query(args).yield_per(EXPORT_CHUNK):
+        yield serialize(t, name)
+
+
+def export_ndjson(args):
+    for row in export_rows(args):
+        yield json.dumps(row) + '\n'
+
+
+def export_csv(args):
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=CSV_COLUMNS)
+    writer.writeheader()
+    for i, row in enumerate(export_rows(args), 1):
+        writer.writerow(row)
+        if i % EXPORT_CHUNK == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
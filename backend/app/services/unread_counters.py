@@ -0,0 +1,289 @@
+"""
+Unread badges kept in ``unread_counters`` instead of counted per request.
+
+One row per (user, kind, target): 'user' counts unread direct messages from
+``target_id``, 'group' unread messages of a group since the user last opened
+it, 'loan' comments on a loan since the user last read them.
+
+``before_flush`` turns inserted messages and comments, direct messages whose
+``read`` flag flips and group members who leave into counter changes;
+``after_flush`` applies them on the same connection (fan-out to group
+members / users with ``INSERT ... SELECT ... ON CONFLICT DO UPDATE``), so the
+counters commit or roll back with the write.  Bulk updates bypass the ORM
+events and call ``decrement`` / ``reset`` themselves.
+
+Every change is collected with its new value via ``RETURNING`` and pushed
+after commit as ``unread_badges`` to the ``user_<id>`` room.
+``python manage.py rebuild-unread-counters`` recomputes everything from the
+source tables.
+"""
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import and_, case, event, func, inspect, literal, or_, select, update
+from sqlalchemy.orm import Session
+from app import db
+from app.models import (
+    Comment, GroupMember, GroupReadStatus, Loan, PrivateMessage, UnreadCounter, User, UserLoanCommentRead
+)
+from app.services.financial_rollup import dialect_insert
+
+_PENDING_KEY = 'unread_counter_changes'
+_PUSH_KEY = 'unread_counter_push'
+_table = UnreadCounter.__table__
+_returning = (_table.c.user_id, _table.c.kind, _table.c.target_id, _table.c.count)
+
+
+def _queue_push(session, rows):
+    push = session.info.setdefault(_PUSH_KEY, {})
+    for user_id, kind, target_id, count in rows:
+        push[(user_id, kind, target_id)] = count
+
+
+# ---------------------------------------------------------------------------
+# Flush listeners
+# ---------------------------------------------------------------------------
+
+def _read_flipped(msg):
+    """+1 / -1 / 0 for a direct message whose ``read`` flag changed in this flush."""
+    history = inspect(msg).attrs.read.history
+    if not history.added or not history.deleted:
+        return 0
+    was, now = bool(history.deleted[0]), bool(history.added[0])
+    return 0 if was == now else (-1 if now else 1)
+
+
+def _collect(session, flush_context, instances):
+    deltas = defaultdict(int)          # (user_id, kind, target_id) -> change
+    group_fanout = defaultdict(int)    # (group_id, sender_id) -> new messages
+    loan_fanout = defaultdict(int)     # (loan_id, author_id) -> new comments
+    resets = set()
+
+    for obj in session.new:
+        if isinstance(obj, PrivateMessage):
+            if obj.group_id:
+                group_fanout[(obj.group_id, obj.sender_id)] += 1
+            elif obj.recipient_id and not obj.read:
+                deltas[(obj.recipient_id, 'user', obj.sender_id)] += 1
+        elif isinstance(obj, Comment):
+            loan_fanout[(obj.loan_id, obj.user_id)] += 1
+    for obj in session.dirty:
+        if isinstance(obj, PrivateMessage) and obj.recipient_id and not obj.group_id:
+            change = _read_flipped(obj)
+            if change:
+                deltas[(obj.recipient_id, 'user', obj.sender_id)] += change
+        elif isinstance(obj, GroupMember) and obj.is_active is False:
+            if inspect(obj).attrs.is_active.history.has_changes():
+                resets.add((obj.user_id, 'group', obj.group_id))
+    for obj in session.deleted:
+        if isinstance(obj, PrivateMessage) and obj.recipient_id and not obj.group_id and not obj.read:
+            deltas[(obj.recipient_id, 'user', obj.sender_id)] -= 1
+
+    deltas = {k: v for k, v in deltas.items() if v}
+    if deltas or group_fanout or loan_fanout or resets:
+        session.info[_PENDING_KEY] = (deltas, group_fanout, loan_fanout, resets)
+    else:
+        session.info.pop(_PENDING_KEY, None)
+
+
+def _add_on_conflict(stmt):
+    """``count = count + excluded.count`` upsert returning the new values."""
+    return stmt.on_conflict_do_update(
+        index_elements=['user_id', 'kind', 'target_id'],
+        set_={'count': _table.c.count + stmt.excluded.count, 'updated_at': stmt.excluded.updated_at}
+    ).returning(*_returning)
+
+
+def _increment(connection, increments, now):
+    insert = dialect_insert(connection.dialect.name)
+    return connection.execute(_add_on_conflict(insert(_table).values([
+        {'user_id': user_id, 'kind': kind, 'target_id': target_id, 'count': n, 'updated_at': now}
+        for (user_id, kind, target_id), n in sorted(increments.items())
+    ]))).all()
+
+
+def _fanout(connection, recipients):
+    """Add to the counters of every row of ``recipients`` (user_id, kind, target_id, n, now)."""
+    insert = dialect_insert(connection.dialect.name)
+    stmt = insert(_table).from_select(['user_id', 'kind', 'target_id', 'count', 'updated_at'], recipients)
+    return connection.execute(_add_on_conflict(stmt)).all()
+
+
+def _group_fanout(connection, group_id, sender_id, n, now):
+    return _fanout(connection, select(
+        GroupMember.user_id, literal('group'), literal(group_id), literal(n), literal(now)
+    ).where(GroupMember.group_id == group_id, GroupMember.is_active.is_(True),
+            GroupMember.user_id != sender_id))
+
+
+def _loan_fanout(connection, loan_id, author_id, n, now):
+    return _fanout(connection, select(
+        User.id, literal('loan'), literal(loan_id), literal(n), literal(now)
+    ).where(User.id != author_id))
+
+
+def _set_count(connection, user_id, kind, target_id, count_expr):
+    return connection.execute(
+        update(_table)
+        .where(_table.c.user_id == user_id, _table.c.kind == kind,
+               _table.c.target_id == target_id, _table.c.count > 0)
+        .values(count=count_expr, updated_at=datetime.utcnow())
+        .returning(*_returning)
+    ).all()
+
+
+def _apply(session, flush_context):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    deltas, group_fanout, loan_fanout, resets = pending
+    connection = session.connection()
+    now = datetime.utcnow()
+    rows = []
+
+    increments = {k: v for k, v in deltas.items() if v > 0}
+    if increments:
+        rows += _increment(connection, increments, now)
+    for (user_id, kind, target_id), n in deltas.items():
+        if n < 0:
+            rows += _set_count(connection, user_id, kind, target_id,
+                               case((_table.c.count > -n, _table.c.count + n), else_=0))
+    for (group_id, sender_id), n in group_fanout.items():
+        rows += _group_fanout(connection, group_id, sender_id, n, now)
+    for (loan_id, author_id), n in loan_fanout.items():
+        rows += _loan_fanout(connection, loan_id, author_id, n, now)
+    for user_id, kind, target_id in resets:
+        rows += _set_count(connection, user_id, kind, target_id, 0)
+    _queue_push(session, rows)
+
+
+def _push(session):
+    push = session.info.pop(_PUSH_KEY, None)
+    if not push:
+        return
+    from app.utils.extensions import socketio
+    by_user = defaultdict(list)
+    for (user_id, kind, target_id), count in push.items():
+        by_user[user_id].append({'kind': kind, 'id': target_id, 'count': count})
+    for user_id, updates in by_user.items():
+        try:
+            socketio.emit('unread_badges', {'updates': updates}, room=f'user_{user_id}')
+        except Exception as e:
+            print(f"Unread badge push failed: {e}")
+
+
+def _discard(session, previous_transaction):
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_PUSH_KEY, None)
+
+
+def register_unread_listeners():
+    if not event.contains(Session, 'before_flush', _collect):
+        event.listen(Session, 'before_flush', _collect)
+        event.listen(Session, 'after_flush', _apply)
+        event.listen(Session, 'after_commit', _push)
+        event.listen(Session, 'after_soft_rollback', _discard)
+
+
+# ---------------------------------------------------------------------------
+# Explicit updates (bulk paths and "mark as read")
+# ---------------------------------------------------------------------------
+
+def decrement(user_id, kind, target_id, n):
+    """Lower a counter by ``n`` (not below zero); the caller commits."""
+    rows = _set_count(db.session.connection(), user_id, kind, target_id,
+                      case((_table.c.count > n, _table.c.count - n), else_=0))
+    _queue_push(db.session, rows)
+
+
+def reset(user_id, kind, target_id):
+    """Zero a counter, e.g. when the conversation is opened; the caller commits."""
+    _queue_push(db.session, _set_count(db.session.connection(), user_id, kind, target_id, 0))
+
+
+# ---------------------------------------------------------------------------
+# Reads
+# ---------------------------------------------------------------------------
+
+def badges_for(user_id):
+    """
+    All non-zero badges of a user in one query:
+    ``{'messages': {sender_id: n}, 'groups': {group_id: n}, 'comments': {loan_id: n}, 'total': n}``
+    where ``total`` is the message + group count shown on the inbox button.
+    Comment badges are limited to active loans, like the loan lists.
+    """
+    rows = db.session.query(UnreadCounter.kind, UnreadCounter.target_id, UnreadCounter.count).outerjoin(
+        Loan, and_(UnreadCounter.kind == 'loan', Loan.id == UnreadCounter.target_id)
+    ).filter(
+        UnreadCounter.user_id == user_id, UnreadCounter.count > 0,
+        or_(UnreadCounter.kind != 'loan', Loan.status == 'active')
+    ).all()
+    result = {'messages': {}, 'groups': {}, 'comments': {}}
+    section = {'user': 'messages', 'group': 'groups', 'loan': 'comments'}
+    for kind, target_id, count in rows:
+        result[section[kind]][target_id] = count
+    result['total'] = sum(result['messages'].values()) + sum(result['groups'].values())
+    return result
+
+
+def counts_by_target(user_id, kind, target_column, *criteria):
+    """``{target: n}`` for every row of ``target_column`` matching ``criteria``, zeros included."""
+    rows = db.session.query(target_column, func.coalesce(UnreadCounter.count, 0)).outerjoin(
+        UnreadCounter, and_(UnreadCounter.user_id == user_id, UnreadCounter.kind == kind,
+                            UnreadCounter.target_id == target_column)
+    ).filter(*criteria)
+    return {target_id: count for target_id, count in rows}
+
+
+def total_for(user_id, kinds):
+    return db.session.query(func.coalesce(func.sum(UnreadCounter.count), 0)).filter(
+        UnreadCounter.user_id == user_id, UnreadCounter.kind.in_(kinds)
+    ).scalar()
+
+
+# ---------------------------------------------------------------------------
+# Rebuild
+# ---------------------------------------------------------------------------
+
+def rebuild_unread_counters():
+    """Recompute every counter from messages, comments and read markers; returns rows written."""
+    now = datetime.utcnow()
+    direct = select(
+        PrivateMessage.recipient_id, literal('user'), PrivateMessage.sender_id,
+        func.count(PrivateMessage.id), literal(now)
+    ).where(
+        PrivateMessage.recipient_id.isnot(None), PrivateMessage.group_id.is_(None),
+        PrivateMessage.read == False  # noqa: E712
+    ).group_by(PrivateMessage.recipient_id, PrivateMessage.sender_id)
+
+    groups = select(
+        GroupMember.user_id, literal('group'), GroupMember.group_id,
+        func.count(PrivateMessage.id), literal(now)
+    ).join(
+        PrivateMessage, and_(PrivateMessage.group_id == GroupMember.group_id,
+                             PrivateMessage.sender_id != GroupMember.user_id)
+    ).outerjoin(
+        GroupReadStatus, and_(GroupReadStatus.user_id == GroupMember.user_id,
+                              GroupReadStatus.group_id == GroupMember.group_id)
+    ).where(
+        GroupMember.is_active.is_(True),
+        or_(GroupReadStatus.last_read_at.is_(None), PrivateMessage.created_at > GroupReadStatus.last_read_at)
+    ).group_by(GroupMember.user_id, GroupMember.group_id)
+
+    comments = select(
+        User.id, literal('loan'), Comment.loan_id, func.count(Comment.id), literal(now)
+    ).join(
+        Comment, Comment.user_id != User.id
+    ).outerjoin(
+        UserLoanCommentRead, and_(UserLoanCommentRead.user_id == User.id,
+                                  UserLoanCommentRead.loan_id == Comment.loan_id)
+    ).where(
+        or_(UserLoanCommentRead.last_read_at.is_(None), Comment.created_at > UserLoanCommentRead.last_read_at)
+    ).group_by(User.id, Comment.loan_id)
+
+    UnreadCounter.query.delete(synchronize_session=False)
+    columns = ['user_id', 'kind', 'target_id', 'count', 'updated_at']
+    written = 0
+    for source in (direct, groups, comments):
+        written += db.session.execute(_table.insert().from_select(columns, source)).rowcount
+    db.session.commit()
+    return written
@@ -0,0 +1,108 @@
+"""
+Content-addressed storage for uploaded files (attachments, documents).
+
+A blob is stored once under the SHA-256 of its bytes, so the same file
+uploaded twice takes the space of one.  ``LocalBlobStore`` keeps blobs on
+disk as ``<root>/ab/cd/<sha256>``; uploads are written in chunks to a
+temporary file while hashing and then renamed into place, so neither the
+upload nor a download is ever held in memory whole.  Any other backend
+only needs the same methods:
+
+    put(stream)        -> (sha256, size)
+    path(key)          -> local path for send_file, or None
+    open(key)          -> binary file object
+    exists(key), delete(key)
+    keys()             -> (sha256, last stored at) of every blob
+    durable            -> True when blobs survive a redeploy
+
+``init_blob_store(app)`` picks the backend from ``BLOB_STORE_BACKEND``.
+Without ``BLOB_STORE_PATH`` blobs go to ``instance/blobs``, which is not
+durable (``durable`` is False and attachments keep their ``file_data``).
+
+Blobs are never deleted while the app serves requests -- an upload of the
+same bytes could be pointing a new row at them.  ``gc_blobs``
+(app.services.attachments) removes unreferenced ones offline.
+"""
+import hashlib
+import os
+import tempfile
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class LocalBlobStore:
+    def __init__(self, root, durable=True):
+        self.root = os.path.abspath(root)
+        self.durable = durable
+        os.makedirs(os.path.join(self.root, 'tmp'), exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def put(self, stream, chunk_size=CHUNK_SIZE):
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.root, 'tmp'))
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                while True:
+                    chunk = stream.read(chunk_size)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    tmp.write(chunk)
+                    size += len(chunk)
+            key = digest.hexdigest()
+            target = self.path(key)
+            if os.path.exists(target):
+                os.remove(tmp_path)            # already stored: dedupe
+                os.utime(target)               # stored again now, as far as gc_blobs is concerned
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(tmp_path, target)
+            return key, size
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def open(self, key):
+        return open(self.path(key), 'rb')
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def keys(self):
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            if dirpath == self.root:
+                dirnames[:] = [d for d in dirnames if d != 'tmp']
+                continue
+            for name in filenames:
+                try:
+                    yield name, os.path.getmtime(os.path.join(dirpath, name))
+                except FileNotFoundError:
+                    pass
+
+
+blob_store = None
+
+
+def init_blob_store(app):
+    """Create the backend configured by BLOB_STORE_BACKEND (only 'local' for now)."""
+    global blob_store
+    backend = app.config.get('BLOB_STORE_BACKEND', 'local')
+    if backend != 'local':
+        raise RuntimeError(f'Unknown BLOB_STORE_BACKEND: {backend}')
+    path = app.config.get('BLOB_STORE_PATH')
+    blob_store = LocalBlobStore(path or os.path.join(app.instance_path, 'blobs'), durable=bool(path))
+    return blob_store
+
+
+def get_blob_store():
+    return blob_store
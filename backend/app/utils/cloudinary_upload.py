@@ -1,7 +1,106 @@
+"""
+Image uploads to Cloudinary.
+
+Every upload is named after the SHA-256 of the image bytes and sent with
+``overwrite=False``, so retrying an upload (or rerunning a migration that
+died halfway) returns the asset already stored instead of creating a copy.
+Transient failures are retried with exponential backoff; ``upload_many``
+runs a batch of uploads on a bounded thread pool.
+
+``CLOUDINARY_BACKEND=fake`` swaps the real uploader for ``FakeUploader``,
+an in-memory stand-in that never touches the network, for local runs and
+tests.
+"""
+import base64
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import cloudinary.exceptions
 import cloudinary.uploader
-import uuid
 
-def upload_base64_image(base64_string, folder='livestock'):
+UPLOAD_WORKERS = 4
+UPLOAD_RETRIES = 3
+RETRY_BACKOFF = 0.5          # seconds, doubled after each failed attempt
+
+# Errors that will fail the same way on every attempt
+PERMANENT_ERRORS = (
+    cloudinary.exceptions.BadRequest,
+    cloudinary.exceptions.AuthorizationRequired,
+    cloudinary.exceptions.NotAllowed,
+    ValueError,
+)
+
+
+class FakeUploader:
+    """Minimal stand-in for ``cloudinary.uploader`` keeping assets in memory."""
+
+    base_url = 'https://res.cloudinary.local/fake/image/upload'
+
+    def __init__(self):
+        self.assets = {}
+        self.calls = 0
+        self._failures = 0
+        self._lock = threading.Lock()
+
+    def fail_next(self, count=1):
+        """Make the next ``count`` uploads raise, as a flaky network would."""
+        with self._lock:
+            self._failures = count
+
+    def upload(self, file, public_id=None, folder=None, overwrite=True, **options):
+        with self._lock:
+            self.calls += 1
+            if self._failures:
+                self._failures -= 1
+                raise cloudinary.exceptions.GeneralError('Simulated upload failure')
+            full_id = f"{folder}/{public_id}" if folder else public_id
+            if full_id not in self.assets or overwrite:
+                self.assets[full_id] = file
+            return {'public_id': full_id, 'secure_url': f"{self.base_url}/{full_id}"}
+
+    def destroy(self, public_id, **options):
+        with self._lock:
+            return {'result': 'ok' if self.assets.pop(public_id, None) is not None else 'not found'}
+
+
+uploader = cloudinary.uploader
+
+
+def init_uploader(app):
+    """Pick the uploader configured by CLOUDINARY_BACKEND ('cloudinary' or 'fake')."""
+    global uploader
+    backend = app.config.get('CLOUDINARY_BACKEND', 'cloudinary')
+    if backend == 'fake':
+        uploader = FakeUploader()
+    elif backend == 'cloudinary':
+        uploader = cloudinary.uploader
+    else:
+        raise RuntimeError(f'Unknown CLOUDINARY_BACKEND: {backend}')
+    return uploader
+
+
+def get_uploader():
+    return uploader
+
+
+def with_retries(fn, retries=UPLOAD_RETRIES, backoff=RETRY_BACKOFF):
+    """Call ``fn()``, retrying transient errors up to ``retries`` more times."""
+    delay = backoff
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except PERMANENT_ERRORS:
+            raise
+        except Exception as e:
+            if attempt == retries:
+                raise
+            print(f"Cloudinary upload failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+            delay *= 2
+
+
+def upload_base64_image(base64_string, folder='livestock', retries=UPLOAD_RETRIES):
     """
     Upload a base64 image to Cloudinary and return the secure URL.
     The folder parameter organises images (e.g., 'livestock', 'loan_applications').
@@ -11,27 +110,48 @@ def upload_base64_image(base64_string, folder='livestock'):
         if 'base64,' in base64_string:
             base64_string = base64_string.split('base64,')[1]
 
-        # Generate a unique public_id to avoid collisions
-        public_id = f"{folder}/{uuid.uuid4()}"
+        # Same bytes, same public_id: a retried upload reuses the stored asset
+        public_id = hashlib.sha256(base64.b64decode(base64_string)).hexdigest()
 
-        # Upload to Cloudinary
-        upload_result = cloudinary.uploader.upload(
+        upload_result = with_retries(lambda: uploader.upload(
             f"data:image/png;base64,{base64_string}",
             public_id=public_id,
             folder=folder,
+            overwrite=False,
             resource_type="image"
-        )
+        ), retries=retries)
 
         return upload_result.get('secure_url')
     except Exception as e:
         print(f"Cloudinary upload error: {str(e)}")
         raise
 
+
+def upload_many(images, folder='livestock', max_workers=UPLOAD_WORKERS, retries=UPLOAD_RETRIES):
+    """
+    Upload several base64 images in parallel.  Returns a list in the same
+    order with the URL of each image, or None where the upload failed;
+    entries that already are URLs are passed through.
+    """
+    def upload(img):
+        if isinstance(img, str) and img.startswith('http'):
+            return img
+        try:
+            return upload_base64_image(img, folder=folder, retries=retries)
+        except Exception:
+            return None
+
+    if not images:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(images))) as pool:
+        return list(pool.map(upload, images))
+
+
 def delete_image(public_id):
     """Delete an image from Cloudinary by its public_id."""
     try:
-        result = cloudinary.uploader.destroy(public_id)
+        result = uploader.destroy(public_id)
         return result
     except Exception as e:
         print(f"Cloudinary delete error: {str(e)}")
-        raise
\ No newline at end of file
+        raise
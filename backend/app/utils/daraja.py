@@ -1,10 +1,112 @@
-# In daraja.py - Add rate limiting protection
-import requests
+"""
+Safaricom Daraja (M-Pesa) client.
+
+Everything that should outlive one call is process-wide and shared by all
+requests and the job worker (use ``get_daraja()``):
+
+* the OAuth token, kept until shortly before it expires and refreshed in
+  the background once it is within ``TOKEN_REFRESH_AHEAD`` of expiry, so
+  callers never wait on a token fetch after the first one;
+* a pooled ``requests.Session``, so calls reuse keep-alive connections
+  instead of a new TCP/TLS handshake each time;
+* a token bucket spacing calls to Daraja.  A request that finds it empty
+  gets a rate-limit error with ``retry_after`` instead of sleeping.
+
+``DARAJA_BASE_URL`` points the client elsewhere, e.g. at the local mock in
+app.utils.daraja_mock (``python manage.py daraja-mock``).
+"""
 import base64
-from datetime import datetime, timedelta
+import json
 import os
+import threading
 import time
-import json
+from datetime import datetime
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ProtocolError
+from app.utils.rate_limit import TokenBucket
+
+SANDBOX_URL = "https://sandbox.safaricom.co.ke"
+TOKEN_REFRESH_AHEAD = 5 * 60     # seconds before expiry a background refresh starts
+TOKEN_DEFAULT_TTL = 3599         # Daraja tokens last an hour
+RATE_BURST = 2
+RATE_PER_SECOND = 0.5            # was one call per 2 seconds per instance
+POOL_SIZE = 10
+TIMEOUT = 30
+
+
+def _new_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=POOL_SIZE)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+_session = _new_session()
+_limiter = TokenBucket(RATE_BURST, RATE_PER_SECOND)
+
+
+class _TokenCache:
+    def __init__(self):
+        self.token = None
+        self.expires_at = 0
+        self.refreshing = False
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self.token = None
+            self.expires_at = 0
+
+    def get(self, fetch, force_refresh=False):
+        now = time.monotonic()
+        if not force_refresh and self.token and now < self.expires_at:
+            if now >= self.expires_at - TOKEN_REFRESH_AHEAD and not self.refreshing:
+                self.refreshing = True
+                threading.Thread(target=self._refresh, args=(fetch,), daemon=True).start()
+            return self.token
+        with self._lock:     # one fetch at a time; the others reuse its token
+            if not force_refresh and self.token and time.monotonic() < self.expires_at:
+                return self.token
+            return self._store(fetch())
+
+    def _refresh(self, fetch):
+        try:
+            with self._lock:
+                self._store(fetch())
+        finally:
+            self.refreshing = False
+
+    def _store(self, fetched):
+        if fetched:
+            token, ttl = fetched
+            self.token = token
+            self.expires_at = time.monotonic() + max(ttl - 60, 60)
+        return self.token if fetched else None
+
+
+_token_cache = _TokenCache()
+
+
+def _rate_limited(retry_after):
+    wait = max(1, int(retry_after + 0.999))
+    return {
+        'success': False,
+        'error': f'Daraja rate limit reached. Please try again in {wait} seconds.',
+        'retry_after': wait
+    }
+
+
+def _never_sent(exc):
+    """True if ``exc`` means the request did not reach Daraja (connect failed or timed out)."""
+    if isinstance(exc, requests.exceptions.ConnectTimeout):
+        return True
+    if not isinstance(exc, requests.exceptions.ConnectionError):
+        return False
+    # a connection dropped after the request was written is ambiguous
+    return not any(isinstance(arg, ProtocolError) for arg in exc.args)
+
 
 class DarajaAPI:
     def __init__(self):
@@ -12,101 +114,72 @@ class DarajaAPI:
         self.consumer_secret = os.getenv('DARAJA_CONSUMER_SECRET')
         self.shortcode = os.getenv('DARAJA_SHORTCODE')
         self.passkey = os.getenv('DARAJA_PASSKEY')
-        self.base_url = "https://sandbox.safaricom.co.ke"
-        
-        # Cache for access token
-        self._access_token = None
-        self._token_expiry = None
-        
-        # Rate limiting protection
-        self._last_request_time = 0
-        self._min_request_interval = 2  # Minimum 2 seconds between requests
-
-    def _rate_limit(self):
-        """Implement rate limiting to avoid 429 errors"""
-        current_time = time.time()
-        time_since_last_request = current_time - self._last_request_time
-        
-        if time_since_last_request < self._min_request_interval:
-            sleep_time = self._min_request_interval - time_since_last_request
-            print(f"Rate limiting: sleeping for {sleep_time:.2f} seconds")
-            time.sleep(sleep_time)
-        
-        self._last_request_time = time.time()
+        self.base_url = os.getenv('DARAJA_BASE_URL', SANDBOX_URL).rstrip('/')
 
-    def get_access_token(self, force_refresh=False):
-        """Get M-Pesa access token with caching and rate limiting"""
+    def _fetch_token(self):
+        """``(token, ttl_seconds)`` from the OAuth endpoint, or None."""
         try:
-            # Return cached token if still valid (55 minutes)
-            if not force_refresh and self._access_token and self._token_expiry:
-                if datetime.now() < self._token_expiry:
-                    print("Using cached access token")
-                    return self._access_token
-            
-            # Apply rate limiting
-            self._rate_limit()
-            
-            # Encode consumer key and secret
             credentials = f"{self.consumer_key}:{self.consumer_secret}"
             encoded_credentials = base64.b64encode(credentials.encode()).decode()
-            
-            headers = {
-                'Authorization': f'Basic {encoded_credentials}',
-                'Content-Type': 'application/json'
-            }
-            
-            print(f"Requesting new access token from: {self.base_url}/oauth/v1/generate?grant_type=client_credentials")
-            
-            response = requests.get(
+            response = _session.get(
                 f"{self.base_url}/oauth/v1/generate?grant_type=client_credentials",
-                headers=headers,
-                timeout=30
+                headers={'Authorization': f'Basic {encoded_credentials}'},
+                timeout=TIMEOUT
             )
-            
-            print(f"Access token response status: {response.status_code}")
-            
             if response.status_code == 200:
                 data = response.json()
                 access_token = data.get('access_token')
                 if access_token:
-                    print("Successfully obtained new access token")
-                    # Cache the token for 55 minutes
-                    self._access_token = access_token
-                    self._token_expiry = datetime.now() + timedelta(minutes=55)
-                    return access_token
-                else:
-                    print(f"No access token in response: {data}")
-                    return None
+                    return access_token, int(data.get('expires_in') or TOKEN_DEFAULT_TTL)
+                print(f"No access token in response: {data}")
             elif response.status_code == 429:
                 print("Rate limited when getting access token")
-                return None
             else:
                 print(f"Failed to get access token: HTTP {response.status_code}, Response: {response.text}")
-                return None
-                
         except Exception as e:
             print(f"Exception getting access token: {str(e)}")
-            return None
+        return None
 
-    def stk_push(self, phone_number, amount, account_reference, callback_url):
-        """Send STK push to customer with rate limiting"""
-        try:
-            # Get access token first
-            access_token = self.get_access_token()
+    def get_access_token(self, force_refresh=False):
+        """Cached M-Pesa access token (None if it cannot be obtained)."""
+        return _token_cache.get(self._fetch_token, force_refresh)
+
+    def _password(self):
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        password = base64.b64encode(f"{self.shortcode}{self.passkey}{timestamp}".encode()).decode()
+        return password, timestamp
+
+    def _post(self, path, payload):
+        """POST with the cached token, fetching a fresh one once if Daraja rejects it."""
+        for attempt in range(2):
+            access_token = self.get_access_token(force_refresh=attempt > 0)
             if not access_token:
-                return {'success': False, 'error': 'Failed to get access token'}
-            
-            # Apply rate limiting
-            self._rate_limit()
-            
-            print(f"Successfully obtained access token: {access_token[:20]}...")
-            
-            # Prepare STK push request
-            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            password = base64.b64encode(
-                f"{self.shortcode}{self.passkey}{timestamp}".encode()
-            ).decode()
-            
+                return None
+            response = _session.post(
+                f"{self.base_url}{path}",
+                json=payload,
+                headers={'Authorization': f'Bearer {access_token}'},
+                timeout=TIMEOUT
+            )
+            if response.status_code != 401:
+                return response
+        return response
+
+    def stk_push(self, phone_number, amount, account_reference, callback_url, max_wait=0):
+        """
+        Send STK push to customer; waits at most ``max_wait`` seconds for the rate limit.
+
+        An STK push is not idempotent, so a failed result says whether sending
+        it again is safe: ``retryable`` when Daraja never accepted the request
+        (local rate limit, no token, connection not made, HTTP 429) and
+        ``unknown`` when it may have (read timeout, HTTP 5xx, dropped connection).
+        """
+        try:
+            retry_after = _limiter.acquire(max_wait)
+            if retry_after:
+                return {**_rate_limited(retry_after), 'retryable': True}
+
+            password, timestamp = self._password()
             payload = {
                 "BusinessShortCode": self.shortcode,
                 "Password": password,
@@ -120,23 +193,13 @@ class DarajaAPI:
                 "AccountReference": account_reference,
                 "TransactionDesc": "Loan Payment"
             }
-            
-            print(f"STK Push Payload: {payload}")
-            
-            headers = {
-                'Authorization': f'Bearer {access_token}',
-                'Content-Type': 'application/json'
-            }
-            
-            response = requests.post(
-                f"{self.base_url}/mpesa/stkpush/v1/processrequest",
-                json=payload,
-                headers=headers,
-                timeout=30
-            )
-            
+
+            response = self._post("/mpesa/stkpush/v1/processrequest", payload)
+            if response is None:
+                return {'success': False, 'error': 'Failed to get access token', 'retryable': True}
+
             print(f"STK Push Response Status: {response.status_code}")
-            
+
             if response.status_code == 200:
                 data = response.json()
                 if 'ResponseCode' in data and data['ResponseCode'] == '0':
@@ -157,41 +220,33 @@ class DarajaAPI:
             elif response.status_code == 429:
                 return {
                     'success': False,
-                    'error': 'Rate limited by Daraja. Please try again in a moment.'
+                    'error': 'Rate limited by Daraja. Please try again in a moment.',
+                    'retryable': True
                 }
             else:
                 return {
                     'success': False,
-                    'error': f'HTTP {response.status_code}: {response.text}'
+                    'error': f'HTTP {response.status_code}: {response.text}',
+                    'unknown': response.status_code >= 500
                 }
-                
+
         except Exception as e:
+            never_sent = _never_sent(e)
             return {
                 'success': False,
-                'error': f'STK push exception: {str(e)}'
+                'error': f'STK push exception: {str(e)}',
+                'retryable': never_sent,
+                'unknown': not never_sent
             }
-        
-    def check_stk_status(self, checkout_request_id):
-        """Check status of STK push request with enhanced rate limiting"""
+
+    def check_stk_status(self, checkout_request_id, max_wait=0):
+        """Check status of an STK push request."""
         try:
-            # Apply rate limiting before even trying to get token
-            self._rate_limit()
-            
-            # Try to get access token, retry once if failed
-            access_token = self.get_access_token()
-            if not access_token:
-                # Wait a bit before retry
-                time.sleep(3)
-                access_token = self.get_access_token(force_refresh=True)
-                if not access_token:
-                    return {'success': False, 'error': 'Failed to get access token after retry'}
-
-            url = f"{self.base_url}/mpesa/stkpushquery/v1/query"
-            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            password = base64.b64encode(
-                f"{self.shortcode}{self.passkey}{timestamp}".encode()
-            ).decode()
+            retry_after = _limiter.acquire(max_wait)
+            if retry_after:
+                return _rate_limited(retry_after)
 
+            password, timestamp = self._password()
             payload = {
                 "BusinessShortCode": self.shortcode,
                 "Password": password,
@@ -199,15 +254,12 @@ class DarajaAPI:
                 "CheckoutRequestID": checkout_request_id
             }
 
-            headers = {
-                'Authorization': f'Bearer {access_token}',
-                'Content-Type': 'application/json'
-            }
-
             print(f"Checking STK status for: {checkout_request_id}")
 
-            response = requests.post(url, json=payload, headers=headers, timeout=30)
-            
+            response = self._post("/mpesa/stkpushquery/v1/query", payload)
+            if response is None:
+                return {'success': False, 'error': 'Failed to get access token'}
+
             # Handle JSON parsing more gracefully
             try:
                 response_data = response.json()
@@ -250,4 +302,15 @@ class DarajaAPI:
             return {'success': False, 'error': f'Network error: {str(e)}'}
         except Exception as e:
             print(f"STK status check error: {str(e)}")
-            return {'success': False, 'error': str(e)}
\ No newline at end of file
+            return {'success': False, 'error': str(e)}
+
+
+_client = None
+
+
+def get_daraja():
+    """The process-wide client (credentials are read from the environment once)."""
+    global _client
+    if _client is None:
+        _client = DarajaAPI()
+    return _client
@@ -0,0 +1,82 @@
+"""
+Local stand-in for the Safaricom Daraja endpoints the app calls, for
+development and tests without sandbox credentials or network:
+
+    GET  /oauth/v1/generate
+    POST /mpesa/stkpush/v1/processrequest
+    POST /mpesa/stkpushquery/v1/query
+
+Run it with ``python manage.py daraja-mock --port 5055`` and set
+``DARAJA_BASE_URL=http://127.0.0.1:5055``.  ``stats`` counts the calls,
+e.g. how many tokens were issued.
+"""
+import threading
+import uuid
+from flask import Flask, jsonify, request
+from werkzeug.serving import make_server
+
+
+def create_mock_app(token_ttl=3599):
+    app = Flask('daraja_mock')
+    tokens = set()
+    pushes = {}
+    stats = {'tokens': 0, 'stk_push': 0, 'query': 0, 'rejected': 0}
+    app.config['stats'] = stats
+    app.config['tokens'] = tokens
+
+    def authorized():
+        header = request.headers.get('Authorization', '')
+        if header.startswith('Bearer ') and header[7:] in tokens:
+            return True
+        stats['rejected'] += 1
+        return False
+
+    @app.get('/oauth/v1/generate')
+    def generate():
+        if not request.headers.get('Authorization', '').startswith('Basic '):
+            return jsonify({'errorMessage': 'Invalid credentials'}), 400
+        stats['tokens'] += 1
+        token = uuid.uuid4().hex
+        tokens.add(token)
+        return jsonify({'access_token': token, 'expires_in': str(token_ttl)})
+
+    @app.post('/mpesa/stkpush/v1/processrequest')
+    def stk_push():
+        if not authorized():
+            return jsonify({'errorCode': '404.001.03', 'errorMessage': 'Invalid Access Token'}), 401
+        stats['stk_push'] += 1
+        data = request.get_json()
+        checkout_id = f"ws_CO_{uuid.uuid4().hex[:20]}"
+        pushes[checkout_id] = data
+        return jsonify({
+            'MerchantRequestID': uuid.uuid4().hex[:16],
+            'CheckoutRequestID': checkout_id,
+            'ResponseCode': '0',
+            'ResponseDescription': 'Success. Request accepted for processing',
+            'CustomerMessage': 'Success. Request accepted for processing',
+        })
+
+    @app.post('/mpesa/stkpushquery/v1/query')
+    def query():
+        if not authorized():
+            return jsonify({'errorCode': '404.001.03', 'errorMessage': 'Invalid Access Token'}), 401
+        stats['query'] += 1
+        checkout_id = request.get_json().get('CheckoutRequestID')
+        if checkout_id not in pushes:
+            return jsonify({'errorCode': '500.001.1001', 'errorMessage': 'The transaction is being processed'}), 500
+        return jsonify({
+            'ResponseCode': '0',
+            'CheckoutRequestID': checkout_id,
+            'ResultCode': '0',
+            'ResultDesc': 'The service request is processed successfully.',
+        })
+
+    return app
+
+
+def serve(port=5055, host='127.0.0.1', **kwargs):
+    """Start the mock on a background thread; returns ``(server, app)``."""
+    app = create_mock_app(**kwargs)
+    server = make_server(host, port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, app
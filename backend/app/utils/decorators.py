@@ -1,18 +1,22 @@
 from functools import wraps
 from flask import jsonify
-from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
-from app.models import User
+from flask_jwt_extended import verify_jwt_in_request
+from app.utils.rbac import StaleToken, current_user_auth
+
+STALE_TOKEN_ERROR = 'Your role has changed. Please log in again.'
+
 
 def role_required(roles):
     def decorator(fn):
         @wraps(fn)
         def wrapper(*args, **kwargs):
             verify_jwt_in_request()
-            user_id = int(get_jwt_identity())
-            user = User.query.get(user_id)
-            print(f"🔍 role_required: user_id={user_id}, role={user.role if user else None}, required={roles}")
-            if not user or user.role not in roles:
+            try:
+                auth = current_user_auth()
+            except StaleToken:
+                return jsonify({'error': STALE_TOKEN_ERROR}), 401
+            if not auth or auth.role not in roles:
                 return jsonify({'error': 'Permission denied'}), 403
             return fn(*args, **kwargs)
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
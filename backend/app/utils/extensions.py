@@ -3,6 +3,8 @@ from flask import request
 from flask_jwt_extended import decode_token
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from app.utils.presence import get_presence
+from app.utils import socket_identity
 
 # DB instance – imported by models.py
 db = SQLAlchemy()
@@ -14,8 +16,10 @@ socketio = SocketIO(
     ping_timeout=20
 )
 
-user_connections = {}   # user_id -> connection count
-sid_to_user = {}        # socket_id -> user_id
+# Presence (who is online, which sid belongs to whom) lives in app.utils.presence
+# so several workers can share it; see PRESENCE_BACKEND / SOCKETIO_MESSAGE_QUEUE.
+HEARTBEAT_INTERVAL = 20
+_heartbeat_started = False
 
 
 # ---------- Helpers ----------
@@ -48,6 +52,34 @@ def get_user_from_token():
     return None
 
 
+def current_socket_user():
+    """Identity bound to this sid at connect time (see app.utils.socket_identity)."""
+    user = socket_identity.lookup(request.sid)
+    if user is None:
+        user = get_user_from_token()
+        if user:
+            user = socket_identity.bind(request.sid, user)
+    return user
+
+
+def _heartbeat_loop():
+    """Keep this worker's presence alive and release the sids of dead workers."""
+    while True:
+        socketio.sleep(HEARTBEAT_INTERVAL)
+        try:
+            for user_id in get_presence().heartbeat():
+                socketio.emit('user_offline', {'user_id': user_id})
+        except Exception as e:
+            print(f"Presence heartbeat failed: {e}")
+
+
+def _ensure_heartbeat():
+    global _heartbeat_started
+    if not _heartbeat_started:
+        _heartbeat_started = True
+        socketio.start_background_task(_heartbeat_loop)
+
+
 # ---------- Socket events ----------
 @socketio.on('connect')
 def handle_connect():
@@ -55,29 +87,30 @@ def handle_connect():
     if not user:
         return False
 
+    _ensure_heartbeat()
+    presence = get_presence()
     sid = request.sid
-    sid_to_user[sid] = user.id
-    user_connections[user.id] = user_connections.get(user.id, 0) + 1
+    socket_identity.bind(sid, user)
+    first_connection = presence.connect(sid, user.id)
 
-    if user_connections[user.id] == 1:
-        join_room(f'user_{user.id}')
+    # every tab joins the user room (it may live on another worker than the first one)
+    join_room(f'user_{user.id}')
+    if first_connection:
         emit('user_online', {'user_id': user.id}, broadcast=True)
 
-    online_ids = [uid for uid in user_connections.keys() if uid != user.id]
+    online_ids = [uid for uid in presence.online_user_ids() if uid != user.id]
     emit('online_users_list', {'user_ids': online_ids}, room=sid)
 
 
 @socketio.on('disconnect')
 def handle_disconnect():
-    sid = request.sid
-    user_id = sid_to_user.pop(sid, None)
-    if not user_id or user_id not in user_connections:
+    socket_identity.unbind(request.sid)
+    user_id, last_connection = get_presence().disconnect(request.sid)
+    if not user_id:
         return
 
-    user_connections[user_id] -= 1
-    if user_connections[user_id] == 0:
-        del user_connections[user_id]
-        leave_room(f'user_{user_id}')
+    leave_room(f'user_{user_id}')
+    if last_connection:
         emit('user_offline', {'user_id': user_id}, broadcast=True)
 
 
@@ -87,7 +120,7 @@ def get_chat_room(user1_id, user2_id):
 
 @socketio.on('join_chat')
 def handle_join_chat(data):
-    user = get_user_from_token()
+    user = current_socket_user()
     if not user:
         return
     other_user_id = data['other_user_id']
@@ -100,14 +133,14 @@ def handle_send_message(data):
     from app import db                     # local import
     from app.models import PrivateMessage, User   # local import
 
-    user = get_user_from_token()
+    user = current_socket_user()
     if not user:
         return
     recipient = User.query.get(data['recipient_id'])
     if not recipient:
         return
 
-    recipient_online = recipient.id in user_connections
+    recipient_online = get_presence().is_online(recipient.id)
 
     msg = PrivateMessage(
         sender_id=user.id,
@@ -139,31 +172,24 @@ def handle_send_message(data):
 
 @socketio.on('mark_read')
 def handle_mark_read(data):
-    from app import db
-    from app.models import PrivateMessage
+    from app.services.read_receipts import mark_messages_read
 
-    user = get_user_from_token()
+    user = current_socket_user()
     if not user:
         return
-    message_ids = data.get('message_ids', [])
-    for msg_id in message_ids:
-        msg = PrivateMessage.query.get(msg_id)
-        if msg and msg.recipient_id == user.id and msg.status != 'read':
-            msg.status = 'read'
-            msg.read = True
-            msg.read_at = datetime.utcnow()
-            db.session.commit()
-            room = get_chat_room(msg.sender_id, msg.recipient_id)
-            socketio.emit('message_status_update', {
-                'message_id': msg.id,
-                'status': 'read'
-            }, room=room)
+    read = mark_messages_read(user.id, data.get('message_ids', []))
+    # one status event per conversation, carrying all of its ids
+    for sender_id, message_ids in read.items():
+        socketio.emit('message_status_update', {
+            'message_ids': message_ids,
+            'status': 'read'
+        }, room=get_chat_room(sender_id, user.id))
 
 
 # ---------- Call events ----------
 @socketio.on('call_offer')
 def handle_call_offer(data):
-    user = get_user_from_token()
+    user = current_socket_user()
     if not user:
         return
     target_user_id = data['target_user_id']
@@ -183,7 +209,7 @@ def handle_call_offer(data):
 
 @socketio.on('call_answer')
 def handle_call_answer(data):
-    user = get_user_from_token()
+    user = current_socket_user()
     if not user:
         return
     target_user_id = data['target_user_id']
@@ -197,7 +223,7 @@ def handle_call_answer(data):
 
 @socketio.on('call_ice')
 def handle_call_ice(data):
-    user = get_user_from_token()
+    user = current_socket_user()
     if not user:
         return
     target_user_id = data['target_user_id']
@@ -211,7 +237,7 @@ def handle_call_ice(data):
 
 @socketio.on('call_end')
 def handle_call_end(data):
-    user = get_user_from_token()
+    user = current_socket_user()
     if not user:
         return
     call_id = data['call_id']
@@ -227,7 +253,7 @@ def handle_call_end(data):
 
 @socketio.on('call_status')
 def handle_call_status(data):
-    user = get_user_from_token()
+    user = current_socket_user()
     if not user:
         return
     target_user_id = data['target_user_id']
@@ -241,7 +267,7 @@ def handle_call_status(data):
 
 @socketio.on('call_add_participant')
 def handle_add_participant(data):
-    user = get_user_from_token()
+    user = current_socket_user()
     if not user:
         return
     new_user_id = data['new_user_id']
@@ -271,7 +297,7 @@ def handle_add_participant(data):
 
 @socketio.on('call_leave')
 def handle_call_leave(data):
-    user = get_user_from_token()
+    user = current_socket_user()
     if not user:
         return
     target = data.get('target_user_id')
@@ -286,7 +312,7 @@ def handle_call_leave(data):
 @socketio.on('join_group')
 def handle_join_group(data):
     from app.models import GroupMember   # local import
-    user = get_user_from_token()
+    user = current_socket_user()
     if not user:
         return
     group_id = data['group_id']
@@ -302,7 +328,7 @@ def handle_send_group_message(data):
     from app import db
     from app.models import GroupMember, PrivateMessage
 
-    user = get_user_from_token()
+    user = current_socket_user()
     if not user:
         return
     group_id = data['group_id']
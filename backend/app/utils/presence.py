@@ -0,0 +1,142 @@
+"""
+Who is connected to Socket.IO, shared between workers when needed.
+
+``LocalPresence`` keeps the counts in process memory (one worker only).
+``RedisPresence`` keeps them in Redis so every worker sees the same online
+list; it takes any redis-py compatible client, e.g. ``fakeredis.FakeRedis()``
+in a shell.  Both expose the same methods:
+
+    connect(sid, user_id)   -> True when this is the user's first connection
+    disconnect(sid)         -> (user_id, True when it was the last) or (None, False)
+    user_for_sid(sid), is_online(user_id), online_user_ids()
+    heartbeat()             -> user ids taken offline because their worker died
+
+``init_presence(app)`` picks the backend from ``PRESENCE_BACKEND``.
+"""
+import os
+import socket
+import threading
+
+
+class LocalPresence:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sid_to_user = {}       # socket_id -> user_id
+        self._connections = {}       # user_id -> connection count
+
+    def connect(self, sid, user_id):
+        with self._lock:
+            self._sid_to_user[sid] = user_id
+            self._connections[user_id] = self._connections.get(user_id, 0) + 1
+            return self._connections[user_id] == 1
+
+    def disconnect(self, sid):
+        with self._lock:
+            user_id = self._sid_to_user.pop(sid, None)
+            if user_id is None or user_id not in self._connections:
+                return None, False
+            self._connections[user_id] -= 1
+            if self._connections[user_id] <= 0:
+                del self._connections[user_id]
+                return user_id, True
+            return user_id, False
+
+    def user_for_sid(self, sid):
+        return self._sid_to_user.get(sid)
+
+    def is_online(self, user_id):
+        return user_id in self._connections
+
+    def online_user_ids(self):
+        return list(self._connections)
+
+    def heartbeat(self):
+        return []
+
+
+class RedisPresence:
+    """
+    Keys (all under ``prefix``):
+      sids              hash  sid -> user_id
+      counts            hash  user_id -> live connection count
+      workers           set   worker ids that own connections
+      worker:<id>       set   sids held by that worker
+      alive:<id>        str   heartbeat, expires after ``heartbeat_ttl``
+    A worker that stops heart-beating has its sids released by the others.
+    """
+
+    def __init__(self, client, worker_id=None, prefix='presence', heartbeat_ttl=60):
+        self.r = client
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.prefix = prefix
+        self.heartbeat_ttl = heartbeat_ttl
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        import redis   # optional dependency, only needed for this backend
+        return cls(redis.Redis.from_url(url, decode_responses=True), **kwargs)
+
+    def _key(self, *parts):
+        return ':'.join((self.prefix,) + parts)
+
+    def connect(self, sid, user_id):
+        pipe = self.r.pipeline()
+        pipe.hset(self._key('sids'), sid, user_id)
+        pipe.sadd(self._key('worker', self.worker_id), sid)
+        pipe.sadd(self._key('workers'), self.worker_id)
+        pipe.set(self._key('alive', self.worker_id), 1, ex=self.heartbeat_ttl)
+        pipe.hincrby(self._key('counts'), user_id, 1)
+        return pipe.execute()[-1] == 1
+
+    def _release(self, sid, worker_id):
+        user_id = self.r.hget(self._key('sids'), sid)
+        # HDEL is the atomic claim: only one caller gets to decrement for a sid
+        if user_id is None or not self.r.hdel(self._key('sids'), sid):
+            return None, False
+        pipe = self.r.pipeline()
+        pipe.srem(self._key('worker', worker_id), sid)
+        pipe.hincrby(self._key('counts'), user_id, -1)
+        remaining = pipe.execute()[-1]
+        return int(user_id), remaining <= 0
+
+    def disconnect(self, sid):
+        return self._release(sid, self.worker_id)
+
+    def user_for_sid(self, sid):
+        user_id = self.r.hget(self._key('sids'), sid)
+        return int(user_id) if user_id is not None else None
+
+    def is_online(self, user_id):
+        return int(self.r.hget(self._key('counts'), user_id) or 0) > 0
+
+    def online_user_ids(self):
+        return [int(uid) for uid, count in self.r.hgetall(self._key('counts')).items() if int(count) > 0]
+
+    def heartbeat(self):
+        self.r.set(self._key('alive', self.worker_id), 1, ex=self.heartbeat_ttl)
+        gone_offline = []
+        for worker_id in self.r.smembers(self._key('workers')):
+            if worker_id == self.worker_id or self.r.exists(self._key('alive', worker_id)):
+                continue
+            for sid in self.r.smembers(self._key('worker', worker_id)):
+                user_id, last = self._release(sid, worker_id)
+                if last:
+                    gone_offline.append(user_id)
+            self.r.delete(self._key('worker', worker_id))
+            self.r.srem(self._key('workers'), worker_id)
+        return gone_offline
+
+
+presence = LocalPresence()
+
+
+def init_presence(app):
+    """Swap in the backend configured by PRESENCE_BACKEND ('local' or 'redis')."""
+    global presence
+    if app.config.get('PRESENCE_BACKEND') == 'redis':
+        presence = RedisPresence.from_url(app.config['PRESENCE_REDIS_URL'])
+    return presence
+
+
+def get_presence():
+    return presence
@@ -0,0 +1,53 @@
+"""
+Request-scoped SQL statement counter.
+
+Every statement executed while a request is being handled bumps
+``g.query_count``; the total is returned in an ``X-Query-Count`` header.
+``query_budget(n)`` wraps a view and complains when the view body issues
+more than ``n`` statements – an AssertionError under DEBUG/TESTING, a
+logged warning in production – so an N+1 regression shows up as soon as the
+portfolio grows.
+"""
+from functools import wraps
+from flask import g, current_app, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+
+
+def query_count():
+    """Statements executed so far in the current request."""
+    return g.get('query_count', 0)
+
+
+def init_query_counter(app):
+    if not event.contains(Engine, 'before_cursor_execute', _count_statement):
+        event.listen(Engine, 'before_cursor_execute', _count_statement)
+
+    @app.after_request
+    def add_query_count_header(response):
+        if 'query_count' in g:
+            response.headers['X-Query-Count'] = str(g.query_count)
+        return response
+
+
+def query_budget(limit):
+    """Allow the wrapped view at most ``limit`` statements, whatever the data size."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = query_count()
+            rv = fn(*args, **kwargs)
+            used = query_count() - start
+            if used > limit:
+                message = f"{fn.__name__} issued {used} SQL statements (budget {limit})"
+                if current_app.debug or current_app.testing:
+                    raise AssertionError(message)
+                current_app.logger.warning(message)
+            return rv
+        return wrapper
+    return decorator
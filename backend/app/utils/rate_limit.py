@@ -0,0 +1,49 @@
+"""
+Token bucket shared by the threads (or green threads) of one process.
+
+``burst`` calls may go at once, then ``rate`` per second.  ``acquire``
+takes a token, waiting at most ``max_wait`` seconds for one; instead of
+sleeping a request for longer it returns how long the caller should wait.
+"""
+import threading
+import time
+
+
+class TokenBucket:
+    def __init__(self, burst, rate):
+        self.burst = burst
+        self.rate = rate
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self):
+        """Seconds until a token is available (0 if one is now)."""
+        with self._lock:
+            self._refill()
+            return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        with self._lock:
+            self._refill()
+            self.tokens -= 1
+
+    def acquire(self, max_wait=0):
+        """Take a token, waiting up to ``max_wait`` seconds; returns 0 on success,
+        otherwise the seconds until a token will be free."""
+        deadline = time.monotonic() + max_wait
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return 0
+                wait = (1 - self.tokens) / self.rate
+            if time.monotonic() + wait > deadline:
+                return wait
+            time.sleep(wait)
@@ -0,0 +1,164 @@
+"""
+Role checks for protected routes without a database round trip.
+
+Access tokens carry ``role``, ``role_id`` and ``tv`` (the user's
+``token_version``) claims, set at login by ``create_token``.  Each request
+compares ``tv`` with the user's current version from an in-process cache
+(``CACHE_TTL`` seconds), so a token issued before a role change stops being
+accepted: changing ``role`` or reassigning ``role_id`` bumps the version in
+``before_flush``.  The menu items (permissions) of a role are cached the
+same way.  Commits that touch users, roles or role menu items drop the
+affected entries in this process; other workers pick the change up within
+``CACHE_TTL``.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+from flask_jwt_extended import create_access_token, get_jwt
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+CACHE_TTL = 60
+
+
+@dataclass(frozen=True, slots=True)
+class UserAuth:
+    id: int
+    role: Optional[str]
+    role_id: Optional[int]
+    token_version: int
+
+
+class StaleToken(Exception):
+    """The token was issued before the user's role changed."""
+
+
+_lock = threading.Lock()
+_users = {}     # user id -> (expires, UserAuth or None)
+_menus = {}     # role id -> (expires, tuple of menu item dicts)
+
+
+def _cached(cache, key, load):
+    now = time.monotonic()
+    hit = cache.get(key)
+    if hit is not None and hit[0] > now:
+        return hit[1]
+    value = load(key)
+    with _lock:
+        cache[key] = (now + CACHE_TTL, value)
+    return value
+
+
+def _load_user(user_id):
+    from app import db
+    from app.models import User
+    row = db.session.query(User.role, User.role_id, User.token_version).filter(User.id == user_id).first()
+    if row is None:
+        return None
+    return UserAuth(user_id, row.role, row.role_id, row.token_version or 0)
+
+
+def _load_menu(role_id):
+    from app import db
+    from app.models import MenuItem, RoleMenuItem
+    items = db.session.query(MenuItem).join(RoleMenuItem).filter(
+        RoleMenuItem.role_id == role_id
+    ).order_by(MenuItem.order).all()
+    return tuple(item.to_dict() for item in items)
+
+
+def user_auth(user_id):
+    """Cached ``UserAuth`` of a user, or None if the user does not exist."""
+    return _cached(_users, user_id, _load_user)
+
+
+def menu_for(role_id):
+    """Menu items (as dicts, in order) granted to a role."""
+    return _cached(_menus, role_id, _load_menu) if role_id else ()
+
+
+def permissions_for(role_id):
+    return frozenset(item['key'] for item in menu_for(role_id))
+
+
+def create_token(user):
+    return create_access_token(identity=str(user.id), additional_claims={
+        'role': user.role,
+        'role_id': user.role_id,
+        'tv': user.token_version or 0,
+    })
+
+
+def current_user_auth():
+    """``UserAuth`` for the verified JWT of this request; None if the user is gone.
+    Raises ``StaleToken`` if the token predates a role change."""
+    claims = get_jwt()
+    auth = user_auth(int(claims['sub']))
+    if auth is None:
+        return None
+    if 'tv' in claims:
+        if claims['tv'] != auth.token_version:
+            raise StaleToken()
+        return UserAuth(auth.id, claims.get('role'), claims.get('role_id'), auth.token_version)
+    return auth    # token from before role claims: the cached row decides
+
+
+def invalidate_user(user_id):
+    with _lock:
+        _users.pop(user_id, None)
+
+
+def invalidate_role(role_id):
+    with _lock:
+        _menus.pop(role_id, None)
+
+
+def mark_role_changed(session, role_id):
+    """For bulk RoleMenuItem changes that skip the ORM events; cleared after commit."""
+    session.info.setdefault('rbac_changed', set()).add(('role', role_id))
+
+
+# ---------------------------------------------------------------------------
+# Token versions and invalidation
+# ---------------------------------------------------------------------------
+
+def _collect(session, flush_context, instances):
+    from app.models import Role, RoleMenuItem, User
+    changed = session.info.setdefault('rbac_changed', set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, User) and obj.id is not None:
+            state = inspect(obj)
+            role = state.attrs.role.history
+            role_id = state.attrs.role_id.history
+            # Filling in a missing role_id for the same role is not a change of rights
+            reassigned = role_id.has_changes() and any(v is not None for v in role_id.deleted)
+            if role.has_changes() or reassigned:
+                obj.token_version = (obj.token_version or 0) + 1
+            if state.deleted or role.has_changes() or role_id.has_changes():
+                changed.add(('user', obj.id))
+        elif isinstance(obj, Role) and obj.id is not None:
+            changed.add(('role', obj.id))
+        elif isinstance(obj, RoleMenuItem):
+            role_id = obj.role_id if obj.role_id is not None else (obj.role.id if obj.role else None)
+            if role_id is not None:
+                changed.add(('role', role_id))
+
+
+def _after_commit(session):
+    for kind, key in session.info.pop('rbac_changed', ()):
+        if kind == 'user':
+            invalidate_user(key)
+        else:
+            invalidate_role(key)
+
+
+def _after_rollback(session, previous_transaction):
+    session.info.pop('rbac_changed', None)
+
+
+def register_rbac_listeners():
+    if not event.contains(Session, 'before_flush', _collect):
+        event.listen(Session, 'before_flush', _collect)
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_soft_rollback', _after_rollback)
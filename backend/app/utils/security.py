@@ -1,127 +1,62 @@
 # app/utils/security.py
 from functools import wraps
-from flask import request, jsonify
+from flask import request, jsonify, current_app, has_request_context
 from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity, jwt_required
-from app.models import User
 from app import db
-import traceback
+from app.utils.decorators import STALE_TOKEN_ERROR, role_required  # noqa: F401  (re-exported)
+from app.utils.rbac import StaleToken, current_user_auth
 
-def admin_required(fn):
-    @wraps(fn)
-    def wrapper(*args, **kwargs):
-        try:
-            # Verify JWT is present in request
-            print("Step 1: Verifying JWT in request...")
-            verify_jwt_in_request()
-            print("✓ JWT verified")
-            
-            # Get user identity from JWT and convert to int
-            print("Step 2: Getting user identity...")
-            user_id_str = get_jwt_identity()
-            print(f"✓ User ID from JWT: {user_id_str}")
-            
-            # Convert to int
-            print("Step 3: Converting to int...")
-            user_id = int(user_id_str)
-            print(f"✓ User ID as int: {user_id}")
-            
-            # Get user from database
-            print("Step 4: Fetching user from database...")
-            user = db.session.get(User, user_id)
-            print(f"✓ User found: {user.username if user else 'None'}")
-            
-            if not user:
-                print("✗ User not found in database")
+def _require_role(role, denied_message):
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            try:
+                verify_jwt_in_request()
+                auth = current_user_auth()
+            except StaleToken:
+                return jsonify({'error': STALE_TOKEN_ERROR}), 401
+            except ValueError as e:
+                return jsonify({'error': f'Invalid user ID format: {str(e)}'}), 401
+            except Exception as e:
+                current_app.logger.warning(f"Authentication failed: {e}")
+                return jsonify({'error': f'Authentication failed: {str(e)}'}), 401
+
+            if not auth:
                 return jsonify({'error': 'User not found'}), 404
-            
-            # Check role
-            print(f"Step 5: Checking role... User role: {user.role}")
-            if user.role != 'admin':
-                print(f"✗ User role '{user.role}' is not 'admin'")
-                return jsonify({'error': 'Admin access required'}), 403
-            
-            print("✓ All checks passed, calling function")
-            # If everything is fine, call the original function
+            if auth.role != role:
+                return jsonify({'error': denied_message}), 403
             return fn(*args, **kwargs)
-            
-        except ValueError as e:
-            print(f"✗ ValueError: {str(e)}")
-            traceback.print_exc()
-            return jsonify({'error': f'Invalid user ID format: {str(e)}'}), 401
-            
-        except Exception as e:
-            print(f"✗ Exception in admin_required: {str(e)}")
-            print(f"Exception type: {type(e).__name__}")
-            traceback.print_exc()
-            return jsonify({'error': f'Authentication failed: {str(e)}'}), 401
-            
-    return wrapper
+        return wrapper
+    return decorator
+
+
+admin_required = _require_role('admin', 'Admin access required')
+investor_required = _require_role('investor', 'Investor access required')
+
+def log_audit(action, entity_type=None, entity_id=None, details=None, atomic=False):
+    """Record an audit entry for the current user.
+
+    Does not commit.  By default the entry is queued and written in the
+    background (app.services.audit); with ``atomic=True`` it is added to the
+    current session and saved by the caller's commit, together with the change
+    it describes.
+    """
+    from app.services import audit
 
-def log_audit(action, entity_type=None, entity_id=None, details=None):
-    """Helper function to log audit trail"""
-    from app.models import AuditLog
-    
     try:
-        user_id_str = get_jwt_identity()
-        user_id = int(user_id_str) if user_id_str else None
-        
-        log = AuditLog(
-            user_id=user_id,
-            action=action,
+        try:
+            user_id_str = get_jwt_identity()
+        except RuntimeError:     # no JWT (CLI, scheduler)
+            user_id_str = None
+        row = audit.entry(
+            action,
             entity_type=entity_type,
             entity_id=entity_id,
             details=details,
-            ip_address=request.remote_addr
+            user_id=int(user_id_str) if user_id_str else None,
+            ip_address=request.remote_addr if has_request_context() else None
         )
-        db.session.add(log)
-        db.session.commit()
+        audit.record(row, atomic=atomic)
     except Exception as e:
         print(f"Audit log error: {str(e)}")
         # Don't raise the error, just log it
-
-def investor_required(fn):
-    @wraps(fn)
-    def wrapper(*args, **kwargs):
-        try:
-            print("Step 1: Verifying JWT for investor...")
-            verify_jwt_in_request()
-            
-            print("Step 2: Getting user identity for investor...")
-            user_id_str = get_jwt_identity()
-            print(f"✓ Investor user ID from JWT: {user_id_str}")
-            
-            user_id = int(user_id_str)
-            user = db.session.get(User, int(user_id))
-            
-            if not user:
-                print("✗ Investor user not found")
-                return jsonify({'error': 'User not found'}), 404
-                
-            print(f"✓ Investor user found: {user.username}, role: {user.role}")
-            
-            if user.role != 'investor':
-                print(f"✗ User role '{user.role}' is not 'investor'")
-                return jsonify({'error': 'Investor access required'}), 403
-                
-            return fn(*args, **kwargs)
-            
-        except Exception as e:
-            print(f"✗ Exception in investor_required: {str(e)}")
-            traceback.print_exc()
-            return jsonify({'error': f'Invalid authentication: {str(e)}'}), 401
-            
-    return wrapper
-
-# ===== role_required decorator =====
-def role_required(roles):
-    def decorator(fn):
-        @wraps(fn)
-        def wrapper(*args, **kwargs):
-            verify_jwt_in_request()
-            user_id = int(get_jwt_identity())
-            user = User.query.get(user_id)
-            if not user or user.role not in roles:
-                return jsonify({'error': 'Permission denied'}), 403
-            return fn(*args, **kwargs)
-        return wrapper
-    return decorator
\ No newline at end of file
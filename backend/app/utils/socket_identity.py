@@ -0,0 +1,113 @@
+"""
+Per-connection identity cache for the Socket.IO handlers.
+
+The JWT is decoded once, at connect time, and the sid is bound to the user
+id.  Handlers read a small immutable ``SocketUser`` (id, username, avatar)
+from memory, so signalling events such as ``call_ice`` do no token decoding
+and no database work.  Profiles are shared by all sids of a user and are
+dropped when a commit changes that user's username or profile picture (or
+deletes the user); the next event reloads them with one query.
+
+A sid always talks to the worker that accepted it, so the cache is
+per-process even when several workers share a message queue.
+"""
+import threading
+from dataclasses import dataclass
+from typing import Optional
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+PROFILE_FIELDS = ('username', 'profile_picture')
+
+
+@dataclass(frozen=True, slots=True)
+class SocketUser:
+    id: int
+    username: str
+    profile_picture: Optional[str]
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(id=user.id, username=user.username, profile_picture=user.profile_picture)
+
+
+_lock = threading.Lock()
+_sid_to_user = {}    # sid -> user id
+_user_sids = {}      # user id -> set of bound sids
+_profiles = {}       # user id -> SocketUser
+
+
+def bind(sid, user):
+    profile = SocketUser.from_user(user)
+    with _lock:
+        _sid_to_user[sid] = profile.id
+        _user_sids.setdefault(profile.id, set()).add(sid)
+        _profiles[profile.id] = profile
+    return profile
+
+
+def unbind(sid):
+    with _lock:
+        user_id = _sid_to_user.pop(sid, None)
+        sids = _user_sids.get(user_id)
+        if sids is not None:
+            sids.discard(sid)
+            if not sids:
+                del _user_sids[user_id]
+                _profiles.pop(user_id, None)
+    return user_id
+
+
+def lookup(sid):
+    """SocketUser bound to ``sid`` (reloaded if it was invalidated), or None."""
+    user_id = _sid_to_user.get(sid)
+    if user_id is None:
+        return None
+    profile = _profiles.get(user_id)
+    if profile is None:
+        from app import db
+        from app.models import User
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        profile = SocketUser.from_user(user)
+        with _lock:
+            if user_id in _user_sids:
+                _profiles[user_id] = profile
+    return profile
+
+
+def invalidate(user_id):
+    with _lock:
+        _profiles.pop(user_id, None)
+
+
+# ---------------------------------------------------------------------------
+# Invalidation on profile changes
+# ---------------------------------------------------------------------------
+
+def _collect(session, flush_context, instances):
+    from app.models import User
+    changed = session.info.setdefault('socket_profiles_changed', set())
+    for obj in (*session.dirty, *session.deleted):
+        if not isinstance(obj, User) or obj.id not in _profiles:
+            continue
+        state = inspect(obj)
+        if state.deleted or any(state.attrs[f].history.has_changes() for f in PROFILE_FIELDS):
+            changed.add(obj.id)
+
+
+def _after_commit(session):
+    for user_id in session.info.pop('socket_profiles_changed', ()):
+        invalidate(user_id)
+
+
+def _after_rollback(session, previous_transaction):
+    session.info.pop('socket_profiles_changed', None)
+
+
+def register_identity_listeners():
+    if not event.contains(Session, 'before_flush', _collect):
+        event.listen(Session, 'before_flush', _collect)
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_soft_rollback', _after_rollback)
@@ -1,12 +1,10 @@
 #!/usr/bin/env python
 import os
 import click
-import logging
 from flask_migrate import upgrade, stamp
 from app import create_app
 from app.utils.extensions import db
 from app.models import User, Investor, Loan, Client, PasswordResetToken, Livestock
-from app.utils.cloudinary_upload import upload_base64_image
 from app.utils.extensions import socketio
 from datetime import datetime, timedelta
 
@@ -20,6 +18,18 @@ def deploy():
     
     # Create or update initial data
     seed_admin()
+
+    # Fill the reporting rollup the first time it exists
+    from app.models import DailyFinancialRollup
+    from app.services.financial_rollup import rebuild_rollup
+    if DailyFinancialRollup.query.first() is None:
+        rebuild_rollup()
+
+    # Seed the unread badge counters the first time they exist
+    from app.models import UnreadCounter
+    from app.services.unread_counters import rebuild_unread_counters
+    if UnreadCounter.query.first() is None:
+        rebuild_unread_counters()
     
     print("✅ Deployment completed successfully.")
 
@@ -82,54 +92,107 @@ def health():
         return jsonify({"status": "unhealthy", "error": str(e)}), 500
 
 @app.cli.command('migrate-images')
-def migrate_images():
-    """Migrate existing livestock images from database to Cloudinary."""
-    with app.app_context():
-        logging.basicConfig(level=logging.INFO)
-        logger = logging.getLogger(__name__)
-
-        livestock_list = Livestock.query.all()
-        total = len(livestock_list)
-        logger.info(f"Found {total} livestock records.")
-
-        for idx, livestock in enumerate(livestock_list, 1):
-            if not livestock.photos:
-                logger.info(f"[{idx}/{total}] Livestock ID {livestock.id} has no photos, skipping.")
-                continue
-
-            original_photos = livestock.photos
-            if not isinstance(original_photos, list):
-                logger.warning(f"Livestock ID {livestock.id} photos is not a list, skipping.")
-                continue
-
-            new_photo_urls = []
-            for img in original_photos:
-                # If it's already a URL (shouldn't happen), keep it
-                if isinstance(img, str) and img.startswith('http'):
-                    new_photo_urls.append(img)
-                    continue
-
-                try:
-                    url = upload_base64_image(img, folder='livestock')
-                    new_photo_urls.append(url)
-                    logger.info(f"Uploaded image for livestock ID {livestock.id}")
-                except Exception as e:
-                    logger.error(f"Failed to upload image for livestock ID {livestock.id}: {str(e)}")
-                    continue
-
-            if new_photo_urls:
-                livestock.photos = new_photo_urls
-                db.session.commit()
-                logger.info(f"Updated livestock ID {livestock.id} with {len(new_photo_urls)} Cloudinary URLs.")
-            else:
-                logger.warning(f"Livestock ID {livestock.id} had no successfully uploaded images, leaving unchanged.")
-
-        logger.info("Migration completed.")
+@click.option('--checkpoint', default=None, help='Progress file; default instance/migrate-images.json')
+@click.option('--batch-size', default=20, help='Livestock rows per transaction')
+@click.option('--workers', default=4, help='Parallel uploads')
+@click.option('--restart', is_flag=True, help='Ignore the checkpoint and start from the first row')
+def migrate_images(checkpoint, batch_size, workers, restart):
+    """Migrate existing livestock images from database to Cloudinary (resumable)."""
+    from app.services.livestock_photos import migrate_livestock_photos
+    checkpoint = checkpoint or os.path.join(app.instance_path, 'migrate-images.json')
+    os.makedirs(os.path.dirname(os.path.abspath(checkpoint)), exist_ok=True)
+    if restart and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    stats = migrate_livestock_photos(checkpoint, batch_size=batch_size, max_workers=workers)
+    print(f"Migration completed: {stats['rows']} livestock rows, {stats['uploaded']} images uploaded, "
+          f"{stats['failed']} failed (retried on the next run)")
 
 @app.cli.command("create-snapshots")
-def create_snapshots_command():
-    create_daily_snapshots()
-    print("Snapshots created for", datetime.utcnow().date() - timedelta(days=1))
+@click.option('--start', default=None, help='First day to snapshot (YYYY-MM-DD); default is yesterday')
+@click.option('--end', default=None, help='Last day to snapshot (YYYY-MM-DD); default is --start')
+@click.option('--chunk-size', default=500, show_default=True, help='Loans per INSERT')
+def create_snapshots_command(start, end, chunk_size):
+    """Write the daily loan balance snapshots; safe to re-run or resume over a range."""
+    from app.services.snapshots import create_snapshots
+    start = datetime.strptime(start, '%Y-%m-%d').date() if start else datetime.utcnow().date() - timedelta(days=1)
+    end = datetime.strptime(end, '%Y-%m-%d').date() if end else start
+    result = create_snapshots(start, end, chunk_size=chunk_size)
+    seconds = max(result['seconds'], 1e-9)
+    print(f"Snapshots for {start} to {end}: {result['inserted']} written for {result['loans']} loans "
+          f"over {result['days']} days in {seconds:.2f}s ({result['loans'] / seconds:,.0f} loans/s)")
+
+@app.cli.command("rebuild-financial-rollup")
+@click.option('--start', default=None, help='First day to rebuild (YYYY-MM-DD); default is all history')
+@click.option('--end', default=None, help='Last day to rebuild (YYYY-MM-DD); default is today')
+def rebuild_financial_rollup_command(start, end):
+    """Recompute daily_financial_rollup from the source tables."""
+    from app.services.financial_rollup import rebuild_rollup
+    start_date = datetime.strptime(start, '%Y-%m-%d').date() if start else None
+    end_date = datetime.strptime(end, '%Y-%m-%d').date() if end else datetime.utcnow().date()
+    rows = rebuild_rollup(start_date, end_date if start_date else None)
+    print(f"Financial rollup rebuilt: {rows} day/category rows")
+
+
+@app.cli.command("rebuild-unread-counters")
+def rebuild_unread_counters_command():
+    """Recompute unread_counters from messages, comments and read markers."""
+    from app.services.unread_counters import rebuild_unread_counters
+    rows = rebuild_unread_counters()
+    print(f"Unread counters rebuilt: {rows} rows")
+
+
+@app.cli.command("migrate-attachment-blobs")
+@click.option('--batch-size', default=100, help='Attachments moved per transaction')
+def migrate_attachment_blobs_command(batch_size):
+    """Move message_attachments.file_data into the blob store."""
+    from app.services.attachments import migrate_blobs
+    moved = migrate_blobs(batch_size)
+    print(f"Attachments moved to the blob store: {moved}")
+
+@app.cli.command("gc-attachment-blobs")
+@click.option('--grace-hours', default=24, help='Keep unreferenced blobs stored more recently than this')
+def gc_attachment_blobs_command(grace_hours):
+    """Delete blobs no attachment points at any more."""
+    from app.services.attachments import gc_blobs
+    deleted = gc_blobs(grace_hours * 3600)
+    print(f"Unreferenced blobs deleted: {deleted}")
+
+@app.cli.command("backfill-avatars")
+def backfill_avatars_command():
+    """Upload inline base64 profile pictures as thumbnails and store their URL."""
+    from app.services.avatars import backfill_avatars
+    converted, failed = backfill_avatars()
+    print(f"Avatars converted: {converted}, failed: {failed}")
+
+@app.cli.command("run-jobs")
+@click.option('--once', is_flag=True, help='Run the jobs due now and exit')
+def run_jobs_command(once):
+    """Run the outbound job worker (SMS, email, M-Pesa)."""
+    from app.services.job_queue import Worker
+    worker = Worker(app)
+    if once:
+        print(f"Jobs run: {worker.run_pending()}")
+        return
+    print("Outbound job worker started")
+    worker.run_forever()
+
+@app.cli.command("requeue-dead-jobs")
+@click.option('--id', 'ids', multiple=True, type=int, help='Dead letter id (repeatable); default all')
+def requeue_dead_jobs_command(ids):
+    """Put dead-lettered outbound jobs back on the queue."""
+    from app.services.job_queue import requeue_dead_letters
+    print(f"Jobs requeued: {requeue_dead_letters(list(ids))}")
+
+@app.cli.command("daraja-mock")
+@click.option('--port', default=5055, help='Port to listen on')
+def daraja_mock_command(port):
+    """Serve a local mock of the Daraja endpoints (set DARAJA_BASE_URL to use it)."""
+    import time
+    from app.utils.daraja_mock import serve
+    serve(port)
+    print(f"Daraja mock on http://127.0.0.1:{port}")
+    while True:
+        time.sleep(3600)
 
 if __name__ == '__main__':
     app.run()
\ No newline at end of file
@@ -0,0 +1,39 @@
+"""message_attachments blob store columns
+
+Revision ID: a6e3d1f58b20
+Revises: f2b7c4e09d15
+Create Date: 2026-10-17 17:12:36.440127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6e3d1f58b20'
+down_revision = 'f2b7c4e09d15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('message_attachments', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('sha256', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('size', sa.Integer(), nullable=True))
+        batch_op.alter_column('file_data',
+               existing_type=sa.LargeBinary(),
+               nullable=True)
+        batch_op.create_index(batch_op.f('ix_message_attachments_sha256'), ['sha256'], unique=False)
+    # Existing bytes are moved out by `python manage.py migrate-attachment-blobs`
+
+
+def downgrade():
+    # Rows already moved to the blob store have no file_data; run this only
+    # after copying them back, or the NOT NULL change fails
+    with op.batch_alter_table('message_attachments', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_message_attachments_sha256'))
+        batch_op.alter_column('file_data',
+               existing_type=sa.LargeBinary(),
+               nullable=False)
+        batch_op.drop_column('size')
+        batch_op.drop_column('sha256')
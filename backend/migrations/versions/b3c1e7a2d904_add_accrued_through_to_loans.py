@@ -0,0 +1,26 @@
+"""add accrued_through to loans
+
+Revision ID: b3c1e7a2d904
+Revises: ee9cf6d9475d
+Create Date: 2026-10-17 09:12:31.402118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3c1e7a2d904'
+down_revision = 'ee9cf6d9475d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('loans', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('accrued_through', sa.Date(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('loans', schema=None) as batch_op:
+        batch_op.drop_column('accrued_through')
@@ -0,0 +1,31 @@
+"""users and groups avatar_hash
+
+Revision ID: b93d2e71c4a8
+Revises: a6e3d1f58b20
+Create Date: 2026-10-17 18:04:51.208317
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b93d2e71c4a8'
+down_revision = 'a6e3d1f58b20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('avatar_hash', sa.String(length=64), nullable=True))
+    with op.batch_alter_table('groups', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('avatar_hash', sa.String(length=64), nullable=True))
+    # Inline base64 pictures are moved to thumbnails by `python manage.py backfill-avatars`
+
+
+def downgrade():
+    with op.batch_alter_table('groups', schema=None) as batch_op:
+        batch_op.drop_column('avatar_hash')
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('avatar_hash')
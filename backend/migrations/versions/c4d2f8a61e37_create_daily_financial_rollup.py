@@ -0,0 +1,33 @@
+"""create daily_financial_rollup
+
+Revision ID: c4d2f8a61e37
+Revises: b3c1e7a2d904
+Create Date: 2026-10-17 11:40:08.517230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d2f8a61e37'
+down_revision = 'b3c1e7a2d904'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('daily_financial_rollup',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('rollup_date', sa.Date(), nullable=False),
+    sa.Column('category', sa.String(length=30), nullable=False),
+    sa.Column('amount', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('rollup_date', 'category', name='uq_rollup_date_category')
+    )
+    # Populated by `python manage.py rebuild-financial-rollup` after upgrade
+
+
+def downgrade():
+    op.drop_table('daily_financial_rollup')
@@ -0,0 +1,57 @@
+"""outbound_jobs and dead_letter_jobs
+
+Revision ID: c4f81a2d6e39
+Revises: b93d2e71c4a8
+Create Date: 2026-10-17 19:22:10.514603
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4f81a2d6e39'
+down_revision = 'b93d2e71c4a8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('outbound_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('provider', sa.String(length=20), nullable=False),
+    sa.Column('action', sa.String(length=50), nullable=False),
+    sa.Column('payload', sa.JSON(), nullable=False),
+    sa.Column('status', sa.String(length=10), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('max_attempts', sa.Integer(), nullable=False),
+    sa.Column('run_after', sa.DateTime(), nullable=False),
+    sa.Column('locked_at', sa.DateTime(), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('result', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('outbound_jobs', schema=None) as batch_op:
+        batch_op.create_index('ix_outbound_jobs_due', ['status', 'run_after'], unique=False)
+
+    op.create_table('dead_letter_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('job_id', sa.Integer(), nullable=False),
+    sa.Column('provider', sa.String(length=20), nullable=False),
+    sa.Column('action', sa.String(length=50), nullable=False),
+    sa.Column('payload', sa.JSON(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('failed_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('dead_letter_jobs')
+    with op.batch_alter_table('outbound_jobs', schema=None) as batch_op:
+        batch_op.drop_index('ix_outbound_jobs_due')
+    op.drop_table('outbound_jobs')
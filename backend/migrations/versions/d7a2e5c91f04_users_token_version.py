@@ -0,0 +1,26 @@
+"""users.token_version
+
+Revision ID: d7a2e5c91f04
+Revises: c4f81a2d6e39
+Create Date: 2026-10-17 20:05:33.871240
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7a2e5c91f04'
+down_revision = 'c4f81a2d6e39'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('token_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('token_version')
@@ -0,0 +1,69 @@
+"""add hot query indexes
+
+Revision ID: d81e5b07c9a4
+Revises: c4d2f8a61e37
+Create Date: 2026-10-17 13:05:47.220914
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd81e5b07c9a4'
+down_revision = 'c4d2f8a61e37'
+branch_labels = None
+depends_on = None
+
+ACTIVE = sa.text("status = 'active'")
+
+# (name, table, columns, extra kwargs) – mirrors the __table_args__ in app/models.py
+INDEXES = [
+    ('ix_livestock_client_id', 'livestock', ['client_id'], {}),
+    ('ix_livestock_status', 'livestock', ['status'], {}),
+
+    ('ix_loans_status', 'loans', ['status'], {}),
+    ('ix_loans_client_id_status', 'loans', ['client_id', 'status'], {}),
+    ('ix_loans_livestock_id', 'loans', ['livestock_id'], {}),
+    ('ix_loans_parent_loan_id', 'loans', ['parent_loan_id'], {}),
+    ('ix_loans_disbursement_date', 'loans', ['disbursement_date'], {}),
+    ('ix_loans_active_due_date', 'loans', ['due_date'],
+     {'postgresql_where': ACTIVE, 'sqlite_where': ACTIVE}),
+    ('ix_loans_active_accrued_through', 'loans', ['accrued_through'],
+     {'postgresql_where': ACTIVE, 'sqlite_where': ACTIVE}),
+
+    ('ix_transactions_loan_id', 'transactions', ['loan_id'], {}),
+    ('ix_transactions_created_at', 'transactions', ['created_at'], {}),
+    ('ix_transactions_type_created_at', 'transactions', ['transaction_type', 'created_at'], {}),
+
+    ('ix_payments_loan_id', 'payments', ['loan_id'], {}),
+
+    ('ix_comments_loan_id_created_at', 'comments', ['loan_id', 'created_at'], {}),
+
+    ('ix_private_messages_recipient_id_read', 'private_messages', ['recipient_id', 'read'], {}),
+    ('ix_private_messages_sender_recipient_created', 'private_messages',
+     ['sender_id', 'recipient_id', 'created_at'], {}),
+    ('ix_private_messages_group_id_created_at', 'private_messages', ['group_id', 'created_at'], {}),
+
+    ('ix_client_assignments_officer_id_is_active', 'client_assignments', ['officer_id', 'is_active'], {}),
+    ('ix_client_assignments_loan_id_is_active', 'client_assignments', ['loan_id', 'is_active'], {}),
+
+    ('ix_report_comments_loan_id_report_date', 'report_comments', ['loan_id', 'report_date'], {}),
+
+    ('ix_flagged_loans_unresolved_loan_id', 'flagged_loans', ['loan_id'],
+     {'postgresql_where': sa.text('resolved = false'), 'sqlite_where': sa.text('resolved = 0')}),
+
+    ('ix_salary_transactions_type_created_at', 'salary_transactions', ['transaction_type', 'created_at'], {}),
+    ('ix_petty_cash_expenses_date', 'petty_cash_expenses', ['date'], {}),
+    ('ix_investor_returns_status_return_date', 'investor_returns', ['status', 'return_date'], {}),
+]
+
+
+def upgrade():
+    for name, table, columns, kwargs in INDEXES:
+        op.create_index(name, table, columns, unique=False, **kwargs)
+
+
+def downgrade():
+    for name, table, _columns, _kwargs in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
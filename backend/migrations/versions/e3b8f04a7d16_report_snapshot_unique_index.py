@@ -0,0 +1,39 @@
+"""unique system snapshot per loan and day in report_comments
+
+Revision ID: e3b8f04a7d16
+Revises: d7a2e5c91f04
+Create Date: 2026-10-17 21:40:12.504118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3b8f04a7d16'
+down_revision = 'd7a2e5c91f04'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # System snapshots are written without an officer
+    with op.batch_alter_table('report_comments', schema=None) as batch_op:
+        batch_op.alter_column('officer_id', existing_type=sa.Integer(), nullable=True)
+
+    # Keep the oldest system snapshot of each loan and day
+    op.execute(
+        "DELETE FROM report_comments WHERE officer_id IS NULL AND id NOT IN ("
+        "SELECT MIN(id) FROM report_comments WHERE officer_id IS NULL GROUP BY loan_id, report_date)"
+    )
+    op.create_index(
+        'uq_report_comments_snapshot', 'report_comments', ['loan_id', 'report_date'], unique=True,
+        postgresql_where=sa.text('officer_id IS NULL'), sqlite_where=sa.text('officer_id IS NULL')
+    )
+
+
+def downgrade():
+    op.drop_index('uq_report_comments_snapshot', table_name='report_comments')
+    op.execute("DELETE FROM report_comments WHERE officer_id IS NULL")
+    with op.batch_alter_table('report_comments', schema=None) as batch_op:
+        batch_op.alter_column('officer_id', existing_type=sa.Integer(), nullable=False)
@@ -0,0 +1,28 @@
+"""transactions keyset index
+
+Revision ID: e5a09c3d7f12
+Revises: d81e5b07c9a4
+Create Date: 2026-10-17 14:22:10.904551
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a09c3d7f12'
+down_revision = 'd81e5b07c9a4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # (created_at, id) serves both the date-range reports and the
+    # keyset-paginated transactions feed, so it replaces the single-column index
+    op.create_index('ix_transactions_created_at_id', 'transactions', ['created_at', 'id'], unique=False)
+    op.drop_index('ix_transactions_created_at', table_name='transactions')
+
+
+def downgrade():
+    op.create_index('ix_transactions_created_at', 'transactions', ['created_at'], unique=False)
+    op.drop_index('ix_transactions_created_at_id', table_name='transactions')
@@ -0,0 +1,35 @@
+"""create unread_counters
+
+Revision ID: f2b7c4e09d15
+Revises: e5a09c3d7f12
+Create Date: 2026-10-17 16:05:43.218907
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b7c4e09d15'
+down_revision = 'e5a09c3d7f12'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('unread_counters',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=10), nullable=False),
+    sa.Column('target_id', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'kind', 'target_id', name='uq_unread_counter')
+    )
+    # Populated by `python manage.py rebuild-unread-counters` after upgrade
+
+
+def downgrade():
+    op.drop_table('unread_counters')
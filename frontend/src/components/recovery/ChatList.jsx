@@ -3,13 +3,15 @@ import { recoveryAPI, chatAPI } from '../../services/api';
 import Avatar from '../common/Avatar';
 import Modal from '../common/Modal';
 import CreateGroupModal from './CreateGroupModal';
+import { useSocket } from '../../context/SocketContext';
 
 function ChatList({ isOpen, onClose, onSelectUser, onlineUsers = new Set() }) {
   const [users, setUsers] = useState([]);
   const [groups, setGroups] = useState([]);
   const [loading, setLoading] = useState(true);
-  const [unreadCounts, setUnreadCounts] = useState({});
-  const [groupUnreads, setGroupUnreads] = useState({});
+  const { badges } = useSocket();
+  const unreadCounts = badges.messages;
+  const groupUnreads = badges.groups;
   const [previewUser, setPreviewUser] = useState(null);
   const [showPreview, setShowPreview] = useState(false);
   const [showCreateGroup, setShowCreateGroup] = useState(false);
@@ -17,9 +19,7 @@ function ChatList({ isOpen, onClose, onSelectUser, onlineUsers = new Set() }) {
   useEffect(() => {
     if (isOpen) {
       fetchUsers();
-      fetchUnreadCounts();
       fetchGroups();
-      fetchGroupUnreads();
     }
   }, [isOpen]);
 
@@ -45,24 +45,6 @@ function ChatList({ isOpen, onClose, onSelectUser, onlineUsers = new Set() }) {
     }
   };
 
-  const fetchUnreadCounts = async () => {
-    try {
-      const res = await recoveryAPI.getUnreadCountByUser();
-      setUnreadCounts(res.data);
-    } catch (err) {
-      console.error(err);
-    }
-  };
-
-  const fetchGroupUnreads = async () => {
-    try {
-      const res = await chatAPI.getGroupUnreadCounts();
-      setGroupUnreads(res.data);
-    } catch (err) {
-      console.error(err);
-    }
-  };
-
   const handleAvatarClick = (user, e) => {
     e.stopPropagation();
     setPreviewUser(user);
@@ -586,6 +586,12 @@ function ChatWindow({ chat, onClose, onNewMessage, style, globalSocket, onlineUs
 
   const pendingTempIds = useRef(new Map());
 
+  // Timeline cursors (1-on-1 chats): older page / catch-up after reconnect
+  const olderCursor = useRef(null);
+  const latestCursor = useRef(null);
+  const [loadingOlder, setLoadingOlder] = useState(false);
+  const [hasOlder, setHasOlder] = useState(false);
+
   // Reply-to state
   const [replyTo, setReplyTo] = useState(null);
 
@@ -631,6 +637,57 @@ function ChatWindow({ chat, onClose, onNewMessage, style, globalSocket, onlineUs
     return result;
   };
 
+  const toTimelineEntry = (item) => {
+    if (item.type === 'call_log') {
+      const log = item.data;
+      return {
+        id: `call-${log.id}`,
+        sender_id: log.caller_id,
+        recipient_id: log.callee_id,
+        content: formatCallLog(log),
+        created_at: log.started_at,
+        is_call_log: true,
+        status: 'read',
+        _callLog: log,
+      };
+    }
+    return { ...item.data, is_call_log: false };
+  };
+
+  // Merge timeline entries into the list, skipping ids already shown
+  const mergeEntries = (entries, prepend = false) => setMessages(prev => {
+    const seen = new Set(prev.map(m => m.id));
+    const fresh = entries.filter(m => !seen.has(m.id));
+    if (!fresh.length) return prev;
+    return prepend ? [...fresh, ...prev] : [...prev, ...fresh];
+  });
+
+  const loadOlder = async () => {
+    if (isGroup || !olderCursor.current || loadingOlder) return;
+    setLoadingOlder(true);
+    try {
+      const res = await recoveryAPI.getConversationTimeline(user.id, { before: olderCursor.current });
+      olderCursor.current = res.data.before_cursor;
+      setHasOlder(!!res.data.before_cursor);
+      mergeEntries(res.data.items.map(toTimelineEntry), true);
+    } catch (err) { console.error(err); }
+    finally { setLoadingOlder(false); }
+  };
+
+  // After a reconnect, fetch only what arrived since the newest entry we have
+  const catchUp = async () => {
+    if (isGroup || !latestCursor.current) return;
+    try {
+      let more = true;
+      while (more) {
+        const res = await recoveryAPI.getConversationTimeline(user.id, { after: latestCursor.current });
+        latestCursor.current = res.data.after_cursor;
+        mergeEntries(res.data.items.map(toTimelineEntry));
+        more = res.data.has_more;
+      }
+    } catch (err) { console.error(err); }
+  };
+
   // Auto-scroll to bottom
   useEffect(() => {
     if (!messages.length) return;
@@ -665,6 +722,7 @@ function ChatWindow({ chat, onClose, onNewMessage, style, globalSocket, onlineUs
         socket.emit('join_group', { group_id: group.id });
       } else {
         socket.emit('join_chat', { other_user_id: user.id });
+        catchUp();
       }
     };
     const onDisconn = () => setSocketConnected(false);
@@ -702,8 +760,10 @@ function ChatWindow({ chat, onClose, onNewMessage, style, globalSocket, onlineUs
       }
     };
 
-    const onStatus = (d) =>
-      setMessages(prev => prev.map(m => m.id === d.message_id ? { ...m, status: d.status } : m));
+    const onStatus = (d) => {
+      const ids = new Set(d.message_ids || [d.message_id]);
+      setMessages(prev => prev.map(m => ids.has(m.id) ? { ...m, status: d.status } : m));
+    };
 
     const onSent = (d) => {
       if (window._sendTO) clearTimeout(window._sendTO);
@@ -779,25 +839,11 @@ function ChatWindow({ chat, onClose, onNewMessage, style, globalSocket, onlineUs
           console.error('Failed to mark group as read:', e);
         }
       } else {
-        const res = await recoveryAPI.getConversation(user.id);
-        const combined = res.data || [];
-        transformed = combined.map(item => {
-          if (item.type === 'call_log') {
-            const log = item.data;
-            return {
-              id: `call-${log.id}`,
-              sender_id: log.caller_id,
-              recipient_id: log.callee_id,
-              content: formatCallLog(log),
-              created_at: log.started_at,
-              is_call_log: true,
-              status: 'read',
-              _callLog: log,
-            };
-          } else {
-            return { ...item.data, is_call_log: false };
-          }
-        });
+        const res = await recoveryAPI.getConversationTimeline(user.id);
+        olderCursor.current = res.data.before_cursor;
+        latestCursor.current = res.data.after_cursor;
+        setHasOlder(!!res.data.before_cursor);
+        transformed = (res.data.items || []).map(toTimelineEntry);
         const unread = transformed.filter(m => !m.is_call_log && !m.read && m.sender_id === user.id);
         if (unread.length) {
           if (socketRef.current && socketConnected) socketRef.current.emit('mark_read', { message_ids: unread.map(m => m.id) });
@@ -1468,6 +1514,15 @@ function ChatWindow({ chat, onClose, onNewMessage, style, globalSocket, onlineUs
             ref={virtuosoRef}
             data={groupedMessages}
             itemContent={renderItem}
+            components={{
+              Header: () => hasOlder ? (
+                <div className="text-center py-2">
+                  <button className="btn btn-sm btn-link" onClick={loadOlder} disabled={loadingOlder}>
+                    {loadingOlder ? 'Loading…' : 'Load earlier messages'}
+                  </button>
+                </div>
+              ) : null,
+            }}
             followOutput="smooth"
             atBottomStateChange={atBottom => {
               isUserAtBottom.current = atBottom;
@@ -2,6 +2,24 @@
 import React, { createContext, useContext, useState, useEffect, useRef } from 'react';
 import { io } from 'socket.io-client';
 import { useAuth } from './AuthContext';
+import { recoveryAPI } from '../services/api';
+
+const EMPTY_BADGES = { messages: {}, groups: {}, comments: {}, total: 0 };
+const BADGE_SECTIONS = { user: 'messages', group: 'groups', loan: 'comments' };
+
+// Merge `unread_badges` pushes ({kind, id, count}) into the badge map
+const applyBadgeUpdates = (prev, updates) => {
+  const next = { messages: { ...prev.messages }, groups: { ...prev.groups }, comments: { ...prev.comments } };
+  updates.forEach(({ kind, id, count }) => {
+    const section = next[BADGE_SECTIONS[kind]];
+    if (!section) return;
+    if (count > 0) section[id] = count;
+    else delete section[id];
+  });
+  const sum = (obj) => Object.values(obj).reduce((a, b) => a + b, 0);
+  next.total = sum(next.messages) + sum(next.groups);
+  return next;
+};
 
 const SocketContext = createContext();
 
@@ -9,9 +27,19 @@ export const SocketProvider = ({ children }) => {
   const { isAuthenticated } = useAuth();
   const [socket, setSocket] = useState(null);
   const [onlineUsers, setOnlineUsers] = useState(new Set());
+  const [badges, setBadges] = useState(EMPTY_BADGES);
   const socketRef = useRef(null);
   const disconnectTimeouts = useRef({});
 
+  const refreshBadges = async () => {
+    try {
+      const res = await recoveryAPI.getBadges();
+      setBadges(res.data);
+    } catch (err) {
+      console.error(err);
+    }
+  };
+
   useEffect(() => {
     if (!isAuthenticated() || socketRef.current) return;
 
@@ -31,6 +59,11 @@ export const SocketProvider = ({ children }) => {
 
     newSocket.on('connect', () => {
       console.log('[Socket] Connected');
+      refreshBadges(); // catch up on anything pushed while disconnected
+    });
+
+    newSocket.on('unread_badges', (data) => {
+      setBadges(prev => applyBadgeUpdates(prev, data.updates || []));
     });
 
     newSocket.on('online_users_list', (data) => {
@@ -75,7 +108,7 @@ export const SocketProvider = ({ children }) => {
     };
   }, [isAuthenticated]);
 
-  const value = { socket, onlineUsers };
+  const value = { socket, onlineUsers, badges, refreshBadges };
   return <SocketContext.Provider value={value}>{children}</SocketContext.Provider>;
 };
 
@@ -294,6 +294,7 @@ function AdminPanel() {
   const [applications, setApplications] = useState([])
   const [clients, setClients] = useState([])
   const [transactions, setTransactions] = useState([])
+  const [transactionsCursor, setTransactionsCursor] = useState(null)
   const [approvedLoans, setApprovedLoans] = useState([])
 
   // state variable for filtering in applications
@@ -1096,10 +1097,11 @@ function AdminPanel() {
       if (response.data.success) {
         showToast.success(`Payment prompt sent to ${selectedClient.name}. Waiting for payment confirmation...`, 5000)
 
-        const checkoutRequestId = response.data.checkout_request_id;
+        // The prompt is sent by the backend job queue; poll by payment id
+        const paymentId = response.data.payment_id;
 
         // Start enhanced status checking
-        checkPaymentStatus(checkoutRequestId);
+        checkPaymentStatus(paymentId);
 
       } else {
         showToast.error("Failed to send payment prompt. Please try again.")
@@ -1114,7 +1116,7 @@ function AdminPanel() {
   }
 
   // In AdminPanel.jsx - Smart polling with rate limit handling
-  const checkPaymentStatus = async (checkoutRequestId, maxAttempts = 12) => {
+  const checkPaymentStatus = async (paymentId, maxAttempts = 12) => {
     let attempts = 0;
     let isCompleted = false;
     let baseDelay = 8000; // Start with 8 seconds
@@ -1130,7 +1132,7 @@ function AdminPanel() {
     
       try {
         const statusResponse = await paymentAPI.checkMpesaStatus({
-          checkout_request_id: checkoutRequestId
+          payment_id: paymentId
         });
       
         console.log('Payment status response:', statusResponse.data);
@@ -1290,6 +1292,7 @@ function AdminPanel() {
   const [clientDate, setClientDate] = useState("")
   const [transactionSearch, setTransactionSearch] = useState("")
   const [transactionDate, setTransactionDate] = useState("")
+  const [transactionType, setTransactionType] = useState("")
 
   const filterClients = useCallback(() => {
     let filtered = [...clients]
@@ -1363,17 +1366,9 @@ function AdminPanel() {
       )
     }
 
-    // Date filter
-    if (transactionDate) {
-      filtered = filtered.filter(transaction => {
-        if (!transaction.date) return false
-        const transDate = new Date(transaction.date).toISOString().split('T')[0]
-        return transDate === transactionDate
-      })
-    }
-
+    // Date and type filters are applied by the server (see fetchTransactions)
     return filtered
-  }, [transactions, transactionSearch, transactionDate])
+  }, [transactions, transactionSearch])
 
   const filterInvestorTransactions = useCallback(() => {
     let filtered = [...investorTransactions]
@@ -1839,32 +1834,61 @@ useEffect(() => {
     }
   }, [navigate])
 
-  const fetchTransactions = useCallback(async () => {
+  const transactionFilterParams = useCallback(() => {
+    const params = {}
+    if (transactionType) params.type = transactionType
+    if (transactionDate) {
+      params.start_date = transactionDate
+      params.end_date = transactionDate
+    }
+    return params
+  }, [transactionType, transactionDate])
+
+  // Loads the newest page for the current filters; pass the cursor to append the next one
+  const fetchTransactions = useCallback(async (cursor = null) => {
     setTransactionsLoading(true)
     try {
       console.log("Fetching transactions...")
-      const response = await adminAPI.getTransactions()
+      const params = transactionFilterParams()
+      if (cursor) params.cursor = cursor
+      const response = await adminAPI.getTransactions(params)
       console.log("Transactions response:", response.data)
 
-      const sortedTransactions = (response.data || []).sort((a, b) => {
-        const dateA = new Date(a.createdAt || a.date || a.created_at || 0);
-        const dateB = new Date(b.createdAt || b.date || b.created_at || 0);
-        return dateB - dateA;
-      });
-
-      setTransactions(sortedTransactions)
+      // The feed is already newest first
+      const items = response.data?.items || []
+      setTransactions(prev => (cursor ? [...prev, ...items] : items))
+      setTransactionsCursor(response.data?.next_cursor || null)
     } catch (error) {
       console.error("Failed to fetch transactions:", error)
       if (error.response?.status === 401) {
         navigate("/admin/login")
         return
       }
-      setTransactions([])
+      if (!cursor) {
+        setTransactions([])
+        setTransactionsCursor(null)
+      }
       showToast.error("Failed to load transactions: " + (error.response?.data?.error || error.message))
     } finally {
       setTransactionsLoading(false)
     }
-  }, [navigate])
+  }, [navigate, transactionFilterParams])
+
+  const exportTransactions = async () => {
+    try {
+      await adminAPI.exportTransactions({ ...transactionFilterParams(), format: 'csv' })
+    } catch (error) {
+      console.error("Failed to export transactions:", error)
+      showToast.error("Failed to export transactions")
+    }
+  }
+
+  // Server-side filters: reload from the first page when they change
+  useEffect(() => {
+    if (activeSection === "transactions") {
+      fetchTransactions()
+    }
+  }, [transactionType, transactionDate])
 
 
   const formatCurrency = (amount) => {
@@ -3057,6 +3081,19 @@ Thank you for choosing us.`;
                 <div className="d-flex justify-content-between align-items-center mb-4">
                   <h2>Transaction Monitoring</h2>
                   <div className="d-flex gap-2">
+                    <select 
+                      className="form-select" 
+                      value={transactionType}
+                      onChange={(e) => setTransactionType(e.target.value)}
+                    >
+                      <option value="">All Types</option>
+                      <option value="payment">Payments</option>
+                      <option value="disbursement">Disbursements</option>
+                      <option value="topup">Top-ups</option>
+                      <option value="adjustment">Adjustments</option>
+                      <option value="renewal">Renewals</option>
+                      <option value="claim">Claims</option>
+                    </select>
                     <input 
                       type="date" 
                       className="form-control" 
@@ -3070,6 +3107,9 @@ Thank you for choosing us.`;
                       value={transactionSearch}
                       onChange={(e) => setTransactionSearch(e.target.value)}
                     />
+                    <button className="btn btn-outline-secondary text-nowrap" onClick={exportTransactions} title="Download the full filtered history">
+                      <i className="fas fa-file-csv me-1"></i>Export
+                    </button>
                   </div>
                 </div>
             
@@ -3146,6 +3186,17 @@ Thank you for choosing us.`;
                         data={filteredTransactions}
                       />
                     )}
+                    {transactionsCursor && (
+                      <div className="text-center mt-3">
+                        <button 
+                          className="btn btn-outline-primary"
+                          disabled={transactionsLoading}
+                          onClick={() => fetchTransactions(transactionsCursor)}
+                        >
+                          {transactionsLoading ? "Loading..." : "Load more"}
+                        </button>
+                      </div>
+                    )}
                   </div>
                 </div>
               </div>
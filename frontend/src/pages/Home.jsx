@@ -138,6 +138,7 @@ function Home() {
         location: formData.location || '',
         notes: formData.notes || '',
         photos: formData.photos || [],
+        async_photos: true,
         repaymentPlan: formData.repaymentPlan,
         production_classification: formData.productionClassification, 
       }
@@ -1,5 +1,5 @@
 // pages/RecoveryModule.jsx
-import { useState, useEffect, useCallback, useRef } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { useAuth } from '../context/AuthContext';
 import { recoveryAPI } from '../services/api';
 import { userAPI } from '../services/api';
@@ -73,7 +73,7 @@ function RecoveryModule() {
   useSessionTimeout(logout, isAuthenticated, userRole);
 
 
-  const { socket, onlineUsers } = useSocket();
+  const { socket, onlineUsers, badges, refreshBadges } = useSocket();
 
 
   const [branchFilter, setBranchFilter] = useState('all'); // 'all', 'isinya', 'emarti'
@@ -111,11 +111,11 @@ function RecoveryModule() {
   const [showCommentBox, setShowCommentBox] = useState(false);
   const [showChatList, setShowChatList] = useState(false);
   const [openChatWindows, setOpenChatWindows] = useState([]);
-  const [unreadCount, setUnreadCount] = useState(0);
   const [windowWidth, setWindowWidth] = useState(window.innerWidth);
-  const [commentUnreads, setCommentUnreads] = useState({});
   const [audio, setAudio] = useState(null);
-  const prevCounts = useRef({});
+  const prevBadges = useRef(null);
+  const unreadCount = badges.total;
+  const commentUnreads = badges.comments;
   const [showTakeActionModal, setShowTakeActionModal] = useState(false);
   const [selectedLoanForAction, setSelectedLoanForAction] = useState(null);
   const [showRenewalModal, setShowRenewalModal] = useState(false);
@@ -152,6 +152,7 @@ function RecoveryModule() {
   const prevPendingApplicationsRef = useRef(0);
   const [clients, setClients] = useState([]);
   const [transactions, setTransactions] = useState([]);
+  const [transactionsCursor, setTransactionsCursor] = useState(null);
   const [paymentStats, setPaymentStats] = useState({
     payment_stats: [], total_principal_collected: 0,
     currently_lent: 0, available_for_lending: 0, revenue_collected: 0
@@ -369,16 +370,30 @@ function RecoveryModule() {
     finally { setClientsLoading(false); }
   };
 
-  const fetchDirectorTransactions = async () => {
+  const transactionFilterParams = () =>
+    transactionDate ? { start_date: transactionDate, end_date: transactionDate } : {};
+
+  // Newest page for the date filter; with a cursor the next page is appended
+  const fetchDirectorTransactions = async (cursor = null) => {
     setTransactionsLoading(true);
     try {
-      const res = await adminAPI.getTransactions();
-      const sorted = (res.data || []).sort((a, b) => new Date(b.createdAt || b.date) - new Date(a.createdAt || a.date));
-      setTransactions(sorted);
+      const res = await adminAPI.getTransactions({ ...transactionFilterParams(), ...(cursor ? { cursor } : {}) });
+      const items = res.data?.items || [];
+      setTransactions(prev => (cursor ? [...prev, ...items] : items));
+      setTransactionsCursor(res.data?.next_cursor || null);
     } catch (err) { console.error(err); }
     finally { setTransactionsLoading(false); }
   };
 
+  const exportDirectorTransactions = async () => {
+    try {
+      await adminAPI.exportTransactions({ ...transactionFilterParams(), format: 'csv' });
+    } catch (err) {
+      console.error(err);
+      showToast.error('Failed to export transactions');
+    }
+  };
+
   const fetchDirectorPaymentStats = async () => {
     setPaymentStatsLoading(true);
     try {
@@ -1325,17 +1340,15 @@ function RecoveryModule() {
     else audio.play().catch(() => {});
   };
 
-  const fetchCommentUnreads = useCallback(async () => {
-    try {
-      const res = await recoveryAPI.getCommentUnreadCounts();
-      const nc = res.data;
-      let hasNew = false;
-      Object.keys(nc).forEach(id => { if (nc[id] > (prevCounts.current[id] || 0)) hasNew = true; });
-      if (hasNew) playSound();
-      setCommentUnreads(nc);
-      prevCounts.current = { ...nc };
-    } catch (e) { console.error(e); }
-  }, []);
+  // Badges are pushed over the socket (SocketContext); chime when any of them grows
+  useEffect(() => {
+    const prev = prevBadges.current;
+    const grew = prev && (badges.total > prev.total ||
+      Object.keys(badges.comments).some(id => badges.comments[id] > (prev.comments[id] || 0)));
+    if (grew) playSound();
+    prevBadges.current = badges;
+    document.title = badges.total > 0 ? `(${badges.total}) Nagolie Recovery` : 'Nagolie Recovery';
+  }, [badges]);
   
   const fetchData = async () => {
     try {
@@ -1347,13 +1360,6 @@ function RecoveryModule() {
     } finally { setLoading(false); }
   };
 
-  const fetchUnreadCount = async () => {
-    try {
-      const res = await recoveryAPI.getTotalUnreadCount(); // new endpoint
-      setUnreadCount(prev => { if (res.data.count > prev) playSound(); return res.data.count; });
-      document.title = res.data.count > 0 ? `(${res.data.count}) Nagolie Recovery` : 'Nagolie Recovery';
-    } catch (e) { console.error(e); }
-  };
   const handleSelectUser = (chatObj) => {
     // chatObj = { type: 'user'|'group', data: ... }
     const id = chatObj.type === 'user' ? chatObj.data.id : `group-${chatObj.data.id}`;
@@ -1571,15 +1577,10 @@ function RecoveryModule() {
     if (userRole && !allowed.includes(userRole)) { logout(); navigate('/login'); return; }
     if (!userRole) return;
     fetchData();
-    fetchUnreadCount();
-    fetchCommentUnreads();
     if (userRole === 'director') {
       fetchDirectorTransactions();  
     }
-    const i1 = setInterval(fetchUnreadCount, 5000);
-    const i2 = setInterval(fetchCommentUnreads, 5000);
-    return () => { clearInterval(i1); clearInterval(i2); };
-  }, [authLoading, isAuthenticated, userRole, navigate, fetchCommentUnreads, logout]);
+  }, [authLoading, isAuthenticated, userRole, navigate, logout]);
 
   useEffect(() => {
     if (userRole === 'director') {
@@ -1626,6 +1627,11 @@ function RecoveryModule() {
     return () => clearInterval(applicationInterval);
   }, [directorSection, userRole, isInvestorSectionAuthenticated]);
 
+  // The date filter is applied by the server: reload from the first page when it changes
+  useEffect(() => {
+    if (directorSection === 'transactions') fetchDirectorTransactions();
+  }, [transactionDate]);
+
   // Global Socket.IO connection for online status & chat
   // useEffect(() => {
   //   // Only connect if user is authenticated and not already connected
@@ -2339,26 +2345,21 @@ function RecoveryModule() {
                             value={transactionSearch}
                             onChange={(e) => setTransactionSearch(e.target.value)}
                           />
+                          <button className="btn btn-outline-secondary text-nowrap" onClick={exportDirectorTransactions} title="Download the full filtered history">
+                            <i className="fas fa-file-csv me-1"></i>Export
+                          </button>
                         </div>
                       </div>
                   
                       <div className="card">
                         <div className="card-body">
-                          {transactionsLoading ? (
+                          {transactionsLoading && transactions.length === 0 ? (
                             <div className="text-center py-5"><div className="spinner-border text-primary"></div></div>
                           ) : (() => {
-                            const filtered = transactions.filter(t => {
-                              if (transactionSearch && !t.clientName?.toLowerCase().includes(transactionSearch.toLowerCase())) return false;
-                              if (transactionDate) {
-                                const dateString = t.createdAt || t.date || t.created_at;
-                                if (!dateString) return false;
-                                const dateObj = new Date(dateString);
-                                if (isNaN(dateObj.getTime())) return false;   // ✅ invalid date check
-                                const d = dateObj.toISOString().split('T')[0];
-                                if (d !== transactionDate) return false;
-                              }
-                              return true;
-                            });
+                            // the date filter is applied by the server (fetchDirectorTransactions)
+                            const filtered = transactions.filter(t =>
+                              !transactionSearch || t.clientName?.toLowerCase().includes(transactionSearch.toLowerCase())
+                            );
                             return filtered.length === 0 ? (
                               <div className="text-center py-5">
                                 <i className="fas fa-exchange-alt fa-3x text-muted mb-3"></i>
@@ -2428,6 +2429,17 @@ function RecoveryModule() {
                               />
                             );
                           })()}
+                          {transactionsCursor && (
+                            <div className="text-center mt-3">
+                              <button 
+                                className="btn btn-outline-primary"
+                                disabled={transactionsLoading}
+                                onClick={() => fetchDirectorTransactions(transactionsCursor)}
+                              >
+                                {transactionsLoading ? "Loading..." : "Load more"}
+                              </button>
+                            </div>
+                          )}
                         </div>
                       </div>
                     </div>
@@ -4072,7 +4084,7 @@ function RecoveryModule() {
               return updated;
             });
           }}
-          onNewMessage={fetchUnreadCount}
+          onNewMessage={refreshBadges}
           style={getChatStyle(i)}
           globalSocket={socket}
           onlineUsers={onlineUsers}
@@ -110,7 +110,20 @@ export const adminAPI = {
   getClients: () => api.get("/admin/clients"),
   getLivestock: (page = 1, per_page = 10) => api.get(`/admin/livestock?page=${page}&per_page=${per_page}`),
   getPublicLivestockGallery: (page = 1, per_page = 12) => api.get(`/admin/livestock/gallery?page=${page}&per_page=${per_page}`),
-  getTransactions: () => api.get("/admin/transactions"),
+  // One page ({ items, next_cursor }); pass next_cursor back as `cursor` for the next one
+  getTransactions: (params = {}) => api.get("/admin/transactions", { params: { limit: 100, ...params } }),
+  // Downloads the full filtered history in one streamed request (format: csv | ndjson)
+  exportTransactions: async (params = {}) => {
+    const res = await api.get("/admin/transactions/export", { params, responseType: 'blob' });
+    const blobUrl = window.URL.createObjectURL(new Blob([res.data], { type: res.headers['content-type'] }));
+    const link = document.createElement('a');
+    link.href = blobUrl;
+    link.download = `transactions.${params.format || 'csv'}`;
+    document.body.appendChild(link);
+    link.click();
+    document.body.removeChild(link);
+    window.URL.revokeObjectURL(blobUrl);
+  },
   getApprovedLoans: () => api.get("/admin/approved-loans"),
   getPaymentStats: () => api.get("/admin/payment-stats"),
   approveApplication: (id, fundingData = {}) => api.post(`/admin/applications/${id}/approve`, {
@@ -236,6 +249,9 @@ export const recoveryAPI = {
   uploadMessageAttachment: (formData) =>
     api.post('/recovery/messages/upload', formData, { headers: { 'Content-Type': 'multipart/form-data' } }),
   getConversation: (otherUserId) => api.get(`/recovery/messages/conversation/${otherUserId}`),
+  // params: { limit, before } for older pages, { after } to catch up; both cursors come from the last response
+  getConversationTimeline: (otherUserId, params = {}) =>
+    api.get(`/recovery/messages/conversation/${otherUserId}/timeline`, { params }),
   markMessageRead: (msgId) => api.put(`/recovery/messages/${msgId}/read`),
   editMessage: (messageId, newContent) =>
     api.put(`/recovery/messages/${messageId}`, { content: newContent }),
@@ -249,6 +265,7 @@ export const recoveryAPI = {
 
   // Comment read tracking
   getCommentUnreadCounts: () => api.get('/recovery/comment-unread-counts'),
+  getBadges: () => api.get('/recovery/badges'),
   getCommentsWithReadStatus: (loanId) => api.get(`/recovery/loan/${loanId}/comments/read-status`),
   markCommentRead: (loanId) => api.post(`/recovery/loan/${loanId}/comment/mark-read`),
   